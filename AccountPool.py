@@ -0,0 +1,82 @@
+from dataclasses import dataclass
+
+from PySide6.QtCore import QObject, Signal, qDebug
+
+from Configuration import BitgetConfiguration, GateConfiguration, MexcConfiguration
+from FiringEngine import FillTarget
+from RestClient import RestOrderBase
+
+MAIN_ACCOUNT = '主账户'
+
+
+@dataclass
+class Account:
+    name: str
+    api_key: str
+    secret_key: str
+    passphrase: str = ''
+
+
+def account_pool(exchange) -> list[Account]:
+    """交易所可用的全部账户，设置里的主账户在前"""
+    match exchange:
+        case 'Bitget':
+            config = BitgetConfiguration()
+            main = Account(MAIN_ACCOUNT, config.apikey(), config.secretkey(), config.passphrase())
+        case 'Gate.io':
+            config = GateConfiguration()
+            main = Account(MAIN_ACCOUNT, config.apikey(), config.secretkey())
+        case 'Mexc.io':
+            config = MexcConfiguration()
+            main = Account(MAIN_ACCOUNT, config.apikey(), config.secretkey())
+        case _:
+            raise ValueError(f'不支持的交易所 {exchange}')
+    return [main] + [Account(**account) for account in config.accounts() if account['api_key']]
+
+
+def make_order(order_cls, exchange, account: Account, *args) -> RestOrderBase:
+    # *args: the order class's positional arguments up to the trigger timestamp
+    credentials = {'api_key': account.api_key, 'secret_key': account.secret_key}
+    if exchange == 'Bitget':
+        credentials['passphrase'] = account.passphrase
+    order = order_cls(*args, **credentials)
+    order.account = account.name
+    return order
+
+
+class FanOut(QObject):
+    """一个任务分散到多个账户同时下单：每个账户各自签名、各自限频、各自计成交，合计成交够了就停下其余账户"""
+    filled = Signal()
+
+    def __init__(self, orders: list[RestOrderBase], target_fills):
+        super().__init__()
+        self.orders = list(orders)
+        self.target_fills = target_fills
+        self.done = False  # fills still in flight land after the stop, it happens once
+        # counted in the firing threads, the one that sees the target fill stops every account's burst;
+        # restored orders bring the target they were placed with
+        self.fill_target = self.orders[0].fill_target or FillTarget(target_fills)
+        for order in self.orders:
+            # an account alone may fill the whole target, the total is checked here
+            order.max_fills = target_fills
+            order.fill_target = self.fill_target
+            order.succeed.connect(self._on_succeed)
+            order.destroyed.connect(lambda _=None, order=order: self.orders.remove(order))
+
+    @property
+    def fill_count(self):
+        return sum(order.succeed_count for order in self.orders)
+
+    def _on_succeed(self):
+        if self.done or self.fill_count < self.target_fills:
+            return
+        self.done = True
+        for order in self.orders:
+            if order.is_trigger_active():
+                order.stop_order_trigger()
+        qDebug(f'{self.describe()}，停止其余账户')
+        self.filled.emit()
+
+    def describe(self):
+        accounts = ', '.join(f'{order.account} {order.succeed_count}' for order in self.orders)
+        return f'{len(self.orders)} 个账户合计成交 {self.fill_count}/{self.target_fills} ({accounts})'
@@ -1,38 +1,61 @@
 import json
-from typing import cast
 
 from PySide6.QtCore import qDebug, Slot, QDateTime
 from PySide6.QtNetwork import QNetworkRequest, QNetworkReply, QNetworkAccessManager
 
 import BitgetAPI.consts_bitget as const
 import BitgetAPI.utils_bitget as utils
-from utils import get_timestamp, setup_header
-from MiscSettings import BitgetConfiguration
+from utils import get_timestamp, get_monotonic_ms, setup_header
+from Configuration import BitgetConfiguration
+from ClockEstimator import ClockEstimator
+from LatencyStats import LatencyWindow
+from Tracing import Tracer
 from RestClient import RestOrderBase, RestBase, SymbolInfo
 
+SYMBOL_STATUS = {
+    'offline': '维护',
+    'gray': '灰度',
+    'online': '上线',
+    'halt': '停盘'
+}
 
-class BitgetCommon(RestBase):
-    _delay_ms = 0
-    server_timestamp_base = 0
-    local_timestamp_base = 0
 
+class BitgetCommon(RestBase):
     def __init__(self):
         super().__init__()
+        # the model maps the monotonic clock onto server time, wall time only seeds it before the first sync
+        self.estimator = ClockEstimator(initial_offset_ms=get_timestamp() - get_monotonic_ms())
+        self.tracer = Tracer(256, ring=True)
+        self.latency_window = LatencyWindow()
+        self.sync_count = 0
 
     @property
     def rectified_timestamp(self):
-        timestamp = self.server_timestamp_base + (get_timestamp() - self.local_timestamp_base)
-        return timestamp
+        return self.estimator.server_time(get_monotonic_ms())
 
     @property
     def delay_ms(self):
-        return self._delay_ms
+        return self.estimator.latency_ms
+
+    @property
+    def latency(self):
+        return self.latency_window
+
+    def local_deadline(self, server_timestamp):
+        return self.estimator.local_time(server_timestamp)
+
+    def server_timestamp(self, local_ms):
+        return self.estimator.server_time(local_ms)
 
     def request_utctime(self):
         request = QNetworkRequest(const.API_URL + const.SERVER_TIMESTAMP_URL)
-        begin_ms = get_timestamp()
+        self.sync_count += 1
+        trace = self.tracer.begin('time', self.sync_count)
+        begin_ms = get_monotonic_ms()
         reply = self.http_manager.get(request)
-        reply.finished.connect(lambda: self._on_utc_replied(reply, begin_ms))
+        if trace is not None:
+            Tracer.attach(trace, reply)
+        reply.finished.connect(lambda: self._on_utc_replied(reply, begin_ms, trace))
 
     def request_symbol(self, symbol):
         url = const.API_URL + const.SYMBOL_INFO_URL + f'?symbol={symbol}'
@@ -40,28 +63,32 @@ class BitgetCommon(RestBase):
         reply = self.http_manager.get(request)
         reply.finished.connect(lambda: self._on_symbol_info_replied(reply))
 
-    def _on_utc_replied(self, reply: QNetworkReply, begin_ms):
-        end_ms = get_timestamp()
-        delta_ms = (end_ms - begin_ms) // 2
-        self.local_timestamp_base = end_ms
-
-        # predict delay
-        delay = int(0.4 * self.delay_ms + 0.6 * delta_ms)
-        self._delay_ms = delay
+    def request_symbols(self):
+        request = QNetworkRequest(const.API_URL + const.SYMBOL_INFO_URL)
+        reply = self.http_manager.get(request)
+        reply.finished.connect(lambda: self._on_symbols_replied(reply))
 
+    def _on_utc_replied(self, reply: QNetworkReply, begin_ms, trace):
+        end_ms = get_monotonic_ms()
         data = reply.readAll().data()
+        if trace is not None:
+            trace.finish(reply.attribute(QNetworkRequest.Attribute.HttpStatusCodeAttribute) or 0)
+        reply.deleteLater()
         try:
             json_data = json.loads(data.decode('utf-8'))
         except:
             return
         utc = int(json_data['data']['serverTime'])
-        self.server_timestamp_base = utc + self.delay_ms
-        reply.deleteLater()
+        if trace is not None:
+            trace.server_ms = utc
+        self.estimator.add_sample(begin_ms, end_ms, utc)
+        self.latency_window.add(end_ms - begin_ms, 'time')
 
         self.server_time_updated.emit()
 
     def _on_symbol_info_replied(self, reply: QNetworkReply):
         data = reply.readAll().data()
+        reply.deleteLater()
         json_data = json.loads(data.decode('utf-8'))
         code = json_data['code']
         if code != '00000':
@@ -70,23 +97,29 @@ class BitgetCommon(RestBase):
                 self.symbol_info_not_existed.emit(symbol)
             return
 
-        symbol_data = json_data['data'][0]
-        symbol = symbol_data['symbol']
-        price_precision = symbol_data['pricePrecision']
-        quantity_precision = symbol_data['quantityPrecision']
-        status = symbol_data['status']
-        status_dict = {
-            'offline': '维护',
-            'gray': '灰度',
-            'online': '上线',
-            'halt': '停盘'
-        }
-        info = SymbolInfo(symbol, status_dict[status], price_precision, quantity_precision)
-        self.symbol_info_updated.emit(info)
+        self.symbol_info_updated.emit(self._symbol_info(json_data['data'][0]))
+
+    def _on_symbols_replied(self, reply: QNetworkReply):
+        data = reply.readAll().data()
+        reply.deleteLater()
+        try:
+            infos = [self._symbol_info(entry) for entry in json.loads(data)['data']]
+        except (ValueError, KeyError, TypeError):
+            qDebug(f'获取交易对列表出错: {data[:200]}')
+            self.symbols_list_failed.emit()
+            return
+        self.symbols_listed.emit(infos)
+
+    @staticmethod
+    def _symbol_info(entry):
+        status = entry['status']
+        return SymbolInfo(entry['symbol'], SYMBOL_STATUS.get(status, status),
+                          int(entry['pricePrecision']), int(entry['quantityPrecision']),
+                          entry.get('minTradeUSDT') or '0')
 
 
 class BitgetOrder(RestOrderBase):
-    common = BitgetCommon()
+    common = BitgetCommon.shared()
 
     def __init__(self, order_type: RestOrderBase.OrderType, symbol: str, price: str, quantity: str, interval=1,
                  trigger_timestamp=-1,
@@ -98,6 +131,8 @@ class BitgetOrder(RestOrderBase):
         self.API_KEY = api_key if api_key is not None else config.apikey()
         self.SECRET_KEY = secret_key if secret_key is not None else config.secretkey()
         self.PASSPHRASE = passphrase if passphrase is not None else config.passphrase()
+        self.http2 = config.http2()
+        self.rate_limit = config.rate_limit()
         params = dict()
         params['symbol'] = self.symbol
         params['side'] = 'buy' if self.order_type == RestOrderBase.OrderType.Buy else 'sell'
@@ -107,9 +142,9 @@ class BitgetOrder(RestOrderBase):
         params['size'] = self.quantity
         self.params = params
 
-        self.common.server_time_updated.connect(self.server_time_updated.emit)
-        self.common.symbol_info_updated.connect(self.symbol_info_updated.emit)
-        self.common.symbol_info_not_existed.connect(self.symbol_info_not_existed.emit)
+        self.common.server_time_updated.connect(self.server_time_updated)
+        self.common.symbol_info_updated.connect(self.symbol_info_updated)
+        self.common.symbol_info_not_existed.connect(self.symbol_info_not_existed)
 
     @property
     def rectified_timestamp(self):
@@ -119,53 +154,79 @@ class BitgetOrder(RestOrderBase):
     def delay_ms(self):
         return self.common.delay_ms
 
+    @property
+    def latency(self):
+        return self.common.latency
+
+    def local_deadline(self, server_timestamp):
+        return self.common.local_deadline(server_timestamp)
+
+    def server_timestamp(self, local_ms):
+        return self.common.server_timestamp(local_ms)
+
     def request_utctime(self):
         self.common.request_utctime()
 
     def request_symbol(self, symbol):
         self.common.request_symbol(symbol)
 
-    def order_trigger_start_event(self):
-        super().order_trigger_start_event()
+    def request_symbols(self):
+        self.common.request_symbols()
+
+    def order_trigger_start_event(self, start_ms=None):
+        super().order_trigger_start_event(start_ms)
         qDebug(f'开始执行下单: {str(self.params)}')
 
-    def order_trigger_event(self):
-        minimum_timestamp = self.trigger_timestamp
-        reply = self._request('/api/v2/spot/trade/place-order', self.params, minimum_timestamp)
-        reply.finished.connect(self._on_replied)
+    def build_order_request(self, dispatch_ms=None, client_id=None):
+        params = self.params if client_id is None else self.params | {'clientOid': client_id}
+        return self._build_request('/api/v2/spot/trade/place-order', params, self.sign_timestamp(dispatch_ms))
+
+    def warm_up_request(self):
+        return self.setup_transport(QNetworkRequest(const.API_URL + const.SERVER_TIMESTAMP_URL))
 
     def cancel_order(self):
         pass
 
-    def _request(self, api_path, params, minimum_timestamp=None):
+    def _build_request(self, api_path, params, timestamp):
         url = const.API_URL + api_path
 
-        timestamp = self.rectified_timestamp
-        if minimum_timestamp is not None:
-            timestamp = max(timestamp, minimum_timestamp)
-
         # sign & header
         body = json.dumps(params)
         sign = utils.sign(utils.pre_hash(timestamp, 'POST', api_path, str(body)), self.SECRET_KEY)
         headers = utils.get_header(self.API_KEY, sign, timestamp, self.PASSPHRASE)
 
-        request = QNetworkRequest(url)
+        request = self.setup_transport(QNetworkRequest(url))
         setup_header(headers, request)
-        reply = self.http_manager.post(request, body.encode())
-        return reply
+        return request, body.encode()
 
-    def _on_replied(self):
-        reply = cast(QNetworkReply, self.sender())
-        data = reply.readAll().data()
+    def is_success_reply(self, status_code, data):
+        try:
+            return json.loads(data)['code'] == '00000'
+        except (ValueError, KeyError):
+            return False
+
+    def is_rate_limited(self, status_code, data):
+        if status_code == 429:
+            return True
+        try:
+            return json.loads(data)['code'] == '429'  # Too Many Requests, also sent with other statuses
+        except (ValueError, KeyError, TypeError):
+            return False
+
+    def reply_server_ms(self, data):
+        return int(json.loads(data)['requestTime'])
+
+    def handle_reply(self, status_code, data):
         json_data = json.loads(data)
         code = int(json_data['code'])
         if code == 00000:  # success
             order_id = json_data['data']['orderId']
             self.order_records.append(int(order_id))
             self.succeed_count += 1
-            self.stop_order_trigger()
-            if self.succeed_count == 1:
+            if self.on_filled():
                 qDebug(f'挂单成功，结束任务：{str(self.params)}')
+            elif self.succeed_count < self.max_fills:
+                qDebug(f'挂单成功 {self.succeed_count}/{self.max_fills}：{str(self.params)}')
             self.succeed.emit()
         else:  # error
             self.failed_count += 1
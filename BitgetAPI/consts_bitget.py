@@ -1,5 +1,7 @@
-# Base Url
-API_URL = 'https://api.bitget.com'
+import os
+
+# Base Url, overridable to point at a local mock (MockExchange.py)
+API_URL = os.environ.get('BITGET_API_URL', 'https://api.bitget.com')
 CONTRACT_WS_URL = 'wss://ws.bitget.com/mix/v1/stream'
 SERVER_TIMESTAMP_URL = '/api/v2/public/time'
 SYMBOL_INFO_URL = '/api/v2/spot/public/symbols'
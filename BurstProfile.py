@@ -0,0 +1,165 @@
+import math
+import threading
+from abc import ABC, abstractmethod
+from enum import Enum
+
+from RequestPipeline import PRESIGN_WINDOW_MS
+
+
+class ProfileKind(Enum):
+    Constant = 'constant'
+    PulseDecay = 'pulse'
+    RejectRamp = 'ramp'
+    Auto = 'auto'
+
+
+class BurstProfile(ABC):
+    """突发下单的发送时刻表：第 n 单相对开始时刻的偏移（ms），由各发送线程按需向后展开"""
+    KEEP_SLOTS = 4096  # offsets kept behind the newest one, lanes never look further back
+
+    presign_window_ms = PRESIGN_WINDOW_MS  # how far ahead the schedule may be fixed by presigning
+
+    def __init__(self):
+        self._offsets = [0.0]
+        self._base = 0  # slot of _offsets[0]
+        self._lock = threading.Lock()
+
+    def offset_ms(self, slot):
+        with self._lock:
+            offsets = self._offsets
+            while self._base + len(offsets) <= slot:
+                offsets.append(offsets[-1] + self.spacing_ms(offsets[-1]))
+            if len(offsets) > 2 * self.KEEP_SLOTS:
+                drop = len(offsets) - self.KEEP_SLOTS
+                del offsets[:drop]
+                self._base += drop
+            return offsets[max(0, slot - self._base)]
+
+    @abstractmethod
+    def spacing_ms(self, offset_ms):
+        # gap after the order sent at `offset_ms`
+        pass
+
+    def observe(self, status_code, rate_limited):
+        # every reply, from the firing threads
+        pass
+
+    @abstractmethod
+    def describe(self):
+        pass
+
+
+class ConstantProfile(BurstProfile):
+    """固定频率"""
+
+    def __init__(self, interval_ms):
+        super().__init__()
+        self.interval_ms = interval_ms
+
+    def offset_ms(self, slot):
+        return slot * self.interval_ms
+
+    def spacing_ms(self, offset_ms):
+        return self.interval_ms
+
+    def describe(self):
+        return f'恒定 {1000 / self.interval_ms:g}hz'
+
+
+class PulseDecayProfile(BurstProfile):
+    """触发时刻附近密集脉冲，之后指数衰减到基础频率"""
+
+    def __init__(self, peak_hz, base_hz, pulse_ms=200.0, half_life_ms=500.0):
+        super().__init__()
+        self.peak_hz = peak_hz
+        self.base_hz = min(base_hz, peak_hz)
+        self.pulse_ms = pulse_ms
+        self.half_life_ms = half_life_ms
+
+    def rate_hz(self, offset_ms):
+        if offset_ms < self.pulse_ms:
+            return self.peak_hz
+        decay = math.exp(-math.log(2) * (offset_ms - self.pulse_ms) / self.half_life_ms)
+        return self.base_hz + (self.peak_hz - self.base_hz) * decay
+
+    def spacing_ms(self, offset_ms):
+        return 1000 / self.rate_hz(offset_ms)
+
+    def describe(self):
+        return (f'脉冲 {self.peak_hz:.4g}hz x {self.pulse_ms:.0f}ms, '
+                f'半衰期 {self.half_life_ms:.0f}ms 降至 {self.base_hz:.4g}hz')
+
+
+class RejectRampProfile(BurstProfile):
+    """从峰值频率开始，限频回执减半，普通拒单（尚未开盘等）逐步回升到峰值"""
+    presign_window_ms = 100.0  # the schedule follows replies, so only a short stretch of it is fixed ahead
+    BACKOFF = 0.5
+    CLIMB = 0.1  # share of the gap to the peak won back per reject
+
+    def __init__(self, peak_hz, base_hz):
+        super().__init__()
+        self.peak_hz = peak_hz
+        self.base_hz = min(base_hz, peak_hz)
+        self.rate_hz = peak_hz
+        self.throttled_count = 0
+
+    def spacing_ms(self, offset_ms):
+        return 1000 / self.rate_hz  # under the lock, through offset_ms
+
+    def observe(self, status_code, rate_limited):
+        # every dispatcher thread reports here, the same lock as the offsets read under
+        with self._lock:
+            if rate_limited:
+                self.rate_hz = max(self.base_hz, self.rate_hz * self.BACKOFF)
+                self.throttled_count += 1
+            elif status_code >= 400:
+                self.rate_hz += (self.peak_hz - self.rate_hz) * self.CLIMB
+
+    def describe(self):
+        return f'拒单自适应 {self.base_hz:g}~{self.peak_hz:g}hz, 当前 {self.rate_hz:.1f}hz, 限频 {self.throttled_count}'
+
+
+AUTO_DEFAULT_RTT_MS = 100.0  # no samples yet
+AUTO_PULSE_ORDERS = 20  # orders in the pulse when the exchange budget is unlimited
+AUTO_MAX_HZ_PER_DISPATCHER = 1000.0  # about where one firing thread saturates, see benchmarks/bench_burst.py
+
+
+def auto_tune(order) -> PulseDecayProfile:
+    """按实测往返延迟和交易所限频推出脉冲：第一条回执回来之前的一个往返里用完整个令牌桶，之后衰减到可持续的频率"""
+    # sync requests measure the path alone, order replies also carry the exchange's load
+    stats = order.latency.stats('time') or order.latency.stats()
+    rtt_ms = stats['p90'] if stats else AUTO_DEFAULT_RTT_MS
+    pulse_ms = min(1000.0, max(20.0, rtt_ms))
+    base_hz = 1000 / order.interval
+    orders = order.rate_limit if order.rate_limit else AUTO_PULSE_ORDERS
+    if order.rate_limit:
+        base_hz = min(base_hz, order.rate_limit)
+    peak_hz = min(orders * 1000 / pulse_ms, AUTO_MAX_HZ_PER_DISPATCHER * order.dispatchers)
+    return PulseDecayProfile(max(peak_hz, base_hz), base_hz, pulse_ms, pulse_ms)
+
+
+def check_rates(hz, peak_hz=None):
+    """任务创建时检查基础频率和峰值频率 -> (hz, peak_hz)，不合理时抛出 ValueError"""
+    hz = float(hz)
+    if not (math.isfinite(hz) and hz > 0):
+        raise ValueError(f'频率 {hz:g} 必须大于 0')
+    if peak_hz is None:
+        return hz, None
+    peak_hz = float(peak_hz)
+    # a zero, negative or endless rate makes spacings the send loop never gets past
+    if not (math.isfinite(peak_hz) and peak_hz >= hz):
+        raise ValueError(f'峰值频率 {peak_hz:g} 不能低于频率 {hz:g}')
+    return hz, peak_hz
+
+
+def make_profile(order, kind: ProfileKind, peak_hz=None) -> BurstProfile:
+    base_hz = 1000 / order.interval
+    match kind:
+        case ProfileKind.PulseDecay:
+            return PulseDecayProfile(peak_hz or base_hz, base_hz)
+        case ProfileKind.RejectRamp:
+            return RejectRampProfile(peak_hz or base_hz, base_hz)
+        case ProfileKind.Auto:
+            return auto_tune(order)
+        case _:
+            return ConstantProfile(order.interval)
@@ -0,0 +1,194 @@
+import csv
+import math
+import sys
+from collections import deque
+from dataclasses import dataclass
+
+
+@dataclass
+class ClockSample:
+    send_ms: float  # local time when the request left
+    recv_ms: float  # local time when the reply arrived
+    server_ms: float  # server timestamp carried by the reply
+
+    @property
+    def rtt_ms(self):
+        return self.recv_ms - self.send_ms
+
+    @property
+    def mid_ms(self):
+        return (self.send_ms + self.recv_ms) / 2
+
+    @property
+    def offset_ms(self):
+        # server stamps the reply roughly halfway through the round trip
+        return self.server_ms - self.mid_ms
+
+
+class ClockEstimator:
+    """NTP 风格的多样本对时：按 RTT 加权（最小 RTT 滤波），估计时钟漂移，给出偏移、单程延迟和置信区间"""
+    MAX_DRIFT = 500e-6  # 500ppm, anything beyond is noise rather than a real crystal
+
+    def __init__(self, window=32, rtt_scale_ms=5.0, initial_offset_ms=0.0):
+        self.samples = deque(maxlen=window)
+        self.rtt_scale_ms = rtt_scale_ms
+        self.recorder = None
+
+        self._ref_ms = 0.0
+        self._offset_ms = initial_offset_ms  # used until the first sample arrives
+        self._drift = 0.0
+        self._latency_ms = 0.0
+        self._confidence_ms = 0.0
+        self._min_rtt_ms = 0.0
+
+    def start_recording(self, path):
+        self.recorder = open(path, 'a', newline='')
+
+    def stop_recording(self):
+        if self.recorder:
+            self.recorder.close()
+            self.recorder = None
+
+    def add_sample(self, send_ms, recv_ms, server_ms):
+        sample = ClockSample(send_ms, recv_ms, server_ms)
+        if sample.rtt_ms < 0:
+            return
+        self.samples.append(sample)
+        if self.recorder:
+            self.recorder.write(f'{send_ms},{recv_ms},{server_ms}\n')
+            self.recorder.flush()
+        self._solve()
+
+    def is_synced(self):
+        return len(self.samples) > 0
+
+    def offset_at(self, local_ms):
+        return self._offset_ms + self._drift * (local_ms - self._ref_ms)
+
+    def server_time(self, local_ms):
+        return local_ms + self.offset_at(local_ms)
+
+    def local_time(self, server_ms):
+        # inverse of server_time: local + offset + drift * (local - ref) == server
+        return (server_ms - self._offset_ms + self._drift * self._ref_ms) / (1 + self._drift)
+
+    @property
+    def offset_ms(self):
+        return self._offset_ms
+
+    @property
+    def drift_ppm(self):
+        return self._drift * 1e6
+
+    @property
+    def latency_ms(self):
+        return self._latency_ms
+
+    @property
+    def confidence_ms(self):
+        # 95% half width of the offset, the path asymmetry can be at most min_rtt / 2 on top of it
+        return self._confidence_ms
+
+    @property
+    def error_bound_ms(self):
+        return self._confidence_ms + self._min_rtt_ms / 2
+
+    def confidence_interval(self, local_ms):
+        offset = self.offset_at(local_ms)
+        return offset - self._confidence_ms, offset + self._confidence_ms
+
+    def _solve(self):
+        samples = self.samples
+        min_rtt = min(s.rtt_ms for s in samples)
+        weights = [math.exp(-(s.rtt_ms - min_rtt) / self.rtt_scale_ms) for s in samples]
+        total = sum(weights)
+        ref = sum(w * s.mid_ms for w, s in zip(weights, samples)) / total
+        offset = sum(w * s.offset_ms for w, s in zip(weights, samples)) / total
+
+        # weighted least squares of offset over local time, slope is the drift
+        drift = 0.0
+        if len(samples) >= 3:
+            var = sum(w * (s.mid_ms - ref) ** 2 for w, s in zip(weights, samples))
+            if var > 0:
+                cov = sum(w * (s.mid_ms - ref) * (s.offset_ms - offset) for w, s in zip(weights, samples))
+                drift = max(-self.MAX_DRIFT, min(self.MAX_DRIFT, cov / var))
+
+        residual = sum(w * (s.offset_ms - offset - drift * (s.mid_ms - ref)) ** 2
+                       for w, s in zip(weights, samples)) / total
+        effective_n = total ** 2 / sum(w * w for w in weights)
+        confidence = 1.96 * math.sqrt(residual / effective_n) if effective_n > 1 else min_rtt / 2
+
+        self._ref_ms = ref
+        self._offset_ms = offset
+        self._drift = drift
+        self._latency_ms = sum(w * s.rtt_ms / 2 for w, s in zip(weights, samples)) / total
+        self._confidence_ms = confidence
+        self._min_rtt_ms = min_rtt
+
+
+def load_samples(path):
+    with open(path, newline='') as f:
+        return [(float(row[0]), float(row[1]), float(row[2])) for row in csv.reader(f) if row]
+
+
+def evaluate(samples, window=32, rtt_scale_ms=5.0):
+    """离线回放记录的样本（需要 numpy）：用前 window 个样本预测下一个样本的偏移，对比旧的 EWMA 算法"""
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    data = np.asarray(samples, dtype=np.float64)
+    send, recv, server = data[:, 0], data[:, 1], data[:, 2]
+    rtt = recv - send
+    mid = (send + recv) / 2
+    offset = server - mid
+    if len(data) <= window:
+        raise ValueError(f'need more than {window} samples, got {len(data)}')
+
+    # every row is one window, the sample right after it is the one to predict
+    w_rtt = sliding_window_view(rtt, window)[:-1]
+    w_mid = sliding_window_view(mid, window)[:-1]
+    w_off = sliding_window_view(offset, window)[:-1]
+    weights = np.exp(-(w_rtt - w_rtt.min(axis=1, keepdims=True)) / rtt_scale_ms)
+    total = weights.sum(axis=1)
+    ref = (weights * w_mid).sum(axis=1) / total
+    mean_off = (weights * w_off).sum(axis=1) / total
+    d_mid = w_mid - ref[:, None]
+    var = (weights * d_mid ** 2).sum(axis=1)
+    cov = (weights * d_mid * (w_off - mean_off[:, None])).sum(axis=1)
+    drift = np.clip(np.divide(cov, var, out=np.zeros_like(cov), where=var > 0),
+                    -ClockEstimator.MAX_DRIFT, ClockEstimator.MAX_DRIFT)
+    target_mid = mid[window:]
+    predicted = mean_off + drift * (target_mid - ref)
+    error = predicted - offset[window:]
+
+    # legacy: ewma of rtt/2, base overwritten by every single reply
+    legacy_offset = np.empty(len(data))
+    delay = 0
+    for i in range(len(data)):
+        delay = int(0.4 * delay + 0.6 * (rtt[i] // 2))
+        legacy_offset[i] = server[i] + delay - recv[i]
+    legacy_error = legacy_offset[window - 1:-1] - offset[window:]
+
+    # only low rtt targets tell the truth within a few ms, judge on them
+    trusted = rtt[window:] <= np.percentile(rtt[window:], 50)
+
+    def stats(err):
+        err = np.abs(err[trusted])
+        return {'mean': float(err.mean()), 'p50': float(np.percentile(err, 50)),
+                'p90': float(np.percentile(err, 90)), 'p99': float(np.percentile(err, 99)),
+                'max': float(err.max())}
+
+    return {'samples': len(data), 'estimator': stats(error), 'legacy': stats(legacy_error),
+            'drift_ppm': float(drift[-1] * 1e6)}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('usage: python ClockEstimator.py samples.csv [window]')
+        sys.exit(1)
+    result = evaluate(load_samples(sys.argv[1]), *(int(v) for v in sys.argv[2:3]))
+    print(f"samples: {result['samples']}, drift: {result['drift_ppm']:.1f}ppm")
+    for name in ('estimator', 'legacy'):
+        s = result[name]
+        print(f"{name:>9}: mean {s['mean']:.2f}ms  p50 {s['p50']:.2f}ms  p90 {s['p90']:.2f}ms  "
+              f"p99 {s['p99']:.2f}ms  max {s['max']:.2f}ms")
@@ -0,0 +1,39 @@
+from PySide6.QtCore import QObject, Signal, QTimer, Qt
+
+from BitgetAPI.BitgetRest import BitgetCommon
+from GateAPI.GateRest import GateCommon
+from MEXCAPI.MexcRest import MexcCommon
+from RestClient import RestBase
+from utils import singleton
+
+
+@singleton
+class ClockService(QObject):
+    """每个交易所唯一的服务器时钟，统一负责对时，状态栏、订单和倒计时表格共用同一套偏移/延迟"""
+    server_time_updated = Signal(str)  # exchange
+
+    def __init__(self, interval=1000, exchanges=None):
+        super().__init__()
+        self.clocks = {
+            'Bitget': BitgetCommon.shared(),
+            'Gate.io': GateCommon.shared(),
+            'Mexc.io': MexcCommon.shared(),
+        }
+        if exchanges is not None:  # headless runs only sync the exchanges their tasks trade on
+            self.clocks = {exchange: self.clocks[exchange] for exchange in exchanges}
+        for exchange, clock in self.clocks.items():
+            clock.server_time_updated.connect(lambda exchange=exchange: self.server_time_updated.emit(exchange))
+
+        self.sync_timer = QTimer(self)
+        self.sync_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.sync_timer.setInterval(interval)
+        self.sync_timer.timeout.connect(self.sync)
+        self.sync_timer.start()
+        self.sync()
+
+    def clock(self, exchange) -> RestBase:
+        return self.clocks[exchange]
+
+    def sync(self):
+        for clock in self.clocks.values():
+            clock.request_utctime()
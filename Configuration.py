@@ -0,0 +1,339 @@
+from PySide6.QtCore import QSettings
+from PySide6.QtNetwork import QNetworkProxy
+
+
+class Configuration:
+    settings = QSettings("Li.Player", "CoinRobot")
+
+    def _read_accounts(self, group, keys):
+        self.settings.beginGroup(group)
+        count = self.settings.beginReadArray("accounts")
+        ret = []
+        for i in range(count):
+            self.settings.setArrayIndex(i)
+            ret.append({key: str(self.settings.value(key, "")) for key in keys})
+        self.settings.endArray()
+        self.settings.endGroup()
+        return ret
+
+    def _write_accounts(self, group, accounts):
+        self.settings.beginGroup(group)
+        self.settings.remove("accounts")
+        self.settings.beginWriteArray("accounts", len(accounts))
+        for i, account in enumerate(accounts):
+            self.settings.setArrayIndex(i)
+            for key, value in account.items():
+                self.settings.setValue(key, value)
+        self.settings.endArray()
+        self.settings.endGroup()
+
+class ProxyConfiguration(Configuration):
+    def __init__(self):
+        super().__init__()
+
+    def use_proxy(self):
+        self.settings.beginGroup('Proxy')
+        ret = bool(self.settings.value("use_proxy", False, type=bool))
+        self.settings.endGroup()
+        return ret
+
+    def set_use_proxy(self, value):
+        self.settings.beginGroup('Proxy')
+        self.settings.setValue("use_proxy", value)
+        self.settings.endGroup()
+
+    def proxy_ip(self):
+        self.settings.beginGroup('Proxy')
+        ret = str(self.settings.value("proxy_ip", "127.0.0.1"))
+        self.settings.endGroup()
+        return ret
+
+    def set_proxy_ip(self, value):
+        self.settings.beginGroup('Proxy')
+        self.settings.setValue("proxy_ip", value)
+        self.settings.endGroup()
+
+    def proxy_port(self) -> int:
+        self.settings.beginGroup('Proxy')
+        ret = self.settings.value("proxy_port", defaultValue=1080, type=int)
+        self.settings.endGroup()
+        return ret
+
+    def set_proxy_port(self, value: int):
+        self.settings.beginGroup('Proxy')
+        self.settings.setValue("proxy_port", value)
+        self.settings.endGroup()
+
+
+class BitgetConfiguration(Configuration):
+
+    def __init__(self):
+        super().__init__()
+
+    def __del__(self):
+        self.settings.sync()
+
+    def apikey(self):
+        self.settings.beginGroup('Bitget')
+        ret = str(self.settings.value("APIKey", ""))
+        self.settings.endGroup()
+        return ret
+
+    def set_apikey(self, value):
+        self.settings.beginGroup('Bitget')
+        self.settings.setValue("APIKey", value)
+        self.settings.endGroup()
+
+    def secretkey(self):
+        self.settings.beginGroup('Bitget')
+        ret = str(self.settings.value("Secretkey", ""))
+        self.settings.endGroup()
+        return ret
+
+    def set_secretkey(self, value):
+        self.settings.beginGroup('Bitget')
+        self.settings.setValue("Secretkey", value)
+        self.settings.endGroup()
+
+    def passphrase(self):
+        self.settings.beginGroup('Bitget')
+        ret = str(self.settings.value("Passphrase", ""))
+        self.settings.endGroup()
+        return ret
+
+    def set_passphrase(self, value):
+        self.settings.beginGroup('Bitget')
+        self.settings.setValue("Passphrase", value)
+        self.settings.endGroup()
+
+    def http2(self):
+        self.settings.beginGroup('Bitget')
+        ret = bool(self.settings.value("http2", False, type=bool))
+        self.settings.endGroup()
+        return ret
+
+    def set_http2(self, value):
+        self.settings.beginGroup('Bitget')
+        self.settings.setValue("http2", value)
+        self.settings.endGroup()
+
+    def rate_limit(self) -> int:
+        # orders per second for one API key, 0: unlimited
+        self.settings.beginGroup('Bitget')
+        ret = self.settings.value("rate_limit", defaultValue=10, type=int)
+        self.settings.endGroup()
+        return ret
+
+    def set_rate_limit(self, value: int):
+        self.settings.beginGroup('Bitget')
+        self.settings.setValue("rate_limit", value)
+        self.settings.endGroup()
+
+    def accounts(self):
+        # further key sets a task can fan out over, the one above is always the first
+        return self._read_accounts('Bitget', ('name', 'api_key', 'secret_key', 'passphrase'))
+
+    def set_accounts(self, accounts):
+        self._write_accounts('Bitget', accounts)
+
+
+class GateConfiguration(Configuration):
+
+    def __init__(self):
+        super().__init__()
+
+    def __del__(self):
+        self.settings.sync()
+
+    def apikey(self):
+        self.settings.beginGroup('Gate')
+        ret = str(self.settings.value("APIKey", ""))
+        self.settings.endGroup()
+        return ret
+
+    def set_apikey(self, value):
+        self.settings.beginGroup('Gate')
+        self.settings.setValue("APIKey", value)
+        self.settings.endGroup()
+
+    def secretkey(self):
+        self.settings.beginGroup('Gate')
+        ret = str(self.settings.value("Secretkey", ""))
+        self.settings.endGroup()
+        return ret
+
+    def set_secretkey(self, value):
+        self.settings.beginGroup('Gate')
+        self.settings.setValue("Secretkey", value)
+        self.settings.endGroup()
+
+    def http2(self):
+        self.settings.beginGroup('Gate')
+        ret = bool(self.settings.value("http2", False, type=bool))
+        self.settings.endGroup()
+        return ret
+
+    def set_http2(self, value):
+        self.settings.beginGroup('Gate')
+        self.settings.setValue("http2", value)
+        self.settings.endGroup()
+
+    def rate_limit(self) -> int:
+        # orders per second for one API key, 0: unlimited
+        self.settings.beginGroup('Gate')
+        ret = self.settings.value("rate_limit", defaultValue=10, type=int)
+        self.settings.endGroup()
+        return ret
+
+    def set_rate_limit(self, value: int):
+        self.settings.beginGroup('Gate')
+        self.settings.setValue("rate_limit", value)
+        self.settings.endGroup()
+
+    def accounts(self):
+        # further key sets a task can fan out over, the one above is always the first
+        return self._read_accounts('Gate', ('name', 'api_key', 'secret_key'))
+
+    def set_accounts(self, accounts):
+        self._write_accounts('Gate', accounts)
+
+
+
+class MexcConfiguration(Configuration):
+
+    def __init__(self):
+        super().__init__()
+
+    def __del__(self):
+        self.settings.sync()
+
+    def apikey(self):
+        self.settings.beginGroup('Mexc')
+        ret = str(self.settings.value("APIKey", ""))
+        self.settings.endGroup()
+        return ret
+
+    def set_apikey(self, value):
+        self.settings.beginGroup('Mexc')
+        self.settings.setValue("APIKey", value)
+        self.settings.endGroup()
+
+    def secretkey(self):
+        self.settings.beginGroup('Mexc')
+        ret = str(self.settings.value("Secretkey", ""))
+        self.settings.endGroup()
+        return ret
+
+    def set_secretkey(self, value):
+        self.settings.beginGroup('Mexc')
+        self.settings.setValue("Secretkey", value)
+        self.settings.endGroup()
+
+    def http2(self):
+        self.settings.beginGroup('Mexc')
+        ret = bool(self.settings.value("http2", False, type=bool))
+        self.settings.endGroup()
+        return ret
+
+    def set_http2(self, value):
+        self.settings.beginGroup('Mexc')
+        self.settings.setValue("http2", value)
+        self.settings.endGroup()
+
+    def rate_limit(self) -> int:
+        # orders per second for one API key, 0: unlimited
+        self.settings.beginGroup('Mexc')
+        ret = self.settings.value("rate_limit", defaultValue=20, type=int)
+        self.settings.endGroup()
+        return ret
+
+    def set_rate_limit(self, value: int):
+        self.settings.beginGroup('Mexc')
+        self.settings.setValue("rate_limit", value)
+        self.settings.endGroup()
+
+    def accounts(self):
+        # further key sets a task can fan out over, the one above is always the first
+        return self._read_accounts('Mexc', ('name', 'api_key', 'secret_key'))
+
+    def set_accounts(self, accounts):
+        self._write_accounts('Mexc', accounts)
+
+
+class WarmupConfiguration(Configuration):
+
+    def __init__(self):
+        super().__init__()
+
+    def connections(self) -> int:
+        self.settings.beginGroup('Warmup')
+        ret = self.settings.value("connections", defaultValue=2, type=int)
+        self.settings.endGroup()
+        return ret
+
+    def set_connections(self, value: int):
+        self.settings.beginGroup('Warmup')
+        self.settings.setValue("connections", value)
+        self.settings.endGroup()
+
+    def lead_seconds(self) -> int:
+        self.settings.beginGroup('Warmup')
+        ret = self.settings.value("lead_seconds", defaultValue=120, type=int)
+        self.settings.endGroup()
+        return ret
+
+    def set_lead_seconds(self, value: int):
+        self.settings.beginGroup('Warmup')
+        self.settings.setValue("lead_seconds", value)
+        self.settings.endGroup()
+
+    def keepalive_seconds(self) -> int:
+        self.settings.beginGroup('Warmup')
+        ret = self.settings.value("keepalive_seconds", defaultValue=15, type=int)
+        self.settings.endGroup()
+        return ret
+
+    def set_keepalive_seconds(self, value: int):
+        self.settings.beginGroup('Warmup')
+        self.settings.setValue("keepalive_seconds", value)
+        self.settings.endGroup()
+
+
+class FiringConfiguration(Configuration):
+
+    def __init__(self):
+        super().__init__()
+
+    def max_in_flight(self) -> int:
+        # unanswered requests per order, 0: unlimited
+        self.settings.beginGroup('Firing')
+        ret = self.settings.value("max_in_flight", defaultValue=128, type=int)
+        self.settings.endGroup()
+        return ret
+
+    def set_max_in_flight(self, value: int):
+        self.settings.beginGroup('Firing')
+        self.settings.setValue("max_in_flight", value)
+        self.settings.endGroup()
+
+    def reply_timeout_ms(self) -> int:
+        self.settings.beginGroup('Firing')
+        ret = self.settings.value("reply_timeout_ms", defaultValue=3000, type=int)
+        self.settings.endGroup()
+        return ret
+
+    def set_reply_timeout_ms(self, value: int):
+        self.settings.beginGroup('Firing')
+        self.settings.setValue("reply_timeout_ms", value)
+        self.settings.endGroup()
+
+
+def apply_proxy():
+    proxy = ProxyConfiguration()
+    if proxy.use_proxy():
+        proxy = QNetworkProxy(QNetworkProxy.ProxyType.HttpProxy,
+                              proxy.proxy_ip(), proxy.proxy_port())
+        QNetworkProxy.setApplicationProxy(proxy)
+    else:
+        proxy = QNetworkProxy(QNetworkProxy.ProxyType.NoProxy)
+        QNetworkProxy.setApplicationProxy(proxy)
@@ -0,0 +1,453 @@
+from PySide6.QtCore import QObject, Signal, Slot, QThread, QTimer, Qt, QCoreApplication, QMetaObject
+from PySide6.QtNetwork import QNetworkAccessManager, QNetworkRequest, QNetworkReply
+
+import threading
+import uuid
+
+import Scheduler
+from BurstProfile import BurstProfile, ConstantProfile
+from RateLimiter import RateBudget
+from RequestPipeline import PresignedQueue
+from Tracing import Tracer
+from utils import get_monotonic_ms, singleton
+
+MAX_DISPATCHERS = 4
+
+
+class RaceGroup:
+    """首单竞速：同一笔订单（相同 client id）从多条独立连接同时发出，以最先成功的回执为准"""
+
+    def __init__(self, copies):
+        self.copies = copies
+        self.client_id = uuid.uuid4().hex[:24]
+        self.pending = copies
+        self.won = False
+        self.last_failure = None  # (status_code, data), reported if every copy fails
+
+
+class InFlight:
+    """一个订单已发出、尚未回执的请求：各发送线程共用一个上限，并统计完成、超时和因满额跳过的次数"""
+
+    def __init__(self, limit):
+        self.limit = limit  # 0: unlimited
+        self.count = 0
+        self.peak = 0
+        self.completed = 0
+        self.timed_out = 0
+        self.capped = 0  # slots skipped at the limit
+        self.aborted = 0  # dropped unanswered once the task was done
+        self._lock = threading.Lock()
+
+    def acquire(self, force=False):
+        with self._lock:
+            if not force and self.limit and self.count >= self.limit:
+                self.capped += 1
+                return False
+            self.count += 1
+            self.peak = max(self.peak, self.count)
+            return True
+
+    def release(self, completed=True, timed_out=False, aborted=False):
+        with self._lock:
+            self.count -= 1
+            self.completed += completed
+            self.timed_out += timed_out
+            self.aborted += aborted
+
+    def describe(self):
+        return (f'在途 {self.count}/{self.limit or "不限"} (峰值 {self.peak}), 完成 {self.completed}, '
+                f'超时 {self.timed_out}, 中止 {self.aborted}, 满额跳过 {self.capped}')
+
+
+class FillTarget:
+    """一个或几个 Burst 共用的成交目标，在发送线程里计数，数到目标的那个线程停下全部"""
+
+    def __init__(self, max_fills):
+        self.max_fills = max_fills
+        self.fill_count = 0  # successes seen by the dispatchers, ahead of the orders' own counts
+        self.bursts = []
+        self._lock = threading.Lock()
+
+    def join(self, burst):
+        with self._lock:
+            self.bursts.append(burst)
+            if self.fill_count >= self.max_fills:  # started after the target was met
+                burst.stopped = True
+
+    def count_fill(self):
+        # True once the fills are complete, for exactly one caller
+        with self._lock:
+            self.fill_count += 1
+            return self.fill_count == self.max_fills
+
+    def stop(self):
+        # -> every burst sharing the target, now stopped
+        with self._lock:
+            bursts = list(self.bursts)
+        for burst in bursts:
+            burst.stop()
+        return bursts
+
+
+class Burst:
+    """一个订单的连续下单：从 start_ms 起按发送时刻表（默认每 interval_ms 一单）发送，直到 stop()"""
+
+    def __init__(self, order, start_ms, interval_ms, dispatchers=1, race_copies=1, profile: BurstProfile = None):
+        self.order = order
+        self.start_ms = start_ms
+        self.interval_ms = interval_ms
+        self.profile = profile or ConstantProfile(interval_ms)
+        self.dispatchers = dispatchers
+        self.race = RaceGroup(race_copies) if race_copies > 1 else None
+        self.sent_count = 0
+        self.sends = None  # list to record (deadline ms, sent ms) of every request into, for benchmarks
+        self.tracer = order.tracer
+        self.latency = order.latency
+        # shared with every other task on the same exchange and key, None: unlimited
+        self.budget = RateBudget().bucket(order.exchange, order.API_KEY, order.rate_limit) if order.rate_limit else None
+        self.in_flight = InFlight(order.max_in_flight)
+        self.stopped = False
+        self.aborted = False  # outstanding requests are being dropped
+        # a fan-out's accounts share one target, a lone order has its own
+        self.fills = order.fill_target or FillTarget(order.max_fills)
+        self.fills.join(self)
+        self.detached = False  # order is gone, drop whatever still comes back
+        order.destroyed.connect(self._on_order_destroyed)
+
+    def stop(self):
+        self.stopped = True
+
+    def deadline(self, slot):
+        return self.start_ms + self.profile.offset_ms(slot)
+
+    def _on_order_destroyed(self):
+        self.stopped = True
+        self.detached = True
+
+
+class Lane:
+    # slots offset, offset + stride, ... of one burst, served by one dispatcher
+    def __init__(self, burst: Burst, offset, stride, race_copy=False):
+        self.burst = burst
+        self.slot = offset
+        self.stride = stride
+        self.race_copy = race_copy  # only carries an extra copy of slot 0
+        self.done = False
+        self.presigned = PresignedQueue()
+
+    def next_deadline(self):
+        return self.burst.deadline(self.slot)
+
+    def build_request(self, slot):
+        race = self.burst.race if slot == 0 else None
+        return self.burst.order.build_order_request(self.burst.deadline(slot), race.client_id if race else None)
+
+    def advance(self, now_ms):
+        if self.race_copy:
+            self.done = True
+            return
+        self.slot += self.stride
+        # fell behind, skip to the latest slot already due instead of sending the missed ones back to back
+        while self.burst.deadline(self.slot + self.stride) <= now_ms:
+            self.slot += self.stride
+
+
+class WarmPool:
+    """任务专属的预热连接：在分配给任务的 dispatcher 上提前建立并保持若干条到交易所的连接"""
+
+    def __init__(self, request: QNetworkRequest, dispatchers, connections, keepalive_ms):
+        self.request = request  # cheap unauthenticated GET, the exchange time endpoint
+        self.dispatchers = dispatchers
+        self.connections = connections
+        self.keepalive_ms = keepalive_ms
+        self.encrypted = request.url().scheme() == 'https'
+        self.connects = 0  # sockets opened, reconnects after an idle drop included
+        self.handshakes = 0  # TLS handshakes completed, likewise cumulative
+        self.live = {}  # dispatcher -> connections that answered its last keep-alive round
+        self.keepalive_count = 0
+        self.error_count = 0
+        self.last_activity_ms = None
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    def ready_count(self):
+        return sum(self.live.values())
+
+    def idle_age_ms(self):
+        if self.last_activity_ms is None:
+            return None
+        return get_monotonic_ms() - self.last_activity_ms
+
+    def describe(self):
+        target = self.connections * len(self.dispatchers)
+        age = self.idle_age_ms()
+        idle = '-' if age is None else f'{age / 1000:.0f}s'
+        return f'{self.ready_count()}/{target} 空闲{idle}'
+
+
+class Dispatcher(QObject):
+    """独立线程中的发送器，拥有自己的 QNetworkAccessManager，按时发送分配给它的 Lane"""
+    lane_requested = Signal(object)
+    warm_requested = Signal(object)
+    abort_requested = Signal(object)  # burst
+    first_dispatched = Signal(object, float, float)  # burst, deadline ms, sent ms
+    replied = Signal(object, int, object, object)  # burst, http status code, body, race group
+
+    LEAD_MS = 3.0  # the thread's own timer is quiet enough to wake this close to the deadline
+
+    def __init__(self):
+        super().__init__()
+        self.http_manager = None
+        self.timer = None
+        self.lanes = []
+        self.pools = []
+        # every outstanding reply of this thread, handled through the manager's finished signal: a per reply
+        # lambda would hold the reply and keep both alive after deleteLater
+        self.replies = {}  # order reply -> (burst, race group, trace, sent ms)
+        self.warming = {}  # warm-up reply -> (pool, [answered, outstanding] of its round)
+        self.closing = False
+        self._pumping = False
+        self.lane_requested.connect(self._add_lane)
+        self.warm_requested.connect(self._add_pool)
+        self.abort_requested.connect(self._abort, Qt.ConnectionType.QueuedConnection)  # never inside a reply
+
+    def load(self):
+        return sum(1 for lane in self.lanes if not lane.burst.stopped)
+
+    @Slot()
+    def setup(self):
+        # runs in the dispatcher thread, so everything created here belongs to it
+        self.http_manager = QNetworkAccessManager(self)
+        self.http_manager.finished.connect(self._on_finished)
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self._pump)
+        self.keepalive_timer = QTimer(self)
+        self.keepalive_timer.setInterval(1000)
+        self.keepalive_timer.timeout.connect(self._keep_alive)
+        self.keepalive_timer.start()
+
+    @Slot()
+    def teardown(self):
+        # runs in the dispatcher thread before it quits, so aborted replies finish here and not in the destructor
+        self.closing = True
+        if self.http_manager is None:
+            return
+        self.timer.stop()
+        self.keepalive_timer.stop()
+        for reply in self.http_manager.findChildren(QNetworkReply):
+            reply.abort()
+
+    @Slot(object)
+    def _add_lane(self, lane: Lane):
+        self.lanes.append(lane)
+        self._pump()
+
+    @Slot(object)
+    def _add_pool(self, pool: WarmPool):
+        self.pools.append(pool)
+        self._warm(pool)
+
+    @Slot(object)
+    def _abort(self, burst: Burst):
+        # abort() finishes the reply right away, so collect first
+        for reply in [reply for reply, entry in self.replies.items() if entry[0] is burst]:
+            reply.abort()
+
+    def _keep_alive(self):
+        self.pools = [pool for pool in self.pools if not pool.closed]
+        for pool in self.pools:
+            age = pool.idle_age_ms()
+            if age is None or age > pool.keepalive_ms:
+                self._warm(pool)
+
+    def _warm(self, pool: WarmPool):
+        # concurrent requests, each one holds its own connection open
+        round_ = [0, pool.connections]
+        for _ in range(pool.connections):
+            reply = self.http_manager.get(pool.request)
+            reply.socketStartedConnecting.connect(lambda: setattr(pool, 'connects', pool.connects + 1))
+            reply.encrypted.connect(lambda: setattr(pool, 'handshakes', pool.handshakes + 1))
+            self.warming[reply] = (pool, round_)
+        pool.keepalive_count += 1
+
+    def _on_warm_replied(self, pool: WarmPool, round_, reply: QNetworkReply):
+        if reply.error() != QNetworkReply.NetworkError.NoError:
+            pool.error_count += 1
+        else:
+            round_[0] += 1
+        round_[1] -= 1
+        if round_[1] == 0:  # a dropped connection fails or reconnects, either way the round tells what is up now
+            pool.live[self] = round_[0]
+        pool.last_activity_ms = get_monotonic_ms()
+        reply.deleteLater()
+
+    def _pump(self):
+        if self._pumping:
+            return
+        self._pumping = True
+        try:
+            while True:
+                self.lanes = [lane for lane in self.lanes if not lane.burst.stopped and not lane.done]
+                if not self.lanes:
+                    self.timer.stop()
+                    return
+                lane = min(self.lanes, key=Lane.next_deadline)
+                deadline = lane.next_deadline()
+                remaining = deadline - get_monotonic_ms()
+                if remaining > self.LEAD_MS:
+                    # idle until the next slot, sign the upcoming requests meanwhile
+                    for idle_lane in self.lanes:
+                        idle_lane.presigned.fill(idle_lane, deadline - get_monotonic_ms() - self.LEAD_MS - 1)
+                    remaining = deadline - get_monotonic_ms()
+                    self.timer.start(max(0, int(remaining - self.LEAD_MS)))
+                    return
+                Scheduler.wait_until(deadline)
+                self._send(lane, deadline)
+                # with sub-ms spacing the loop never returns, let replies in between sends
+                QCoreApplication.processEvents()
+        finally:
+            self._pumping = False
+
+    def _send(self, lane: Lane, deadline):
+        burst = lane.burst
+        first = lane.slot == 0
+        # a slot that can't go now is dropped, sent later it would only be a stale copy of the next one
+        if not burst.in_flight.acquire(force=first):
+            lane.advance(get_monotonic_ms())
+            return
+        if burst.budget is not None and not burst.budget.take(burst.start_ms, force=first):
+            burst.in_flight.release(completed=False)
+            lane.advance(get_monotonic_ms())
+            return
+        prepared = lane.presigned.take(lane.slot)
+        if prepared:
+            request, body, built_ms = prepared
+        else:
+            request, body = lane.build_request(lane.slot)
+            built_ms = get_monotonic_ms()
+        trace = burst.tracer.begin('order', lane.slot, deadline, built_ms, lane.race_copy)
+        reply = self.http_manager.post(request, body)
+        sent_ms = get_monotonic_ms()
+        if trace is not None:
+            Tracer.attach(trace, reply)
+        burst.sent_count += 1
+        if burst.sends is not None:
+            burst.sends.append((deadline, sent_ms))
+        race = burst.race if first else None
+        self.replies[reply] = (burst, race, trace, sent_ms)
+        if first and not lane.race_copy:
+            self.first_dispatched.emit(burst, deadline, sent_ms)
+        lane.advance(sent_ms)
+
+    @Slot(QNetworkReply)
+    def _on_finished(self, reply: QNetworkReply):
+        if self.closing:
+            return
+        entry = self.replies.pop(reply, None)
+        if entry is not None:
+            self._on_replied(reply, *entry)
+            return
+        entry = self.warming.pop(reply, None)
+        if entry is not None:
+            self._on_warm_replied(*entry, reply)
+
+    def _on_replied(self, reply: QNetworkReply, burst: Burst, race, trace, sent_ms):
+        status_code = reply.attribute(QNetworkRequest.Attribute.HttpStatusCodeAttribute) or 0
+        canceled = reply.error() in (QNetworkReply.NetworkError.OperationCanceledError,
+                                     QNetworkReply.NetworkError.TimeoutError)
+        if canceled and burst.aborted:
+            burst.in_flight.release(completed=False, aborted=True)
+            reply.deleteLater()
+            if trace is not None:
+                trace.finish(0)
+            return  # the task is over, nothing for the order to judge
+        # otherwise it was the transfer timeout set by the order
+        burst.in_flight.release(timed_out=canceled)
+        if status_code:  # transport errors carry no round trip
+            burst.latency.add(get_monotonic_ms() - sent_ms)
+        data = reply.readAll().data()
+        rate_limited = not burst.detached and burst.order.is_rate_limited(status_code, data)
+        if rate_limited and burst.budget is not None:
+            burst.budget.throttled()
+        burst.profile.observe(status_code, rate_limited)
+        accepted = not burst.detached and burst.order.is_success_reply(status_code, data)
+        if accepted and burst.fills.count_fill():
+            # stop right here, the orders only learn about it after a trip through the GUI thread
+            for stopped in burst.fills.stop():
+                FiringEngine().abort_burst(stopped)
+        reply.deleteLater()
+        if trace is not None:
+            trace.finish(status_code, accepted, data)
+        self.replied.emit(burst, status_code, data, race)
+
+
+@singleton
+class FiringEngine(QObject):
+    """下单引擎：发送节奏全部在 GUI 线程之外完成，结果通过排队信号回到各订单"""
+
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+        self.dispatchers = []
+        for i in range(MAX_DISPATCHERS):
+            thread = QThread()
+            thread.setObjectName(f'dispatcher-{i}')
+            dispatcher = Dispatcher()
+            dispatcher.moveToThread(thread)
+            thread.started.connect(dispatcher.setup)
+            thread.finished.connect(dispatcher.deleteLater)  # its timers must die in its own thread
+            dispatcher.first_dispatched.connect(self._on_first_dispatched)
+            dispatcher.replied.connect(self._on_replied)
+            thread.start(QThread.Priority.TimeCriticalPriority)
+            self.threads.append(thread)
+            self.dispatchers.append(dispatcher)
+        QCoreApplication.instance().aboutToQuit.connect(self.shutdown)
+
+    def start_burst(self, burst: Burst, candidates=None):
+        # the dispatchers warmed up for this task, otherwise the least busy ones
+        copies = burst.race.copies if burst.race else 1
+        if candidates is None:
+            candidates = self._pick(max(burst.dispatchers, copies))
+        dispatchers = candidates[:max(1, burst.dispatchers)]
+        for offset, dispatcher in enumerate(dispatchers):
+            dispatcher.lane_requested.emit(Lane(burst, offset, len(dispatchers)))
+        # extra copies of the first order leave through other dispatchers, i.e. other connections
+        others = candidates[1:] or candidates
+        for i in range(copies - 1):
+            others[i % len(others)].lane_requested.emit(Lane(burst, 0, len(dispatchers), race_copy=True))
+
+    def warm_up(self, request: QNetworkRequest, dispatchers, connections, keepalive_ms) -> WarmPool:
+        pool = WarmPool(request, self._pick(dispatchers), connections, keepalive_ms)
+        for dispatcher in pool.dispatchers:
+            dispatcher.warm_requested.emit(pool)
+        return pool
+
+    def abort_burst(self, burst: Burst):
+        burst.aborted = True
+        for dispatcher in self.dispatchers:
+            dispatcher.abort_requested.emit(burst)
+
+    def shutdown(self):
+        for dispatcher in self.dispatchers:
+            QMetaObject.invokeMethod(dispatcher, 'teardown', Qt.ConnectionType.BlockingQueuedConnection)
+        for thread in self.threads:
+            thread.quit()
+            thread.wait()
+
+    def _pick(self, count):
+        count = max(1, min(count, len(self.dispatchers)))
+        return sorted(self.dispatchers, key=lambda d: (d.load(), sum(1 for p in d.pools if not p.closed)))[:count]
+
+    @Slot(object, float, float)
+    def _on_first_dispatched(self, burst: Burst, deadline_ms, sent_ms):
+        if not burst.detached:
+            burst.order.on_first_dispatched(deadline_ms, sent_ms)
+
+    @Slot(object, int, object, object)
+    def _on_replied(self, burst: Burst, status_code, data, race):
+        if not burst.detached:
+            burst.order.on_replied(status_code, data, race)
@@ -1,13 +1,15 @@
 import json
-from typing import cast
 
 from PySide6.QtCore import qDebug, Slot
 from PySide6.QtNetwork import QNetworkRequest, QNetworkReply, QNetworkAccessManager
 
+from ClockEstimator import ClockEstimator
+from LatencyStats import LatencyWindow
+from Tracing import Tracer
 from GateAPI.utils_gate import gen_signed_header
-from MiscSettings import GateConfiguration
+from Configuration import GateConfiguration
 from RestClient import RestBase, SymbolInfo, RestOrderBase
-from utils import get_timestamp, setup_header
+from utils import get_timestamp, get_monotonic_ms, setup_header
 import GateAPI.consts_gate as const
 
 def error_msg(status_code):
@@ -21,29 +23,52 @@ def error_msg(status_code):
     }
     return msg[status_code] if status_code in msg else '未知错误'
 
-class GateCommon(RestBase):
-    _delay_ms = 0
-    server_timestamp_base = 0
-    local_timestamp_base = 0
 
+SYMBOL_STATUS = {
+    'untradable': '无法交易',
+    'buyable': '仅可买入',
+    'sellable': '仅可卖出',
+    'tradable': '可以交易'
+}
+
+
+class GateCommon(RestBase):
     def __init__(self):
         super().__init__()
+        # the model maps the monotonic clock onto server time, wall time only seeds it before the first sync
+        self.estimator = ClockEstimator(initial_offset_ms=get_timestamp() - get_monotonic_ms())
+        self.tracer = Tracer(256, ring=True)
+        self.latency_window = LatencyWindow()
+        self.sync_count = 0
 
     @property
     def rectified_timestamp(self):
-        timestamp = self.server_timestamp_base + (get_timestamp() - self.local_timestamp_base)
-        return timestamp
+        return self.estimator.server_time(get_monotonic_ms())
 
     @property
     def delay_ms(self):
-        return self._delay_ms
+        return self.estimator.latency_ms
+
+    @property
+    def latency(self):
+        return self.latency_window
+
+    def local_deadline(self, server_timestamp):
+        return self.estimator.local_time(server_timestamp)
+
+    def server_timestamp(self, local_ms):
+        return self.estimator.server_time(local_ms)
 
     def request_utctime(self):
         request = QNetworkRequest(const.API_URL + const.SERVER_TIMESTAMP_URL)
         setup_header(const.HEADERS, request)
-        begin_ms = get_timestamp()
+        self.sync_count += 1
+        trace = self.tracer.begin('time', self.sync_count)
+        begin_ms = get_monotonic_ms()
         reply = self.http_manager.get(request)
-        reply.finished.connect(lambda: self._on_utc_replied(reply, begin_ms))
+        if trace is not None:
+            Tracer.attach(trace, reply)
+        reply.finished.connect(lambda: self._on_utc_replied(reply, begin_ms, trace))
 
     def request_symbol(self, symbol):
         url = const.API_URL + const.SYMBOL_INFO_URL + f'/{symbol}'
@@ -52,23 +77,27 @@ class GateCommon(RestBase):
         reply = self.http_manager.get(request)
         reply.finished.connect(lambda: self._on_symbol_info_replied(reply))
 
-    def _on_utc_replied(self, reply: QNetworkReply, begin_ms):
-        end_ms = get_timestamp()
-        delta_ms = (end_ms - begin_ms) // 2
-        self.local_timestamp_base = end_ms
-
-        # predict delay
-        delay = int(0.4 * self.delay_ms + 0.6 * delta_ms)
-        self._delay_ms = delay
+    def request_symbols(self):
+        request = QNetworkRequest(const.API_URL + const.SYMBOL_INFO_URL)
+        setup_header(const.HEADERS, request)
+        reply = self.http_manager.get(request)
+        reply.finished.connect(lambda: self._on_symbols_replied(reply))
 
+    def _on_utc_replied(self, reply: QNetworkReply, begin_ms, trace):
+        end_ms = get_monotonic_ms()
         data = reply.readAll().data()
+        if trace is not None:
+            trace.finish(reply.attribute(QNetworkRequest.Attribute.HttpStatusCodeAttribute) or 0)
+        reply.deleteLater()
         try:
             json_data = json.loads(data.decode('utf-8'))
         except:
             return
         utc = json_data['server_time']
-        self.server_timestamp_base = utc + self.delay_ms
-        reply.deleteLater()
+        if trace is not None:
+            trace.server_ms = utc
+        self.estimator.add_sample(begin_ms, end_ms, utc)
+        self.latency_window.add(end_ms - begin_ms, 'time')
 
         self.server_time_updated.emit()
 
@@ -77,24 +106,35 @@ class GateCommon(RestBase):
         if status_code != 200:
             qDebug(f'获取交易对出错：{error_msg(status_code)}')
             self.symbol_info_not_existed.emit('symbol')
+            reply.deleteLater()
             return
 
         data = reply.readAll().data()
+        reply.deleteLater()
         json_data = json.loads(data.decode('utf-8'))
-        status = json_data['trade_status']
-        status_dict = {
-            'untradable': '无法交易',
-            'buyable': '仅可买入',
-            'sellable': '仅可卖出',
-            'tradable': '可以交易'
-        }
-        info = SymbolInfo(json_data['id'], status_dict[status],
-                          json_data['precision'], json_data['amount_precision'])
-        self.symbol_info_updated.emit(info)
+        self.symbol_info_updated.emit(self._symbol_info(json_data))
+
+    def _on_symbols_replied(self, reply: QNetworkReply):
+        data = reply.readAll().data()
+        reply.deleteLater()
+        try:
+            infos = [self._symbol_info(entry) for entry in json.loads(data)]
+        except (ValueError, KeyError, TypeError):
+            qDebug(f'获取交易对列表出错: {data[:200]}')
+            self.symbols_list_failed.emit()
+            return
+        self.symbols_listed.emit(infos)
+
+    @staticmethod
+    def _symbol_info(entry):
+        status = entry['trade_status']
+        return SymbolInfo(entry['id'], SYMBOL_STATUS.get(status, status),
+                          int(entry['precision']), int(entry['amount_precision']),
+                          entry.get('min_quote_amount') or '0')
 
 
 class GateOrder(RestOrderBase):
-    common = GateCommon()
+    common = GateCommon.shared()
 
     def __init__(self, order_type: RestOrderBase.OrderType, symbol: str, price: str, quantity: str, interval=1,
                  trigger_timestamp=-1,
@@ -105,6 +145,8 @@ class GateOrder(RestOrderBase):
         config = GateConfiguration()
         self.API_KEY = api_key if api_key is not None else config.apikey()
         self.SECRET_KEY = secret_key if secret_key is not None else config.secretkey()
+        self.http2 = config.http2()
+        self.rate_limit = config.rate_limit()
         params = dict()
         params['currency_pair'] = self.symbol
         params['side'] = 'buy' if self.order_type == RestOrderBase.OrderType.Buy else 'sell'
@@ -113,10 +155,11 @@ class GateOrder(RestOrderBase):
         params['price'] = self.price
         params['amount'] = self.quantity
         self.params = params
+        self._signed_cache = {}
 
-        self.common.server_time_updated.connect(self.server_time_updated.emit)
-        self.common.symbol_info_updated.connect(self.symbol_info_updated.emit)
-        self.common.symbol_info_not_existed.connect(self.symbol_info_not_existed.emit)
+        self.common.server_time_updated.connect(self.server_time_updated)
+        self.common.symbol_info_updated.connect(self.symbol_info_updated)
+        self.common.symbol_info_not_existed.connect(self.symbol_info_not_existed)
 
     @property
     def rectified_timestamp(self):
@@ -126,55 +169,91 @@ class GateOrder(RestOrderBase):
     def delay_ms(self):
         return self.common.delay_ms
 
+    @property
+    def latency(self):
+        return self.common.latency
+
+    def local_deadline(self, server_timestamp):
+        return self.common.local_deadline(server_timestamp)
+
+    def server_timestamp(self, local_ms):
+        return self.common.server_timestamp(local_ms)
+
     def request_utctime(self):
         self.common.request_utctime()
 
     def request_symbol(self, symbol):
         self.common.request_symbol(symbol)
 
-    def order_trigger_start_event(self):
-        super().order_trigger_start_event()
+    def request_symbols(self):
+        self.common.request_symbols()
+
+    def order_trigger_start_event(self, start_ms=None):
+        super().order_trigger_start_event(start_ms)
         qDebug(f'开始执行下单: {str(self.params)}')
 
-    def order_trigger_event(self):
-        minimum_timestamp = self.trigger_timestamp
-        reply = self._request('/api/v4/spot/orders', self.params, minimum_timestamp)
-        reply.finished.connect(self._on_replied)
+    def build_order_request(self, dispatch_ms=None, client_id=None):
+        params = self.params if client_id is None else self.params | {'text': f't-{client_id}'}
+        return self._build_request('/api/v4/spot/orders', params, self.sign_timestamp(dispatch_ms))
+
+    def warm_up_request(self):
+        request = self.setup_transport(QNetworkRequest(const.API_URL + const.SERVER_TIMESTAMP_URL))
+        setup_header(const.HEADERS, request)
+        return request
 
     def cancel_order(self):
         pass
 
-    def _request(self, api_path, params, minimum_timestamp=None):
-        url = const.API_URL + api_path
+    def _build_request(self, api_path, params, timestamp):
+        # Gate signs whole seconds, every request of the same second is identical
+        timestamp_s = int(timestamp / 1000)
+        key = (api_path, timestamp_s, params.get('text'))
+        prepared = self._signed_cache.get(key)
+        if prepared is not None:
+            return prepared
 
-        timestamp = self.rectified_timestamp
-        if minimum_timestamp is not None:
-            timestamp = max(timestamp, minimum_timestamp)
+        url = const.API_URL + api_path
 
         # sign & header
         body = json.dumps(params)
-        sign_headers = gen_signed_header(self.API_KEY, self.SECRET_KEY, int(timestamp / 1000), 'POST', api_path, None, body)
-        headers = const.HEADERS
-        headers.update(sign_headers)
+        sign_headers = gen_signed_header(self.API_KEY, self.SECRET_KEY, timestamp_s, 'POST', api_path, None, body)
+        headers = const.HEADERS | sign_headers  # built from several threads, never touch the shared dict
 
-        request = QNetworkRequest(url)
+        request = self.setup_transport(QNetworkRequest(url))
         setup_header(headers, request)
-        reply = self.http_manager.post(request, body.encode())
-        return reply
+        prepared = request, body.encode()
+        if len(self._signed_cache) > 16:
+            self._signed_cache.clear()
+        self._signed_cache[key] = prepared
+        return prepared
+
+    def is_success_reply(self, status_code, data):
+        return status_code == 200 or status_code == 201
+
+    def is_rate_limited(self, status_code, data):
+        if status_code == 429:
+            return True
+        if status_code == 200 or status_code == 201:
+            return False
+        try:
+            return json.loads(data)['label'] == 'TOO_MANY_REQUESTS'
+        except (ValueError, KeyError, TypeError):
+            return False
 
-    def _on_replied(self):
-        reply = cast(QNetworkReply, self.sender())
-        status_code = reply.attribute(QNetworkRequest.Attribute.HttpStatusCodeAttribute)
-        data = reply.readAll().data()
+    def reply_server_ms(self, data):
+        return float(json.loads(data)['create_time_ms'])  # only orders that were accepted
+
+    def handle_reply(self, status_code, data):
         json_data = json.loads(data)
         if status_code == 200 or status_code == 201:
             order_id = json_data['id']
             self.order_records.append(int(order_id))
             self.succeed_count += 1
             self.error_code = status_code
-            self.stop_order_trigger()
-            if self.succeed_count == 1:
+            if self.on_filled():
                 qDebug(f'挂单成功，结束任务：{str(self.params)}')
+            elif self.succeed_count < self.max_fills:
+                qDebug(f'挂单成功 {self.succeed_count}/{self.max_fills}：{str(self.params)}')
             self.succeed.emit()
         else:
             self.failed_count += 1
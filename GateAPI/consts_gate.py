@@ -1,5 +1,7 @@
-# Base Url
-API_URL = 'https://api.gateio.ws'
+import os
+
+# Base Url, overridable to point at a local mock (MockExchange.py)
+API_URL = os.environ.get('GATE_API_URL', 'https://api.gateio.ws')
 SERVER_TIMESTAMP_URL = '/api/v4/spot/time'
 SYMBOL_INFO_URL = '/api/v4/spot/currency_pairs'
 # http header
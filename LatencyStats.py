@@ -0,0 +1,57 @@
+import threading
+from collections import deque
+
+from utils import get_monotonic_ms
+
+
+class LatencyWindow:
+    """一个交易所最近的往返延迟样本（对时和下单回执），按需给出 p50/p90/p99/max，可以从发送线程写入"""
+
+    def __init__(self, window_s=60, max_samples=4096):
+        self.window_ms = window_s * 1000
+        self.samples = deque(maxlen=max_samples)  # (monotonic ms, rtt ms, source)
+        self.version = 0  # bumped per sample, readers redraw only when it moved
+        self._lock = threading.Lock()
+        self._stats = {}  # source -> (version, expires at, stats)
+
+    def add(self, rtt_ms, source='order'):
+        with self._lock:
+            self.samples.append((get_monotonic_ms(), rtt_ms, source))
+            self.version += 1
+
+    def recent(self, count):
+        with self._lock:
+            return [rtt for _, rtt, _ in list(self.samples)[-count:]]
+
+    def stats(self, source=None):
+        # cached until the next sample or until the oldest sample in it leaves the window, the status bar and the
+        # scheduler can ask as often as they like
+        now = get_monotonic_ms()
+        cached = self._stats.get(source)
+        if cached is not None and cached[0] == self.version and now < cached[1]:
+            return cached[2]
+        with self._lock:
+            version = self.version
+            horizon = now - self.window_ms
+            recent = [(t, rtt, s) for t, rtt, s in self.samples if t >= horizon and (source is None or s == source)]
+        expires_ms = recent[0][0] + self.window_ms if recent else float('inf')
+        values = sorted(rtt for _, rtt, _ in recent)
+        if not values:
+            stats = None
+        else:
+            sources = {}
+            for _, _, s in recent:
+                sources[s] = sources.get(s, 0) + 1
+
+            def pick(p):
+                return values[min(len(values) - 1, int(len(values) * p))]
+            stats = {'count': len(values), 'p50': pick(0.5), 'p90': pick(0.9), 'p99': pick(0.99),
+                     'max': values[-1], 'sources': sources}
+        self._stats[source] = (version, expires_ms, stats)
+        return stats
+
+    def describe(self):
+        stats = self.stats()
+        if stats is None:
+            return '-'
+        return f"p50 {stats['p50']:.1f} / p99 {stats['p99']:.1f}ms"
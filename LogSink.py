@@ -0,0 +1,102 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from logging.handlers import QueueListener, RotatingFileHandler
+
+from PySide6.QtCore import QObject, QTimer, QtMsgType, QCoreApplication
+from PySide6.QtWidgets import QPlainTextEdit
+
+FLUSH_INTERVAL_MS = 100
+VISIBLE_LINES = 5000  # the view drops its oldest lines beyond this
+PENDING_LINES = 20000  # between two flushes, the oldest are dropped if the GUI thread falls this far behind
+REPEAT_WINDOW_S = 1.0
+REPEATS_PER_WINDOW = 3  # identical messages shown per window, the rest are counted
+FILE_MAX_BYTES = 5 * 1024 * 1024
+FILE_BACKUPS = 5
+
+MSG_TYPES = {
+    QtMsgType.QtDebugMsg: "DEBUG",
+    QtMsgType.QtInfoMsg: "INFO",
+    QtMsgType.QtWarningMsg: "WARNING",
+    QtMsgType.QtCriticalMsg: "CRITICAL",
+    QtMsgType.QtFatalMsg: "FATAL",
+}
+
+
+class LogSink(QObject):
+    """Qt 日志出口：任意线程只管入队，界面定时成批刷新并限制行数，文件由后台线程完整写入并轮转；相同消息在短时间内只显示几条"""
+
+    def __init__(self, view: QPlainTextEdit, path):
+        super().__init__(view)
+        self.view = view
+        view.setMaximumBlockCount(VISIBLE_LINES)
+
+        self.pending = deque()
+        self.lock = threading.Lock()
+        self.repeats = {}  # (type, message) -> [shown, suppressed, last suppressed line] within the window
+        self.window_start = time.monotonic()
+        self.dropped_count = 0
+        self.dropped_reported = 0
+        self.suppressed_count = 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handler = RotatingFileHandler(path, maxBytes=FILE_MAX_BYTES, backupCount=FILE_BACKUPS, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        self.file_queue = queue.SimpleQueue()
+        self.file_writer = QueueListener(self.file_queue, handler)
+        self.file_writer.start()
+
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setInterval(FLUSH_INTERVAL_MS)
+        self.flush_timer.timeout.connect(self.flush)
+        self.flush_timer.start()
+        QCoreApplication.instance().aboutToQuit.connect(self.close)
+
+    def __call__(self, mode, context, message):
+        # the Qt message handler, called from whichever thread logged
+        msg_type = MSG_TYPES.get(mode, "UNKNOWN")
+        line = f"[{msg_type} {time.strftime('%H:%M:%S')}] {message}"
+        self.file_queue.put(logging.makeLogRecord({'msg': line}))  # the file keeps every line
+        key = (msg_type, message)
+        with self.lock:
+            repeat = self.repeats.get(key)
+            if repeat is None:
+                self.repeats[key] = [1, 0, None]
+            elif repeat[0] < REPEATS_PER_WINDOW:
+                repeat[0] += 1
+            else:
+                repeat[1] += 1
+                repeat[2] = line
+                return
+            if len(self.pending) >= PENDING_LINES:
+                self.pending.popleft()
+                self.dropped_count += 1
+            self.pending.append(line)
+
+    def flush(self):
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= REPEAT_WINDOW_S:
+                for shown, suppressed, last in self.repeats.values():
+                    if suppressed:
+                        self.suppressed_count += suppressed
+                        self.pending.append(f'{last} (相同消息 1 秒内另有 {suppressed} 条未显示)')
+                self.repeats.clear()
+                self.window_start = now
+            if self.dropped_count > self.dropped_reported:
+                self.pending.append(f'(界面来不及显示，丢弃了 {self.dropped_count - self.dropped_reported} 条日志)')
+                self.dropped_reported = self.dropped_count
+            lines = list(self.pending)
+            self.pending.clear()
+        if not lines:
+            return
+        self.view.appendPlainText('\n'.join(lines))
+
+    def close(self):
+        self.flush_timer.stop()
+        self.window_start = 0.0  # report what the last window held back
+        self.flush()
+        self.file_writer.stop()
@@ -1,13 +1,15 @@
 import json
-from typing import cast
 
 from PySide6.QtCore import qDebug, Slot
 from PySide6.QtNetwork import QNetworkRequest, QNetworkReply, QNetworkAccessManager
 
+from ClockEstimator import ClockEstimator
+from LatencyStats import LatencyWindow
+from Tracing import Tracer
 from MEXCAPI.utils_mexc import gen_signed_body
-from MiscSettings import MexcConfiguration
+from Configuration import MexcConfiguration
 from RestClient import RestBase, SymbolInfo, RestOrderBase
-from utils import get_timestamp, setup_header
+from utils import get_timestamp, get_monotonic_ms, setup_header
 import MEXCAPI.consts_mexc as const
 
 def error_msg(status_code):
@@ -18,28 +20,50 @@ def error_msg(status_code):
     }
     return msg[status_code] if status_code in msg else '未知错误'
 
-class MexcCommon(RestBase):
-    _delay_ms = 0
-    server_timestamp_base = 0
-    local_timestamp_base = 0
 
+SYMBOL_STATUS = {
+    '1': '上架',
+    '2': '暂停',
+    '3': '下架'
+}
+
+
+class MexcCommon(RestBase):
     def __init__(self):
         super().__init__()
+        # the model maps the monotonic clock onto server time, wall time only seeds it before the first sync
+        self.estimator = ClockEstimator(initial_offset_ms=get_timestamp() - get_monotonic_ms())
+        self.tracer = Tracer(256, ring=True)
+        self.latency_window = LatencyWindow()
+        self.sync_count = 0
 
     @property
     def rectified_timestamp(self):
-        timestamp = self.server_timestamp_base + (get_timestamp() - self.local_timestamp_base)
-        return timestamp
+        return self.estimator.server_time(get_monotonic_ms())
 
     @property
     def delay_ms(self):
-        return self._delay_ms
+        return self.estimator.latency_ms
+
+    @property
+    def latency(self):
+        return self.latency_window
+
+    def local_deadline(self, server_timestamp):
+        return self.estimator.local_time(server_timestamp)
+
+    def server_timestamp(self, local_ms):
+        return self.estimator.server_time(local_ms)
 
     def request_utctime(self):
         request = QNetworkRequest(const.API_URL + const.SERVER_TIMESTAMP_URL)
-        begin_ms = get_timestamp()
+        self.sync_count += 1
+        trace = self.tracer.begin('time', self.sync_count)
+        begin_ms = get_monotonic_ms()
         reply = self.http_manager.get(request)
-        reply.finished.connect(lambda: self._on_utc_replied(reply, begin_ms))
+        if trace is not None:
+            Tracer.attach(trace, reply)
+        reply.finished.connect(lambda: self._on_utc_replied(reply, begin_ms, trace))
 
     def request_symbol(self, symbol):
         url = const.API_URL + const.SYMBOL_INFO_URL + f'?symbol={symbol}'
@@ -48,23 +72,27 @@ class MexcCommon(RestBase):
         reply = self.http_manager.get(request)
         reply.finished.connect(lambda: self._on_symbol_info_replied(reply))
 
-    def _on_utc_replied(self, reply: QNetworkReply, begin_ms):
-        end_ms = get_timestamp()
-        delta_ms = (end_ms - begin_ms) // 2
-        self.local_timestamp_base = end_ms
-
-        # predict delay
-        delay = int(0.4 * self.delay_ms + 0.6 * delta_ms)
-        self._delay_ms = delay
+    def request_symbols(self):
+        request = QNetworkRequest(const.API_URL + const.SYMBOL_INFO_URL)
+        setup_header(const.HEADERS, request)
+        reply = self.http_manager.get(request)
+        reply.finished.connect(lambda: self._on_symbols_replied(reply))
 
+    def _on_utc_replied(self, reply: QNetworkReply, begin_ms, trace):
+        end_ms = get_monotonic_ms()
         data = reply.readAll().data()
+        if trace is not None:
+            trace.finish(reply.attribute(QNetworkRequest.Attribute.HttpStatusCodeAttribute) or 0)
+        reply.deleteLater()
         try:
             json_data = json.loads(data.decode('utf-8'))
         except:
             return
         utc = json_data['serverTime']
-        self.server_timestamp_base = utc + self.delay_ms
-        reply.deleteLater()
+        if trace is not None:
+            trace.server_ms = utc
+        self.estimator.add_sample(begin_ms, end_ms, utc)
+        self.latency_window.add(end_ms - begin_ms, 'time')
 
         self.server_time_updated.emit()
 
@@ -73,24 +101,36 @@ class MexcCommon(RestBase):
         if status_code != 200:
             qDebug(f'获取交易对出错：{error_msg(status_code)}')
             self.symbol_info_not_existed.emit('symbol')
+            reply.deleteLater()
             return
 
         data = reply.readAll().data()
+        reply.deleteLater()
         json_data = json.loads(data.decode('utf-8'))
-        json_data = json_data['symbols'][0]
-        status = json_data['status']
-        status_dict = {
-            '1': '上架',
-            '2': '暂停',
-            '3': '下架'
-        }
-        info = SymbolInfo(json_data['symbol'], status_dict[status],
-                          json_data['quotePrecision'], json_data['quoteAssetPrecision'])
-        self.symbol_info_updated.emit(info)
+        self.symbol_info_updated.emit(self._symbol_info(json_data['symbols'][0]))
+
+    def _on_symbols_replied(self, reply: QNetworkReply):
+        data = reply.readAll().data()
+        reply.deleteLater()
+        try:
+            infos = [self._symbol_info(entry) for entry in json.loads(data)['symbols']]
+        except (ValueError, KeyError, TypeError):
+            qDebug(f'获取交易对列表出错: {data[:200]}')
+            self.symbols_list_failed.emit()
+            return
+        self.symbols_listed.emit(infos)
+
+    @staticmethod
+    def _symbol_info(entry):
+        status = entry['status']
+        # quoteAssetPrecision is the quote side's, the quantity is counted in the base asset
+        return SymbolInfo(entry['symbol'], SYMBOL_STATUS.get(status, status),
+                          int(entry['quotePrecision']), int(entry['baseAssetPrecision']),
+                          entry.get('quoteAmountPrecision') or '0')
 
 
 class MexcOrder(RestOrderBase):
-    common = MexcCommon()
+    common = MexcCommon.shared()
 
     def __init__(self, order_type: RestOrderBase.OrderType, symbol: str, price: str, quantity: str, interval=1,
                  trigger_timestamp=-1,
@@ -101,6 +141,8 @@ class MexcOrder(RestOrderBase):
         config = MexcConfiguration()
         self.API_KEY = api_key if api_key is not None else config.apikey()
         self.SECRET_KEY = secret_key if secret_key is not None else config.secretkey()
+        self.http2 = config.http2()
+        self.rate_limit = config.rate_limit()
         params = dict()
         params['symbol'] = self.symbol
         params['side'] = 'BUY' if self.order_type == RestOrderBase.OrderType.Buy else 'SELL'
@@ -109,9 +151,9 @@ class MexcOrder(RestOrderBase):
         params['quantity'] = self.quantity
         self.params = params
 
-        self.common.server_time_updated.connect(self.server_time_updated.emit)
-        self.common.symbol_info_updated.connect(self.symbol_info_updated.emit)
-        self.common.symbol_info_not_existed.connect(self.symbol_info_not_existed.emit)
+        self.common.server_time_updated.connect(self.server_time_updated)
+        self.common.symbol_info_updated.connect(self.symbol_info_updated)
+        self.common.symbol_info_not_existed.connect(self.symbol_info_not_existed)
 
     @property
     def rectified_timestamp(self):
@@ -121,60 +163,69 @@ class MexcOrder(RestOrderBase):
     def delay_ms(self):
         return self.common.delay_ms
 
+    @property
+    def latency(self):
+        return self.common.latency
+
+    def local_deadline(self, server_timestamp):
+        return self.common.local_deadline(server_timestamp)
+
+    def server_timestamp(self, local_ms):
+        return self.common.server_timestamp(local_ms)
+
     def request_utctime(self):
         self.common.request_utctime()
 
     def request_symbol(self, symbol):
         self.common.request_symbol(symbol)
 
-    def order_trigger_5s_countdown_event(self):
-        self._head('/api/v3/order', self.params)
+    def request_symbols(self):
+        self.common.request_symbols()
 
-    def order_trigger_start_event(self):
-        super().order_trigger_start_event()
+    def order_trigger_start_event(self, start_ms=None):
+        super().order_trigger_start_event(start_ms)
         qDebug(f'开始执行下单: {str(self.params)}')
 
-    def order_trigger_event(self):
-        minimum_timestamp = self.trigger_timestamp
-        reply = self._request('/api/v3/order', self.params, minimum_timestamp)
-        reply.finished.connect(self._on_replied)
+    def build_order_request(self, dispatch_ms=None, client_id=None):
+        params = self.params if client_id is None else self.params | {'newClientOrderId': client_id}
+        return self._build_request('/api/v3/order', params, self.sign_timestamp(dispatch_ms))
+
+    def warm_up_request(self):
+        return self.setup_transport(QNetworkRequest(const.API_URL + const.SERVER_TIMESTAMP_URL))
 
     def cancel_order(self):
         pass
 
-    def _request(self, api_path, params, minimum_timestamp=None):
+    def _build_request(self, api_path, params, timestamp):
         url = const.API_URL + api_path
 
-        timestamp = self.rectified_timestamp
-        if minimum_timestamp is not None:
-            timestamp = max(timestamp, minimum_timestamp)
-
         # sign & header
         params = params | {'timestamp': timestamp}
         body = gen_signed_body(self.SECRET_KEY, timestamp, params)
         headers = const.HEADERS.copy()
         headers['X-MEXC-APIKEY'] = self.API_KEY
 
-        request = QNetworkRequest(url)
+        request = self.setup_transport(QNetworkRequest(url))
         setup_header(headers, request)
-        reply = self.http_manager.post(request, body.encode())
-        return reply
+        return request, body.encode()
 
-    def _head(self, api_path, params, minimum_timestamp=None):
-        url = const.API_URL + api_path
+    def is_success_reply(self, status_code, data):
+        return status_code == 200 or status_code == 201
 
-        headers = const.HEADERS.copy()
-        headers['X-MEXC-APIKEY'] = self.API_KEY
+    def is_rate_limited(self, status_code, data):
+        if status_code == 429:
+            return True
+        if status_code == 200 or status_code == 201:
+            return False
+        try:
+            return json.loads(data)['code'] in (429, 510)  # too many requests, excessive frequency
+        except (ValueError, KeyError, TypeError):
+            return False
 
-        request = QNetworkRequest(url)
-        setup_header(headers, request)
-        reply = self.http_manager.head(request)
-        return reply
+    def reply_server_ms(self, data):
+        return int(json.loads(data)['transactTime'])  # only orders that were accepted
 
-    def _on_replied(self):
-        reply = cast(QNetworkReply, self.sender())
-        status_code = reply.attribute(QNetworkRequest.Attribute.HttpStatusCodeAttribute)
-        data = reply.readAll().data()
+    def handle_reply(self, status_code, data):
         try:
             json_data = json.loads(data)
         except:
@@ -183,9 +234,10 @@ class MexcOrder(RestOrderBase):
             order_id = json_data['orderId']
             self.order_records.append(order_id)
             self.succeed_count += 1
-            self.stop_order_trigger()
-            if self.succeed_count == 1:
+            if self.on_filled():
                 qDebug(f'挂单成功，结束任务：{str(self.params)}')
+            elif self.succeed_count < self.max_fills:
+                qDebug(f'挂单成功 {self.succeed_count}/{self.max_fills}：{str(self.params)}')
             self.succeed.emit()
         else:
             msg_code = json_data['code']
@@ -1,5 +1,7 @@
-# Base Url
-API_URL = 'https://api.mexc.com'
+import os
+
+# Base Url, overridable to point at a local mock (MockExchange.py)
+API_URL = os.environ.get('MEXC_API_URL', 'https://api.mexc.com')
 SERVER_TIMESTAMP_URL = '/api/v3/time'
 SYMBOL_INFO_URL = '/api/v3/exchangeInfo'
 # http header
@@ -1,27 +1,17 @@
-from typing import Union
+import os
 
 from PySide6 import QtWidgets, QtCore
-from PySide6.QtCore import Qt, QtMsgType, qInstallMessageHandler, QDateTime
-from PySide6.QtWidgets import QGridLayout, QPushButton, QTextBrowser
+from PySide6.QtCore import Qt, qInstallMessageHandler, QStandardPaths
+from PySide6.QtWidgets import QGridLayout, QPushButton, QPlainTextEdit
 
 import MiscSettings
-from MiscSettings import BitgetConfiguration
+from LogSink import LogSink
+from OrdersDB import Database
+from Configuration import BitgetConfiguration
 from PlaceOrderEdit import PlaceOrderWidget
 from OrderTable import OrderTableView
 from TimeStatus import UTCTimeWidget
 
-log_window: Union[QTextBrowser, None] = None
-def qt_message_handler(mode, context, message):
-    msg_type = {
-        QtMsgType.QtDebugMsg: "DEBUG",
-        QtMsgType.QtInfoMsg: "INFO",
-        QtMsgType.QtWarningMsg: "WARNING",
-        QtMsgType.QtCriticalMsg: "CRITICAL",
-        QtMsgType.QtFatalMsg: "FATAL",
-    }.get(mode, "UNKNOWN")
-
-    formatted_message = f"[{msg_type} {QDateTime.currentDateTime().toString('hh:mm:ss')}] {message}"
-    log_window.append(formatted_message)
 
 class MainWindow(QtWidgets.QWidget):
     def __init__(self):
@@ -44,7 +34,8 @@ class MainWindow(QtWidgets.QWidget):
         layout.addWidget(status_view, 1, 1, 1, 1)
 
         # log
-        log = QTextBrowser()
+        log = QPlainTextEdit()
+        log.setReadOnly(True)
         layout.addWidget(log, 2, 0, 1, 2)
 
         layout.setColumnStretch(0, 0)
@@ -58,7 +49,10 @@ class MainWindow(QtWidgets.QWidget):
             self.misc.exec()
         misc_btn.clicked.connect(lambda : self.misc.exec())
 
-        # message redirect to log
-        global log_window
-        log_window = log
-        qInstallMessageHandler(qt_message_handler)
+        # message redirect to log, batched into the view and a rotated file
+        directory = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.AppDataLocation)
+        self.log_sink = LogSink(log, os.path.join(directory, 'logs', 'coinrobot.log'))
+        qInstallMessageHandler(self.log_sink)
+
+        # scheduled tasks of the last run, after the log redirect so the restore shows up there
+        Database().restore()
@@ -1,164 +1,30 @@
 from PySide6 import QtWidgets
-from PySide6.QtCore import QSettings
-from PySide6.QtNetwork import QNetworkProxy
-from PySide6.QtWidgets import QLabel, QLineEdit, QSpacerItem, QRadioButton, QPushButton, QWidget, QGridLayout
+from PySide6.QtWidgets import QLabel, QLineEdit, QSpacerItem, QRadioButton, QPushButton, QWidget, QGridLayout, \
+    QCheckBox, QPlainTextEdit
 
+from Configuration import ProxyConfiguration, BitgetConfiguration, GateConfiguration, MexcConfiguration, \
+    WarmupConfiguration, FiringConfiguration, apply_proxy
 
-class Configuration:
-    settings = QSettings("Li.Player", "CoinRobot")
 
-class ProxyConfiguration(Configuration):
-    def __init__(self):
-        super().__init__()
+def accounts_editor(accounts, keys):
+    # one account per line, fields separated by commas
+    editor = QPlainTextEdit('\n'.join(','.join(account[key] for key in keys) for account in accounts))
+    editor.setPlaceholderText('每行一个账户: ' + ','.join(keys))
+    editor.setFixedHeight(60)
+    return editor
 
-    def use_proxy(self):
-        self.settings.beginGroup('Proxy')
-        ret = bool(self.settings.value("use_proxy", False, type=bool))
-        self.settings.endGroup()
-        return ret
 
-    def set_use_proxy(self, value):
-        self.settings.beginGroup('Proxy')
-        self.settings.setValue("use_proxy", value)
-        self.settings.endGroup()
+def parse_accounts(editor: QPlainTextEdit, keys):
+    accounts = []
+    for line in editor.toPlainText().splitlines():
+        fields = [field.strip() for field in line.split(',')]
+        if len(fields) >= 3 and all(fields[:3]):  # name and both keys, Bitget's passphrase may follow
+            accounts.append(dict(zip(keys, fields + [''] * (len(keys) - len(fields)))))
+    return accounts
 
-    def proxy_ip(self):
-        self.settings.beginGroup('Proxy')
-        ret = str(self.settings.value("proxy_ip", "127.0.0.1"))
-        self.settings.endGroup()
-        return ret
 
-    def set_proxy_ip(self, value):
-        self.settings.beginGroup('Proxy')
-        self.settings.setValue("proxy_ip", value)
-        self.settings.endGroup()
-
-    def proxy_port(self) -> int:
-        self.settings.beginGroup('Proxy')
-        ret = self.settings.value("proxy_port", defaultValue=1080, type=int)
-        self.settings.endGroup()
-        return ret
-
-    def set_proxy_port(self, value: int):
-        self.settings.beginGroup('Proxy')
-        self.settings.setValue("proxy_port", value)
-        self.settings.endGroup()
-
-
-class BitgetConfiguration(Configuration):
-
-    def __init__(self):
-        super().__init__()
-
-    def __del__(self):
-        self.settings.sync()
-
-    def apikey(self):
-        self.settings.beginGroup('Bitget')
-        ret = str(self.settings.value("APIKey", ""))
-        self.settings.endGroup()
-        return ret
-
-    def set_apikey(self, value):
-        self.settings.beginGroup('Bitget')
-        self.settings.setValue("APIKey", value)
-        self.settings.endGroup()
-
-    def secretkey(self):
-        self.settings.beginGroup('Bitget')
-        ret = str(self.settings.value("Secretkey", ""))
-        self.settings.endGroup()
-        return ret
-
-    def set_secretkey(self, value):
-        self.settings.beginGroup('Bitget')
-        self.settings.setValue("Secretkey", value)
-        self.settings.endGroup()
-
-    def passphrase(self):
-        self.settings.beginGroup('Bitget')
-        ret = str(self.settings.value("Passphrase", ""))
-        self.settings.endGroup()
-        return ret
-
-    def set_passphrase(self, value):
-        self.settings.beginGroup('Bitget')
-        self.settings.setValue("Passphrase", value)
-        self.settings.endGroup()
-
-
-class GateConfiguration(Configuration):
-
-    def __init__(self):
-        super().__init__()
-
-    def __del__(self):
-        self.settings.sync()
-
-    def apikey(self):
-        self.settings.beginGroup('Gate')
-        ret = str(self.settings.value("APIKey", ""))
-        self.settings.endGroup()
-        return ret
-
-    def set_apikey(self, value):
-        self.settings.beginGroup('Gate')
-        self.settings.setValue("APIKey", value)
-        self.settings.endGroup()
-
-    def secretkey(self):
-        self.settings.beginGroup('Gate')
-        ret = str(self.settings.value("Secretkey", ""))
-        self.settings.endGroup()
-        return ret
-
-    def set_secretkey(self, value):
-        self.settings.beginGroup('Gate')
-        self.settings.setValue("Secretkey", value)
-        self.settings.endGroup()
-
-
-
-class MexcConfiguration(Configuration):
-
-    def __init__(self):
-        super().__init__()
-
-    def __del__(self):
-        self.settings.sync()
-
-    def apikey(self):
-        self.settings.beginGroup('Mexc')
-        ret = str(self.settings.value("APIKey", ""))
-        self.settings.endGroup()
-        return ret
-
-    def set_apikey(self, value):
-        self.settings.beginGroup('Mexc')
-        self.settings.setValue("APIKey", value)
-        self.settings.endGroup()
-
-    def secretkey(self):
-        self.settings.beginGroup('Mexc')
-        ret = str(self.settings.value("Secretkey", ""))
-        self.settings.endGroup()
-        return ret
-
-    def set_secretkey(self, value):
-        self.settings.beginGroup('Mexc')
-        self.settings.setValue("Secretkey", value)
-        self.settings.endGroup()
-
-
-def _apply_proxy():
-    proxy = ProxyConfiguration()
-    if proxy.use_proxy():
-        proxy = QNetworkProxy(QNetworkProxy.ProxyType.HttpProxy,
-                              proxy.proxy_ip(), proxy.proxy_port())
-        QNetworkProxy.setApplicationProxy(proxy)
-    else:
-        proxy = QNetworkProxy(QNetworkProxy.ProxyType.NoProxy)
-        QNetworkProxy.setApplicationProxy(proxy)
+BITGET_ACCOUNT_KEYS = ('name', 'api_key', 'secret_key', 'passphrase')
+ACCOUNT_KEYS = ('name', 'api_key', 'secret_key')
 
 
 class MiscSettingWidget(QtWidgets.QDialog):
@@ -182,6 +48,18 @@ class MiscSettingWidget(QtWidgets.QDialog):
         bitget_layout.addWidget(QLabel("Passphrase:"), 2, 0)
         self.bitget_passphrase = QLineEdit(bitget.passphrase())
         bitget_layout.addWidget(self.bitget_passphrase, 2, 1)
+        # http2
+        self.bitget_http2 = QCheckBox("HTTP/2 下单")
+        self.bitget_http2.setChecked(bitget.http2())
+        bitget_layout.addWidget(self.bitget_http2, 3, 1)
+        # rate limit
+        bitget_layout.addWidget(QLabel("限频(次/秒):"), 4, 0)
+        self.bitget_rate_limit = QLineEdit(str(bitget.rate_limit()))
+        bitget_layout.addWidget(self.bitget_rate_limit, 4, 1)
+        # further accounts
+        bitget_layout.addWidget(QLabel("附加账户:"), 5, 0)
+        self.bitget_accounts = accounts_editor(bitget.accounts(), BITGET_ACCOUNT_KEYS)
+        bitget_layout.addWidget(self.bitget_accounts, 5, 1)
         layout.addLayout(bitget_layout)
 
         # space
@@ -199,6 +77,18 @@ class MiscSettingWidget(QtWidgets.QDialog):
         gate_layout.addWidget(QLabel("SecretKey:"), 1, 0)
         self.gate_secret_key = QLineEdit(gate.secretkey())
         gate_layout.addWidget(self.gate_secret_key, 1, 1)
+        # http2
+        self.gate_http2 = QCheckBox("HTTP/2 下单")
+        self.gate_http2.setChecked(gate.http2())
+        gate_layout.addWidget(self.gate_http2, 2, 1)
+        # rate limit
+        gate_layout.addWidget(QLabel("限频(次/秒):"), 3, 0)
+        self.gate_rate_limit = QLineEdit(str(gate.rate_limit()))
+        gate_layout.addWidget(self.gate_rate_limit, 3, 1)
+        # further accounts
+        gate_layout.addWidget(QLabel("附加账户:"), 4, 0)
+        self.gate_accounts = accounts_editor(gate.accounts(), ACCOUNT_KEYS)
+        gate_layout.addWidget(self.gate_accounts, 4, 1)
         layout.addLayout(gate_layout)
 
         # space
@@ -216,8 +106,53 @@ class MiscSettingWidget(QtWidgets.QDialog):
         mexc_layout.addWidget(QLabel("SecretKey:"), 1, 0)
         self.mexc_secret_key = QLineEdit(mexc.secretkey())
         mexc_layout.addWidget(self.mexc_secret_key, 1, 1)
+        # http2
+        self.mexc_http2 = QCheckBox("HTTP/2 下单")
+        self.mexc_http2.setChecked(mexc.http2())
+        mexc_layout.addWidget(self.mexc_http2, 2, 1)
+        # rate limit
+        mexc_layout.addWidget(QLabel("限频(次/秒):"), 3, 0)
+        self.mexc_rate_limit = QLineEdit(str(mexc.rate_limit()))
+        mexc_layout.addWidget(self.mexc_rate_limit, 3, 1)
+        # further accounts
+        mexc_layout.addWidget(QLabel("附加账户:"), 4, 0)
+        self.mexc_accounts = accounts_editor(mexc.accounts(), ACCOUNT_KEYS)
+        mexc_layout.addWidget(self.mexc_accounts, 4, 1)
         layout.addLayout(mexc_layout)
 
+        # space
+        layout.addItem(QSpacerItem(20, 20))
+
+        # connection warm-up
+        layout.addWidget(QLabel('连接预热:'))
+        warmup = WarmupConfiguration()
+        warmup_layout = QGridLayout()
+        warmup_layout.addWidget(QLabel("每线程连接数:"), 0, 0)
+        self.warmup_connections = QLineEdit(str(warmup.connections()))
+        warmup_layout.addWidget(self.warmup_connections, 0, 1)
+        warmup_layout.addWidget(QLabel("提前(秒):"), 1, 0)
+        self.warmup_lead = QLineEdit(str(warmup.lead_seconds()))
+        warmup_layout.addWidget(self.warmup_lead, 1, 1)
+        warmup_layout.addWidget(QLabel("保活间隔(秒):"), 2, 0)
+        self.warmup_keepalive = QLineEdit(str(warmup.keepalive_seconds()))
+        warmup_layout.addWidget(self.warmup_keepalive, 2, 1)
+        layout.addLayout(warmup_layout)
+
+        # space
+        layout.addItem(QSpacerItem(20, 20))
+
+        # outstanding requests
+        layout.addWidget(QLabel('在途请求:'))
+        firing = FiringConfiguration()
+        firing_layout = QGridLayout()
+        firing_layout.addWidget(QLabel("每任务上限:"), 0, 0)
+        self.max_in_flight = QLineEdit(str(firing.max_in_flight()))
+        firing_layout.addWidget(self.max_in_flight, 0, 1)
+        firing_layout.addWidget(QLabel("超时(毫秒):"), 1, 0)
+        self.reply_timeout = QLineEdit(str(firing.reply_timeout_ms()))
+        firing_layout.addWidget(self.reply_timeout, 1, 1)
+        layout.addLayout(firing_layout)
+
         # space
         layout.addItem(QSpacerItem(20, 20))
         
@@ -247,25 +182,43 @@ class MiscSettingWidget(QtWidgets.QDialog):
         self.accepted.connect(self._apply_settings)
 
         # init
-        _apply_proxy()
+        apply_proxy()
 
     def _apply_settings(self):
         bitget = BitgetConfiguration()
         bitget.set_apikey(self.bitget_api_key.text())
         bitget.set_secretkey(self.bitget_secret_key.text())
         bitget.set_passphrase(self.bitget_passphrase.text())
+        bitget.set_http2(self.bitget_http2.isChecked())
+        bitget.set_rate_limit(int(self.bitget_rate_limit.text()))
+        bitget.set_accounts(parse_accounts(self.bitget_accounts, BITGET_ACCOUNT_KEYS))
         
         gate = GateConfiguration()
         gate.set_apikey(self.gate_api_key.text())
         gate.set_secretkey(self.gate_secret_key.text())
+        gate.set_http2(self.gate_http2.isChecked())
+        gate.set_rate_limit(int(self.gate_rate_limit.text()))
+        gate.set_accounts(parse_accounts(self.gate_accounts, ACCOUNT_KEYS))
         
         mexc = MexcConfiguration()
         mexc.set_apikey(self.mexc_api_key.text())
         mexc.set_secretkey(self.mexc_secret_key.text())
+        mexc.set_http2(self.mexc_http2.isChecked())
+        mexc.set_rate_limit(int(self.mexc_rate_limit.text()))
+        mexc.set_accounts(parse_accounts(self.mexc_accounts, ACCOUNT_KEYS))
+
+        warmup = WarmupConfiguration()
+        warmup.set_connections(int(self.warmup_connections.text()))
+        warmup.set_lead_seconds(int(self.warmup_lead.text()))
+        warmup.set_keepalive_seconds(int(self.warmup_keepalive.text()))
+
+        firing = FiringConfiguration()
+        firing.set_max_in_flight(int(self.max_in_flight.text()))
+        firing.set_reply_timeout_ms(int(self.reply_timeout.text()))
 
         proxy = ProxyConfiguration()
         proxy.set_use_proxy(self.proxy_switch.isChecked())
         proxy.set_proxy_ip(self.proxy_ip.text())
         proxy.set_proxy_port(int(self.proxy_port.text()))
-        _apply_proxy()
+        apply_proxy()
 
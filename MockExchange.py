@@ -0,0 +1,436 @@
+"""本地模拟交易所：实现 Bitget / Gate / MEXC 用到的对时、交易对和下单接口，校验签名，可设置开盘时间并注入故障
+
+    python MockExchange.py [--port 8000] [--open-in 10] [--latency 20 --jitter 5] [--rate-429 0.05]
+                           [--max-orders-per-s 10] [--skew 300] [--drift-ppm 50] [--accounts 3]
+
+三个交易所的路径互不冲突，共用一个端口。程序通过环境变量指向它（只支持 HTTP/1.1，需关闭 HTTP/2 下单）：
+    BITGET_API_URL=http://127.0.0.1:8000 GATE_API_URL=... MEXC_API_URL=... python daemon.py tasks.json
+GET /mock/stats 返回开盘时间、各类结果计数以及首个成交单距开盘的时间，POST /mock/reset 清空记录；
+Ctrl-C 退出时打印同样的统计。
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import random
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from dataclasses import dataclass, field, asdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, parse_qsl
+
+BITGET_ORDER_PATH = '/api/v2/spot/trade/place-order'
+GATE_ORDER_PATH = '/api/v4/spot/orders'
+MEXC_ORDER_PATH = '/api/v3/order'
+
+
+@dataclass
+class MockConfig:
+    api_key: str = 'mock-key'
+    secret_key: str = 'mock-secret'
+    passphrase: str = 'mock-passphrase'
+    open_ms: float = None  # server time the market opens, orders before it are rejected; None: always open
+    latency_ms: float = 0.0  # one way, applied before and after the server stamps its clock
+    jitter_ms: float = 0.0  # uniform extra delay on each way
+    rate_429: float = 0.0  # probability of answering an order with 429
+    max_orders_per_s: int = 0  # orders beyond this within a sliding second get 429; 0: unlimited
+    skew_ms: float = 0.0  # server clock ahead of the local wall clock
+    drift_ppm: float = 0.0  # and running this much faster
+    recv_window_ms: float = 5000  # signed timestamp must be this close to the server clock
+    symbols: dict = field(default_factory=lambda: {'BTCUSDT': (2, 6), 'BTC_USDT': (2, 6), 'ETHUSDT': (2, 4),
+                                                   'ETH_USDT': (2, 4)})  # symbol -> (price, quantity precision)
+    min_notional: str = '1'  # least price * quantity of an order, announced in the symbol lists
+    accounts: int = 1  # key sets accepted, the n-th one is the first suffixed with -n
+
+    def credentials(self, api_key):
+        # api key -> (secret key, passphrase), None for an unknown key
+        for n in range(1, self.accounts + 1):
+            suffix = f'-{n}' if n > 1 else ''
+            if api_key == self.api_key + suffix:
+                return self.secret_key + suffix, self.passphrase + suffix
+        return None
+
+
+@dataclass
+class OrderRecord:
+    exchange: str
+    arrival_ms: float  # server time the order was processed at
+    sign_ms: float  # timestamp the client signed with
+    outcome: str  # accepted, early, bad_signature, expired, throttled, duplicate, unknown_symbol
+    client_id: str = None
+    order_id: str = None
+    api_key: str = None
+
+
+class MockExchange:
+    """三个交易所的模拟服务端，所有订单都记录下来用于统计"""
+
+    def __init__(self, config: MockConfig = None, host='127.0.0.1', port=0):
+        self.config = config or MockConfig()
+        self.lock = threading.Lock()
+        self.records = []
+        self.client_ids = set()
+        self.recent_orders = defaultdict(deque)  # api key -> arrival times, each key has its own limit
+        self.next_order_id = 1000000
+        self.started_wall_ms = time.time() * 1000
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.exchange = self
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='mock-exchange', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def server_time(self):
+        now = time.time() * 1000
+        return now + self.config.skew_ms + (now - self.started_wall_ms) * self.config.drift_ppm * 1e-6
+
+    def delay(self):
+        config = self.config
+        if config.latency_ms or config.jitter_ms:
+            time.sleep((config.latency_ms + random.uniform(0, config.jitter_ms)) / 1000)
+
+    def reset(self):
+        with self.lock:
+            self.records.clear()
+            self.client_ids.clear()
+            self.recent_orders.clear()
+
+    def stats(self):
+        with self.lock:
+            records = list(self.records)
+        open_ms = self.config.open_ms
+        accepted = [r for r in records if r.outcome == 'accepted']
+        early = [r for r in records if r.outcome == 'early']
+        first = min(accepted, key=lambda r: r.arrival_ms) if accepted else None
+        return {
+            'open_ms': open_ms,
+            'orders': len(records),
+            'outcomes': dict(Counter(r.outcome for r in records)),
+            'accepted_by_key': dict(Counter(r.api_key for r in accepted)),
+            # > 0: the first accepted order arrived this late after the open
+            'first_accepted_after_open_ms': first.arrival_ms - open_ms if first and open_ms is not None else None,
+            'first_accepted': asdict(first) if first else None,
+            # the closest miss, how early the last rejected order arrived
+            'last_early_before_open_ms': open_ms - max(r.arrival_ms for r in early) if early else None,
+        }
+
+    def place(self, exchange, sign_ms, symbol, client_id, signature_ok, recv_window_ms=None, api_key=None):
+        # common checks of all three exchanges, returns the record, outcome decides the reply
+        config = self.config
+        recv_window_ms = recv_window_ms or config.recv_window_ms
+        arrival_ms = self.server_time()
+        with self.lock:
+            outcome = 'accepted'
+            if not signature_ok:
+                outcome = 'bad_signature'
+            elif abs(arrival_ms - sign_ms) > recv_window_ms:
+                outcome = 'expired'
+            elif self._throttled(api_key, arrival_ms):
+                outcome = 'throttled'
+            elif symbol not in config.symbols:
+                outcome = 'unknown_symbol'
+            elif config.open_ms is not None and arrival_ms < config.open_ms:
+                outcome = 'early'
+            elif client_id and client_id in self.client_ids:
+                outcome = 'duplicate'
+            record = OrderRecord(exchange, arrival_ms, sign_ms, outcome, client_id, api_key=api_key)
+            if outcome == 'accepted':
+                self.next_order_id += 1
+                record.order_id = str(self.next_order_id)
+                if client_id:
+                    self.client_ids.add(client_id)
+            self.records.append(record)
+        return record
+
+    def _throttled(self, api_key, arrival_ms):
+        config = self.config
+        if config.rate_429 and random.random() < config.rate_429:
+            return True
+        if config.max_orders_per_s:
+            recent = self.recent_orders[api_key]
+            while recent and recent[0] <= arrival_ms - 1000:
+                recent.popleft()
+            if len(recent) >= config.max_orders_per_s:
+                return True
+            recent.append(arrival_ms)
+        return False
+
+    # -- Bitget --
+
+    def bitget_time(self, request):
+        now = int(self.server_time())
+        return 200, {'code': '00000', 'msg': 'success', 'requestTime': now, 'data': {'serverTime': str(now)}}
+
+    def bitget_symbols(self, request):
+        symbol = request.query.get('symbol')
+        if symbol is None:  # the whole list
+            return 200, {'code': '00000', 'msg': 'success', 'data': [
+                self._bitget_symbol(symbol) for symbol in self.config.symbols]}
+        if symbol not in self.config.symbols:
+            return 400, {'code': '40034', 'msg': f'Parameter {symbol} does not exist', 'data': None}
+        return 200, {'code': '00000', 'msg': 'success', 'data': [self._bitget_symbol(symbol)]}
+
+    def _bitget_symbol(self, symbol):
+        price_precision, quantity_precision = self.config.symbols[symbol]
+        return {'symbol': symbol, 'status': 'online', 'pricePrecision': str(price_precision),
+                'quantityPrecision': str(quantity_precision), 'minTradeUSDT': self.config.min_notional}
+
+    def bitget_order(self, request):
+        status, reply = self._bitget_order(request)
+        reply.setdefault('requestTime', int(self.server_time()))
+        return status, reply
+
+    def _bitget_order(self, request):
+        headers, body = request.headers, request.body
+        timestamp = headers.get('ACCESS-TIMESTAMP', '0')
+        message = timestamp + 'POST' + BITGET_ORDER_PATH + body.decode()
+        api_key = headers.get('ACCESS-KEY')
+        secret_key, passphrase = self.config.credentials(api_key) or ('', None)
+        expected = base64.b64encode(hmac.new(secret_key.encode(), message.encode(), 'sha256').digest())
+        signature_ok = (headers.get('ACCESS-PASSPHRASE') == passphrase
+                        and hmac.compare_digest(expected.decode(), headers.get('ACCESS-SIGN', '')))
+        params = json.loads(body or b'{}')
+        record = self.place('Bitget', float(timestamp), params.get('symbol'), params.get('clientOid'), signature_ok,
+                            api_key=api_key)
+        # the not-open and duplicate codes are none of the order's fatal ones, the burst keeps going
+        match record.outcome:
+            case 'accepted':
+                return 200, {'code': '00000', 'msg': 'success', 'requestTime': int(record.arrival_ms),
+                             'data': {'orderId': record.order_id, 'clientOid': record.client_id}}
+            case 'bad_signature':
+                return 400, {'code': '40009', 'msg': 'sign signature error', 'data': None}
+            case 'expired':
+                return 400, {'code': '40008', 'msg': 'Request timestamp expired', 'data': None}
+            case 'throttled':
+                return 429, {'code': '429', 'msg': 'Too Many Requests', 'data': None}
+            case 'unknown_symbol':
+                return 400, {'code': '40034', 'msg': f"Parameter {params.get('symbol')} does not exist", 'data': None}
+            case 'early':
+                return 400, {'code': '43004', 'msg': 'The symbol is not open for trading yet', 'data': None}
+            case _:
+                return 400, {'code': '43118', 'msg': 'Duplicate clientOid', 'data': None}
+
+    # -- Gate --
+
+    def gate_time(self, request):
+        return 200, {'server_time': int(self.server_time())}
+
+    def gate_pairs(self, request):
+        return 200, [self._gate_pair(pair) for pair in self.config.symbols]
+
+    def gate_pair(self, request):
+        pair = request.path.rsplit('/', 1)[-1]
+        if pair not in self.config.symbols:
+            return 400, {'label': 'INVALID_CURRENCY_PAIR', 'message': f'Invalid currency pair {pair}'}
+        return 200, self._gate_pair(pair)
+
+    def _gate_pair(self, pair):
+        price_precision, quantity_precision = self.config.symbols[pair]
+        return {'id': pair, 'trade_status': 'tradable', 'precision': price_precision,
+                'amount_precision': quantity_precision, 'min_quote_amount': self.config.min_notional}
+
+    def gate_order(self, request):
+        headers, body = request.headers, request.body
+        timestamp = headers.get('Timestamp', '0')
+        hashed = hashlib.sha512(body).hexdigest()
+        message = f'POST\n{GATE_ORDER_PATH}\n\n{hashed}\n{timestamp}'
+        api_key = headers.get('KEY')
+        credentials = self.config.credentials(api_key)
+        expected = hmac.new((credentials or ('',))[0].encode(), message.encode(), hashlib.sha512).hexdigest()
+        signature_ok = credentials is not None and hmac.compare_digest(expected, headers.get('SIGN', ''))
+        params = json.loads(body or b'{}')
+        # Gate signs whole seconds and allows 60s, its `text` is no idempotency key
+        record = self.place('Gate', float(timestamp) * 1000, params.get('currency_pair'), None, signature_ok, 60000,
+                            api_key=api_key)
+        match record.outcome:
+            case 'accepted':
+                return 201, {'id': record.order_id, 'text': params.get('text', ''), 'status': 'open',
+                             'currency_pair': params.get('currency_pair'),
+                             'create_time_ms': f'{record.arrival_ms:.3f}'}
+            case 'bad_signature':
+                return 401, {'label': 'INVALID_SIGNATURE', 'message': 'Signature mismatch'}
+            case 'expired':
+                return 401, {'label': 'REQUEST_EXPIRED', 'message': 'Request timestamp expired'}
+            case 'throttled':
+                return 429, {'label': 'TOO_MANY_REQUESTS', 'message': 'Request rate limit exceeded'}
+            case 'unknown_symbol':
+                return 400, {'label': 'INVALID_CURRENCY_PAIR', 'message': 'Invalid currency pair'}
+            case _:
+                return 400, {'label': 'TRADE_RESTRICTED', 'message': 'Trading is not open for this pair'}
+
+    # -- MEXC --
+
+    def mexc_time(self, request):
+        return 200, {'serverTime': int(self.server_time())}
+
+    def mexc_exchange_info(self, request):
+        symbol = request.query.get('symbol')
+        if symbol is None:
+            symbols = list(self.config.symbols)
+        elif symbol in self.config.symbols:
+            symbols = [symbol]
+        else:
+            return 400, {'code': -1121, 'msg': 'Invalid symbol.'}
+        return 200, {'timezone': 'CST', 'serverTime': int(self.server_time()), 'symbols': [
+            self._mexc_symbol(symbol) for symbol in symbols]}
+
+    def _mexc_symbol(self, symbol):
+        price_precision, quantity_precision = self.config.symbols[symbol]
+        # the quote asset's own precision differs from both, as on the real exchange
+        return {'symbol': symbol, 'status': '1', 'quotePrecision': price_precision, 'quoteAssetPrecision': 8,
+                'baseAssetPrecision': quantity_precision, 'quoteAmountPrecision': self.config.min_notional}
+
+    def mexc_order(self, request):
+        # signed query string, either in the url or in the body
+        payload = request.raw_query or request.body.decode()
+        unsigned, _, signature = payload.rpartition('&signature=')
+        api_key = request.headers.get('X-MEXC-APIKEY')
+        credentials = self.config.credentials(api_key)
+        expected = hmac.new((credentials or ('',))[0].encode(), unsigned.encode(), 'sha256').hexdigest()
+        signature_ok = credentials is not None and hmac.compare_digest(expected, signature)
+        params = dict(parse_qsl(unsigned))
+        record = self.place('MEXC', float(params.get('timestamp', 0)), params.get('symbol'),
+                            params.get('newClientOrderId'), signature_ok, api_key=api_key)
+        match record.outcome:
+            case 'accepted':
+                return 200, {'symbol': params.get('symbol'), 'orderId': record.order_id,
+                             'clientOrderId': record.client_id, 'transactTime': int(record.arrival_ms)}
+            case 'bad_signature':
+                return 400, {'code': 700002, 'msg': 'Signature for this request is not valid.'}
+            case 'expired':
+                return 400, {'code': 700003, 'msg': 'Timestamp for this request is outside of the recvWindow.'}
+            case 'throttled':
+                return 429, {'code': 429, 'msg': 'Too many requests.'}
+            case 'unknown_symbol':
+                return 400, {'code': -1121, 'msg': 'Invalid symbol.'}
+            case 'early':
+                return 400, {'code': 30001, 'msg': 'Current trading pair is not open yet.'}
+            case _:
+                return 400, {'code': 30003, 'msg': 'Duplicate order id.'}
+
+    # -- control --
+
+    def mock_stats(self, request):
+        return 200, self.stats()
+
+    def mock_reset(self, request):
+        self.reset()
+        return 200, {'ok': True}
+
+    ROUTES = {
+        ('GET', '/api/v2/public/time'): bitget_time,
+        ('GET', '/api/v2/spot/public/symbols'): bitget_symbols,
+        ('POST', BITGET_ORDER_PATH): bitget_order,
+        ('GET', '/api/v4/spot/time'): gate_time,
+        ('GET', '/api/v4/spot/currency_pairs'): gate_pairs,
+        ('POST', GATE_ORDER_PATH): gate_order,
+        ('GET', '/api/v3/time'): mexc_time,
+        ('GET', '/api/v3/exchangeInfo'): mexc_exchange_info,
+        ('POST', MEXC_ORDER_PATH): mexc_order,
+        ('GET', '/mock/stats'): mock_stats,
+        ('POST', '/mock/reset'): mock_reset,
+    }
+
+    def route(self, method, path):
+        handler = self.ROUTES.get((method, path))
+        if handler is None and method == 'GET' and path.startswith('/api/v4/spot/currency_pairs/'):
+            handler = MockExchange.gate_pair
+        return handler
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, the client warms its connections up ahead
+    disable_nagle_algorithm = True  # headers and body go out in separate writes, don't wait for delayed acks
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def _handle(self, method):
+        exchange = self.server.exchange
+        url = urlsplit(self.path)
+        self.raw_query = url.query
+        self.query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        handler = exchange.route(method, url.path)
+
+        exchange.delay()  # request on its way in
+        if handler is None:
+            status, reply = 404, {'code': '404', 'msg': f'{method} {url.path} not found'}
+        else:
+            try:
+                status, reply = handler(exchange, self)
+            except (ValueError, KeyError, TypeError) as e:
+                status, reply = 400, {'code': '400', 'msg': f'bad request: {e!r}'}
+        exchange.delay()  # reply on its way out
+
+        data = json.dumps(reply).encode()
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client gave up on it, e.g. aborted at shutdown
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--open-in', type=float, help='开盘时间：从现在起的秒数')
+    parser.add_argument('--open-at', type=float, help='开盘时间：服务器毫秒时间戳')
+    parser.add_argument('--latency', type=float, default=0.0, help='单程延迟 ms')
+    parser.add_argument('--jitter', type=float, default=0.0, help='单程抖动 ms')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='下单随机返回 429 的概率')
+    parser.add_argument('--max-orders-per-s', type=int, default=0)
+    parser.add_argument('--skew', type=float, default=0.0, help='服务器时钟超前本机 ms')
+    parser.add_argument('--drift-ppm', type=float, default=0.0)
+    parser.add_argument('--key', default=MockConfig.api_key)
+    parser.add_argument('--secret', default=MockConfig.secret_key)
+    parser.add_argument('--passphrase', default=MockConfig.passphrase)
+    parser.add_argument('--accounts', type=int, default=1, help='接受的密钥组数，第 n 组为 key-n/secret-n')
+    args = parser.parse_args()
+
+    config = MockConfig(api_key=args.key, secret_key=args.secret, passphrase=args.passphrase,
+                        latency_ms=args.latency, jitter_ms=args.jitter, rate_429=args.rate_429,
+                        max_orders_per_s=args.max_orders_per_s, skew_ms=args.skew, drift_ppm=args.drift_ppm,
+                        accounts=args.accounts)
+    exchange = MockExchange(config, args.host, args.port)
+    if args.open_at is not None:
+        config.open_ms = args.open_at
+    elif args.open_in is not None:
+        config.open_ms = exchange.server_time() + args.open_in * 1000
+
+    url = exchange.url
+    print(f'mock exchange on {url}, open at {config.open_ms}')
+    print(f'BITGET_API_URL={url} GATE_API_URL={url} MEXC_API_URL={url}', flush=True)
+    try:
+        exchange.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(exchange.stats(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
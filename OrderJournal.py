@@ -0,0 +1,125 @@
+import json
+from contextlib import closing
+import queue
+import sqlite3
+import threading
+import time
+
+from PySide6.QtCore import qDebug
+
+FLUSH_INTERVAL_S = 0.2  # entries of this window go to disk in one transaction
+MAX_BATCH = 1024
+RETRY_INTERVAL_S = 1.0  # a failed commit is tried again this often even if nothing new arrives
+MAX_PENDING = 16 * MAX_BATCH  # failed entries kept for retrying
+
+
+class OrderJournal:
+    """订单任务的追加式日志：SQLite WAL 模式，写入由后台线程成批提交，事件循环从不等磁盘"""
+
+    def __init__(self, path):
+        self.path = path
+        with closing(self._connect()) as db, db:  # the connection is closed, not only committed
+            db.execute('CREATE TABLE IF NOT EXISTS journal (seq INTEGER PRIMARY KEY, task INTEGER NOT NULL, '
+                       'kind TEXT NOT NULL, ts REAL NOT NULL, data TEXT NOT NULL)')
+            db.execute('CREATE INDEX IF NOT EXISTS journal_task ON journal (task)')
+            self.next_task = (db.execute('SELECT MAX(task) FROM journal').fetchone()[0] or 0) + 1
+        self.written_count = 0
+        self.commit_count = 0
+        self.error_count = 0
+        self._queue = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._write_loop, name='OrderJournal', daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=10)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')  # WAL stays consistent, a power cut loses at most the last commits
+        return db
+
+    def new_task(self):
+        task = self.next_task
+        self.next_task += 1
+        return task
+
+    def append(self, task, kind, **data):
+        # never blocks, the writer thread picks it up within FLUSH_INTERVAL_S
+        self._queue.put((task, kind, time.time(), json.dumps(data, ensure_ascii=False)))
+
+    def replay(self):
+        """按写入顺序重放日志 -> {任务: {'added': {...}, 'records': [...], ...}}，已删除的任务不在其中"""
+        tasks = {}
+        with closing(self._connect()) as db:
+            for task, kind, ts, data in db.execute('SELECT task, kind, ts, data FROM journal ORDER BY seq'):
+                data = json.loads(data)
+                match kind:
+                    case 'added':
+                        tasks[task] = {'added': data, 'records': [], 'succeed': 0, 'failed': 0, 'state': 'pending'}
+                    case 'removed':
+                        tasks.pop(task, None)
+                    case _ if task not in tasks:
+                        continue
+                    case 'filled':
+                        tasks[task]['records'].extend(data['order_ids'])
+                    case 'progress':
+                        tasks[task].update(data)
+                    case _:  # started, finished, expired
+                        tasks[task]['state'] = kind
+                        tasks[task].update(data)
+        return tasks
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join()
+
+    def _write_loop(self):
+        db = self._connect()
+        pending = []  # entries of a commit that failed for a passing reason, tried again on their own if need be
+        running = True
+        while running:
+            batch, pending = pending, []
+            try:
+                entry = self._queue.get(timeout=RETRY_INTERVAL_S if batch else None)
+            except queue.Empty:
+                entry = ()  # nothing new, retry what failed
+            if entry is None:
+                running = False
+            elif entry:
+                batch.append(entry)
+                deadline = time.monotonic() + FLUSH_INTERVAL_S
+                # group commit: whatever else arrives in the window shares the fsync
+                while len(batch) < MAX_BATCH:
+                    try:
+                        entry = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if entry is None:
+                        running = False
+                        break
+                    batch.append(entry)
+            if batch:  # on shutdown too, what failed before gets a last try
+                pending = self._commit(db, batch)
+        if pending:
+            qDebug(f'订单日志关闭时仍有 {len(pending)} 条未能写入')
+        db.close()
+
+    def _commit(self, db, batch):
+        # -> the entries to try again
+        try:
+            with db:
+                db.executemany('INSERT INTO journal (task, kind, ts, data) VALUES (?, ?, ?, ?)', batch)
+        except sqlite3.OperationalError as e:  # locked, disk full, I/O: kept for the next try
+            self.error_count += 1
+            if len(batch) > MAX_PENDING:
+                # later counts supersede progress entries, past that the oldest go
+                kept = [entry for entry in batch if entry[1] != 'progress'][-MAX_PENDING:]
+                qDebug(f'订单日志积压过多，丢弃 {len(batch) - len(kept)} 条')
+                batch = kept
+            qDebug(f'订单日志写入失败，{len(batch)} 条稍后重试: {e}')
+            return batch
+        except sqlite3.Error as e:
+            self.error_count += 1
+            qDebug(f'订单日志写入失败，丢弃 {len(batch)} 条: {e}')
+            return []
+        self.written_count += len(batch)
+        self.commit_count += 1
+        return []
@@ -0,0 +1,63 @@
+from decimal import Decimal, InvalidOperation, ROUND_DOWN, ROUND_UP
+
+from RestClient import RestOrderBase, SymbolInfo
+
+
+def _decimal(name, value):
+    try:
+        number = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError(f'{name}不是有效数字: {value}')
+    if not number.is_finite() or number <= 0:
+        raise ValueError(f'{name}必须大于 0: {value}')
+    return number
+
+
+def _quantize(name, value: Decimal, step: Decimal, rounding):
+    try:
+        return value.quantize(step, rounding=rounding)
+    except InvalidOperation:  # more digits than the decimal context holds
+        raise ValueError(f'{name}位数过多: {value}')
+
+
+def normalize_order(info: SymbolInfo | None, order_type: RestOrderBase.OrderType, price, quantity):
+    """按交易对的精度和最小下单额校验下单参数，返回 (价格, 数量, 调整说明)，无法下单时抛出 ValueError
+
+    价格只往对自己不利的方向收窄：买单向下、卖单向上，不会比填写的价格买得更贵或卖得更便宜；数量向下截断
+    """
+    price_value = _decimal('价格', price)
+    quantity_value = _decimal('数量', quantity)
+    notes = []
+    if info is None:  # not listed yet as far as we know, the exchange has the last word
+        return format(price_value, 'f'), format(quantity_value, 'f'), notes
+
+    rounding = ROUND_DOWN if order_type == RestOrderBase.OrderType.Buy else ROUND_UP
+    price_step = Decimal(1).scaleb(-info.price_precision)
+    quantized = _quantize('价格', price_value, price_step, rounding)
+    if quantized != price_value:
+        notes.append(f'价格按精度 {info.price_precision} 调整为 {quantized}')
+    price_value = quantized  # also drops zeros written beyond the precision
+    if price_value <= 0:
+        raise ValueError(f'价格低于最小精度 {price_step}')
+
+    quantity_step = Decimal(1).scaleb(-info.quantity_precision)
+    quantized = _quantize('数量', quantity_value, quantity_step, ROUND_DOWN)
+    if quantized != quantity_value:
+        notes.append(f'数量按精度 {info.quantity_precision} 调整为 {quantized}')
+    quantity_value = quantized
+    if quantity_value <= 0:
+        raise ValueError(f'数量低于最小精度 {quantity_step}')
+
+    try:
+        min_notional = Decimal(info.min_notional or '0')
+    except InvalidOperation:
+        raise ValueError(f'交易对的最小下单额无效: {info.min_notional}')
+    if price_value * quantity_value < min_notional:
+        raise ValueError(f"下单金额 {format((price_value * quantity_value).normalize(), 'f')} 低于最小下单额 {min_notional}")
+    return format(price_value, 'f'), format(quantity_value, 'f'), notes
+
+
+def check_order(exchange, order_type: RestOrderBase.OrderType, symbol, price, quantity):
+    """在创建任务时按缓存的交易对规则规整价格和数量，见 normalize_order"""
+    from SymbolCache import SymbolCache
+    return normalize_order(SymbolCache().catalog(exchange).lookup(symbol), order_type, price, quantity)
@@ -1,161 +1,303 @@
 from PySide6 import QtWidgets
-from PySide6.QtCore import Slot, QTime, QTimer, Qt, QDateTime
-from PySide6.QtWidgets import QVBoxLayout, QLabel, QTableWidget, QTableWidgetItem, QMenu
+from PySide6.QtCore import Slot, QTimer, Qt, QDateTime, QAbstractTableModel, QModelIndex, \
+    QSortFilterProxyModel
+from PySide6.QtGui import QFontDatabase
+from PySide6.QtWidgets import QVBoxLayout, QHBoxLayout, QLabel, QTableView, QHeaderView, QMenu, QDialog, \
+    QTextBrowser, QLineEdit, QComboBox
 
 import OrdersDB
+from RestClient import RestOrderBase
+from Tracing import order_timeline, clock_timeline
 
+HEADERS = ['交易所', '交易对', '价格', '数量', '定时', '倒计时', '状态', '结果', '连接']
+COUNTDOWN, STATUS, RESULT, POOL = 5, 6, 7, 8
+SORT_ROLE = Qt.ItemDataRole.UserRole + 1  # raw values, countdowns and prices sort as numbers
 
-def resize_header_to_contents(table: QTableWidget):
-    table.resizeColumnsToContents()
-    # 保存每一列的内容宽度
-    column_widths = [table.columnWidth(col) for col in range(table.columnCount())]
-    total_content_width = sum(column_widths)
 
-    # 获取表格的总宽度
-    total_table_width = table.viewport().width()
+def _countdown_text(countdown_ms):
+    # QTime wraps at a day and takes a 32-bit int, triggers can be weeks out
+    seconds = countdown_ms // 1000
+    days, seconds = divmod(seconds, 86400)
+    text = f'{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}'
+    return f'{days}天 {text}' if days else text
 
-    # 计算剩余空间
-    remaining_space = total_table_width - total_content_width
 
-    if remaining_space > 0:
-        # 计算每列应增加的宽度，按比例分配
-        for col in range(table.columnCount()):
-            additional_width = remaining_space * (column_widths[col] / total_content_width)
-            new_width = column_widths[col] + additional_width
-            table.setColumnWidth(col, int(new_width))
+def _contiguous(rows):
+    # sorted row numbers -> (first, last) runs
+    runs = []
+    for row in rows:
+        if runs and runs[-1][1] == row - 1:
+            runs[-1][1] = row
+        else:
+            runs.append([row, row])
+    return runs
+
+
+class OrderTableModel(QAbstractTableModel):
+    """订单存储之上的表格模型：每秒只比较会变的几列，只为真正变化的单元格发出 dataChanged"""
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.tasks = []  # row -> task id
+        self.row_of = {}  # task id -> row
+        self.texts = []  # row -> display texts of every column, what the view was last told
+
+        db.order_added.connect(self._on_order_added)
+        db.order_removed.connect(self._on_order_removed)
+        db.order_state_changed.connect(self._on_order_state_changed)
+        for order in db.orders.values():
+            self._on_order_added(order)
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(1000)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.tasks)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return HEADERS[section]
+        return None
+
+    def order(self, row) -> RestOrderBase:
+        return self.db.order(self.tasks[row])
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        row, col = index.row(), index.column()
+        match role:
+            case Qt.ItemDataRole.DisplayRole:
+                return self.texts[row][col]
+            case Qt.ItemDataRole.TextAlignmentRole:
+                return Qt.AlignmentFlag.AlignCenter
+            case Qt.ItemDataRole.UserRole:
+                return self.tasks[row]
+            case Qt.ItemDataRole.ToolTipRole if col == RESULT:
+                order = self.order(row)
+                tips = []
+                if order.burst is not None:
+                    tips.append(f'{order.burst.in_flight.describe()}, 无回执 {order.transport_error_count}')
+                if order.race_copies > 1:
+                    tips.append(f'竞速副本 {order.race_copies}, 落败 {order.race_lost_count}')
+                fan_out = self.db.fan_outs.get(order.group_id)
+                if fan_out is not None:
+                    tips.append(fan_out.describe())
+                return '\n'.join(tips) or None
+            case _ if role == SORT_ROLE:
+                return self._sort_key(self.order(row), col, self.texts[row][col])
+        return None
+
+    def refresh(self):
+        # one pass over the store, one dataChanged per run of changed rows and column
+        changed = {col: [] for col in (COUNTDOWN, STATUS, RESULT, POOL)}
+        for row, task in enumerate(self.tasks):
+            order = self.db.order(task)
+            if order is None:  # leaving the store, its removal comes next
+                continue
+            texts = self.texts[row]
+            fresh = self._dynamic_texts(order)
+            for col, text in fresh.items():
+                if texts[col] != text:
+                    texts[col] = text
+                    changed[col].append(row)
+        countdown_rows = changed.pop(COUNTDOWN)
+        if countdown_rows:  # every waiting task ticks, one batch for the whole column
+            self.dataChanged.emit(self.index(countdown_rows[0], COUNTDOWN), self.index(countdown_rows[-1], COUNTDOWN),
+                                  [Qt.ItemDataRole.DisplayRole])
+        for col, rows in changed.items():
+            for first, last in _contiguous(rows):
+                self.dataChanged.emit(self.index(first, col), self.index(last, col), [Qt.ItemDataRole.DisplayRole])
+
+    def _refresh_row(self, row):
+        texts = self.texts[row]
+        fresh = self._dynamic_texts(self.order(row))
+        cols = [col for col, text in fresh.items() if texts[col] != text]
+        for col in cols:
+            texts[col] = fresh[col]
+        if cols:
+            self.dataChanged.emit(self.index(row, min(cols)), self.index(row, max(cols)),
+                                  [Qt.ItemDataRole.DisplayRole])
+
+    @staticmethod
+    def _static_texts(order):
+        trigger = QDateTime.fromMSecsSinceEpoch(order.trigger_timestamp).toString("yyyy.MM.dd hh:mm:ss")
+        exchange = f'{order.exchange} ({order.account})' if order.account else order.exchange
+        return [exchange, order.symbol, order.price, order.quantity, trigger]
+
+    @staticmethod
+    def _dynamic_texts(order):
+        countdown_ms = max(int(order.countdown_ms()), 0) if order.burst is None else 0  # only waiting tasks tick
+        if order.is_finished():
+            status = '失败' if order.has_error() else '完成'
+        elif order.is_running():
+            status = '执行中'
+        else:
+            status = '等待'
+        total = order.succeed_count + order.failed_count
+        return {
+            COUNTDOWN: _countdown_text(countdown_ms),
+            STATUS: status,
+            RESULT: f'{order.succeed_count}/{total}' if total else '-',
+            POOL: order.pool.describe() if order.pool else '-',
+        }
+
+    @staticmethod
+    def _sort_key(order, col, text):
+        match col:
+            case 2 | 3:
+                try:
+                    return float(text)
+                except ValueError:
+                    return 0.0
+            case 4:
+                return order.trigger_timestamp
+            case 5:
+                return max(order.countdown_ms(), 0.0)
+            case 7:
+                return order.succeed_count
+        return text
+
+    @Slot(RestOrderBase)
+    def _on_order_added(self, order: RestOrderBase):
+        # texts first, nothing is inserted if building them fails
+        dynamic = self._dynamic_texts(order)
+        texts = self._static_texts(order) + [dynamic[col] for col in (COUNTDOWN, STATUS, RESULT, POOL)]
+        row = len(self.tasks)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.tasks.append(order.task_id)
+        self.row_of[order.task_id] = row
+        self.texts.append(texts)
+        self.endInsertRows()
+
+    @Slot(RestOrderBase)
+    def _on_order_removed(self, order: RestOrderBase):
+        row = self.row_of.pop(order.task_id)
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.tasks[row]
+        del self.texts[row]
+        for moved in range(row, len(self.tasks)):
+            self.row_of[self.tasks[moved]] = moved
+        self.endRemoveRows()
+
+    @Slot(RestOrderBase)
+    def _on_order_state_changed(self, order: RestOrderBase):
+        row = self.row_of.get(order.task_id)
+        if row is not None and self.db.order(order.task_id) is not None:
+            self._refresh_row(row)
+
+
+class OrderFilterProxy(QSortFilterProxyModel):
+    """一个方向的订单，可再按交易所/交易对文字和状态筛选"""
+
+    def __init__(self, side: RestOrderBase.OrderType, parent=None):
+        super().__init__(parent)
+        self.side = side
+        self.text = ''
+        self.state = None  # OrdersDB.Database states, None: all
+        self.setSortRole(SORT_ROLE)
+
+    def set_filter(self, text, state):
+        self.text = text.strip().upper()
+        self.state = state
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        model = self.sourceModel()
+        order = model.order(source_row)
+        if order.order_type != self.side:
+            return False
+        if self.state is not None and model.db.state(order.task_id) != self.state:
+            return False
+        if self.text:
+            texts = model.texts[source_row]
+            return self.text in texts[0].upper() or self.text in texts[1].upper()
+        return True
 
 
 class OrderTableView(QtWidgets.QWidget):
     def __init__(self):
         super().__init__()
-        self.buy_orders = []
-        self.sell_orders = []
+        self.db = OrdersDB.Database()
+        self.model = OrderTableModel(self.db, self)
 
         layout = QVBoxLayout(self)
-        headers = ['交易所', '交易对', '价格', '数量', '定时', '倒计时', '状态', '结果']
+        filters = QHBoxLayout()
+        filters.addWidget(QLabel('筛选:'))
+        self.filter_text = QLineEdit()
+        self.filter_text.setPlaceholderText('交易所或交易对')
+        filters.addWidget(self.filter_text)
+        self.filter_state = QComboBox()
+        for text, state in (('全部', None), ('等待', 'pending'), ('执行中', 'started'), ('已结束', 'finished')):
+            self.filter_state.addItem(text, state)
+        filters.addWidget(self.filter_state)
+        layout.addLayout(filters)
 
         layout.addWidget(QLabel('买入任务：'))
-        self.buy_table = QTableWidget()
+        self.buy_table, self.buy_proxy = self._make_table(RestOrderBase.OrderType.Buy)
         layout.addWidget(self.buy_table)
-        self.buy_table.setColumnCount(len(headers))
-        self.buy_table.setHorizontalHeaderLabels(headers)
 
         layout.addWidget(QLabel('卖出任务：'))
-        self.sell_table = QTableWidget()
+        self.sell_table, self.sell_proxy = self._make_table(RestOrderBase.OrderType.Sell)
         layout.addWidget(self.sell_table)
-        self.sell_table.setColumnCount(len(headers))
-        self.sell_table.setHorizontalHeaderLabels(headers)
 
-        self.buy_table.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
-        self.buy_table.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-        self.buy_table.customContextMenuRequested.connect(lambda pos: self._custom_context_requested(self.buy_table, pos))
-        self.sell_table.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
-        self.sell_table.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-        self.sell_table.customContextMenuRequested.connect(lambda pos: self._custom_context_requested(self.sell_table, pos))
+        self.filter_text.textChanged.connect(self._on_filter_changed)
+        self.filter_state.currentIndexChanged.connect(self._on_filter_changed)
+        # states move on while the filter is set, re-filter along with the model's refresh
+        self.model.refresh_timer.timeout.connect(self._on_refreshed)
 
-        self.db = OrdersDB.Database()
-        self.db.buy_order_added.connect(self._on_buy_order_added)
-        self.db.sell_order_added.connect(self._on_sell_order_added)
-        self.db.buy_order_removed.connect(self._on_buy_order_removed)
-        self.db.sell_order_removed.connect(self._on_sell_order_removed)
-
-        timer = QTimer(self)
-        timer.setInterval(1000)
-        timer.timeout.connect(self._update_all_order_item)
-        timer.start()
-
-    @Slot(OrdersDB.RestOrderBase)
-    def _on_buy_order_added(self, order: OrdersDB.RestOrderBase):
-        self._on_order_added(self.buy_table, order)
-
-    @Slot(OrdersDB.RestOrderBase)
-    def _on_sell_order_added(self, order: OrdersDB.RestOrderBase):
-        self._on_order_added(self.sell_table, order)
-
-    @Slot(OrdersDB.RestOrderBase)
-    def _on_buy_order_removed(self, order: OrdersDB.RestOrderBase):
-        self._on_order_removed_by_idx(self.buy_table, self.buy_orders.index(order))
-
-    @Slot(OrdersDB.RestOrderBase)
-    def _on_sell_order_removed(self, order: OrdersDB.RestOrderBase):
-        self._on_order_removed_by_idx(self.sell_table, self.sell_orders.index(order))
-
-    def _on_order_added(self, table, order):
-        exchange = QTableWidgetItem(order.exchange)
-        symbol = QTableWidgetItem(order.symbol)
-        price = QTableWidgetItem(order.price)
-        quantity = QTableWidgetItem(order.quantity)
-        time = QTableWidgetItem(QDateTime.fromMSecsSinceEpoch(order.trigger_timestamp).toString("yyyy.MM.dd hh:mm:ss"))
-        countdown = QTableWidgetItem()
-        status = QTableWidgetItem()
-        result = QTableWidgetItem()
-        idx = table.rowCount()
-
-        table.insertRow(idx)
-        for col, item in enumerate([exchange, symbol, price, quantity, time, countdown, status, result]):
-            item.setTextAlignment(Qt.AlignmentFlag.AlignHCenter | Qt.AlignmentFlag.AlignVCenter)
-            table.setItem(idx, col, item)
-
-        orders = self.buy_orders if table == self.buy_table else self.sell_orders
-        orders.append(order)
-        self._update_order_item_by_idx(table, orders.index(order))
-
-        resize_header_to_contents(table)
-
-    def _update_all_order_item(self):
-        for idx in range(len(self.buy_orders)):
-            self._update_order_item_by_idx(self.buy_table, idx)
-        for idx in range(len(self.sell_orders)):
-            self._update_order_item_by_idx(self.sell_table, idx)
-
-    def _update_order_item_by_idx(self, table, idx: int):
-        orders = self.buy_orders if table == self.buy_table else self.sell_orders
-        order = orders[idx]
-        countdown = table.item(idx, 5)
-        countdown_ms = max(order.countdown_ms(), 0)
-        count_down_str = QTime.fromMSecsSinceStartOfDay(countdown_ms).toString('hh:mm:ss')
-        countdown.setText(count_down_str)
-
-        status = table.item(idx, 6)
-        if order.is_finished():
-            if order.has_error():
-                status.setText('失败')
-            else:
-                status.setText('完成')
-        elif order.is_running():
-            status.setText('执行中')
-        else:
-            status.setText('等待')
-
-        result = table.item(idx, 7)
-        succeed = order.succeed_count
-        failed = order.failed_count
-        total = succeed + failed
-        if total == 0:
-            result.setText('-')
-        else:
-            result.setText(f'{succeed}/{total}')
+    def _make_table(self, side):
+        proxy = OrderFilterProxy(side, self)
+        proxy.setSourceModel(self.model)
+        table = QTableView()
+        table.setModel(proxy)
+        table.setSortingEnabled(True)
+        table.sortByColumn(-1, Qt.SortOrder.AscendingOrder)  # insertion order until a header is clicked
+        table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
+        table.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        # fixed sizes, nothing is measured per row however many tasks there are
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        table.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        table.customContextMenuRequested.connect(lambda pos: self._custom_context_requested(table, pos))
+        return table, proxy
+
+    def _on_filter_changed(self):
+        for proxy in (self.buy_proxy, self.sell_proxy):
+            proxy.set_filter(self.filter_text.text(), self.filter_state.currentData())
+
+    def _on_refreshed(self):
+        if self.filter_state.currentData() is not None:
+            self.buy_proxy.invalidateFilter()
+            self.sell_proxy.invalidateFilter()
 
     def _custom_context_requested(self, table, pos):
-        item = table.itemAt(pos)
-        if item is None:
+        index = table.indexAt(pos)
+        if not index.isValid():
             return
+        task = table.model().mapToSource(index).data(Qt.ItemDataRole.UserRole)
         menu = QMenu()
+        timeline_action = menu.addAction('请求时间线')
         action = menu.addAction('删除')
         selected_action = menu.exec(table.viewport().mapToGlobal(pos))
-        if selected_action == action:
-            idx = item.row()
-            if table == self.buy_table:
-                self.db.remove_buy_order(idx).deleteLater()
-            else:
-                self.db.remove_sell_order(idx).deleteLater()
-
-    def _on_order_removed_by_idx(self, table, idx:int):
-        orders = self.buy_orders if table == self.buy_table else self.sell_orders
-        orders.pop(idx)
-        table.removeRow(idx)
-
-    def resizeEvent(self, event):
-        super().resizeEvent(event)
-        resize_header_to_contents(self.buy_table)
-        resize_header_to_contents(self.sell_table)
\ No newline at end of file
+        if selected_action == timeline_action:
+            self._show_timeline(self.db.order(task))
+        elif selected_action == action:
+            self.db.remove_order(task).deleteLater()
+
+    def _show_timeline(self, order):
+        dialog = QDialog(self)
+        dialog.setWindowTitle(f'{order.exchange} {order.symbol} 请求时间线')
+        dialog.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+        text = QTextBrowser()
+        text.setFont(QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont))
+        text.setLineWrapMode(QTextBrowser.LineWrapMode.NoWrap)
+        text.setPlainText('\n'.join(order_timeline(order) + ['', '最近对时请求 (ms，相对交出时刻):']
+                                    + clock_timeline(order.common)))
+        QVBoxLayout(dialog).addWidget(text)
+        dialog.resize(900, 500)
+        dialog.show()
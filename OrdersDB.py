@@ -1,59 +1,190 @@
-from PySide6.QtCore import QObject, Signal, QDateTime
+import os
+from collections import defaultdict
 
+from PySide6.QtCore import QObject, Signal, QDateTime, QTimer, QStandardPaths, QCoreApplication, qDebug
+
+from AccountPool import FanOut, account_pool, make_order
 from BitgetAPI.BitgetRest import BitgetOrder
+from BurstProfile import ProfileKind
+from FiringEngine import FillTarget
+from GateAPI.GateRest import GateOrder
+from MEXCAPI.MexcRest import MexcOrder
+from OrderJournal import OrderJournal
 from RestClient import RestOrderBase
+from utils import singleton
 
+ORDER_CLASSES = {'Bitget': BitgetOrder, 'Gate.io': GateOrder, 'Mexc.io': MexcOrder}
 
-def singleton(cls):
-    instances = {}
-
-    def get_instance(*args, **kwargs):
-        if cls not in instances:
-            instances[cls] = cls(*args, **kwargs)
-        return instances[cls]
-
-    return get_instance
 
 @singleton
 class Database(QObject):
-    buy_order_added = Signal(RestOrderBase)
-    buy_order_removed = Signal(RestOrderBase)
-    sell_order_added = Signal(RestOrderBase)
-    sell_order_removed = Signal(RestOrderBase)
+    """全部下单任务，按任务编号存放，另按交易所、交易对、方向和状态建索引；界面订阅这里的信号，不另存副本"""
+    order_added = Signal(RestOrderBase)
+    order_removed = Signal(RestOrderBase)
+    order_state_changed = Signal(RestOrderBase)
 
     def __init__(self):
         super().__init__()
-        self.buy_orders = []
-        self.sell_orders = []
+        self.orders = {}  # task id -> order, in the order they were added
+        # secondary indexes, key -> {task id: order}, dicts keep the insertion order and remove in O(1)
+        self.by_exchange = defaultdict(dict)
+        self.by_symbol = defaultdict(dict)
+        self.by_side = defaultdict(dict)
+        self.by_state = defaultdict(dict)
 
-    def push_buy_order(self, order: RestOrderBase):
-        self.buy_orders.append(order)
-        self.buy_order_added.emit(order)
+        directory = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.AppDataLocation)
+        os.makedirs(directory, exist_ok=True)
+        self.journal = OrderJournal(os.path.join(directory, 'orders.db'))
+        self.journaled = {}  # task id -> [state, records written, (succeed, failed)]
+        self.fan_outs = {}  # group id -> FanOut
+        QCoreApplication.instance().aboutToQuit.connect(self._on_about_to_quit)
 
-    def push_sell_order(self, order: RestOrderBase):
-        self.sell_orders.append(order)
-        self.sell_order_added.emit(order)
+        # counts change at the burst's rate, they are journaled at most once a second
+        self.progress_timer = QTimer(self)
+        self.progress_timer.setInterval(1000)
+        self.progress_timer.timeout.connect(self._journal_progress)
+        self.progress_timer.start()
 
-    def remove_buy_order(self, idx: int):
-        order = self.buy_orders.pop(idx)
-        self.buy_order_removed.emit(order)
-        return order
+    def add_order(self, order: RestOrderBase):
+        order.task_id = self.journal.new_task()
+        self.journal.append(order.task_id, 'added', side=order.order_type.name, exchange=order.exchange,
+                            symbol=order.symbol, price=order.price, quantity=order.quantity,
+                            interval=order.interval, trigger_timestamp=order.trigger_timestamp,
+                            dispatchers=order.dispatchers, race_copies=order.race_copies,
+                            max_fills=order.max_fills, profile=order.profile_kind.value, peak_hz=order.peak_hz,
+                            account=order.account, group=order.group_id)
+        self._insert(order)
+        self._journal_order(order)  # immediate orders have started already
 
-    def remove_sell_order(self, idx: int):
-        order = self.sell_orders.pop(idx)
-        self.sell_order_removed.emit(order)
-        return order
+    def add_fan_out(self, fan_out: FanOut):
+        group = self.journal.new_task()  # reserved, no entry of its own
+        self.fan_outs[group] = fan_out
+        for order in fan_out.orders:
+            order.group_id = group
+            self.add_order(order)
 
-    def pop_buy_order(self):
-        order = self.buy_orders.pop()
-        self.buy_order_removed.emit(order)
+    def remove_order(self, task_id) -> RestOrderBase:
+        order = self.orders[task_id]
+        self._journal_order(order)  # a last state change is still announced for an order the store holds
+        del self.orders[task_id]
+        self.journal.append(task_id, 'removed')
+        state = self.journaled.pop(task_id)[0]
+        del self.by_exchange[order.exchange][task_id]
+        del self.by_symbol[order.symbol][task_id]
+        del self.by_side[order.order_type][task_id]
+        del self.by_state[state][task_id]
+        fan_out = self.fan_outs.get(order.group_id)
+        if fan_out is not None and all(other is order for other in fan_out.orders):
+            del self.fan_outs[order.group_id]
+        self.order_removed.emit(order)
         return order
 
-    def pop_sell_order(self):
-        order = self.sell_orders.pop()
-        self.sell_order_removed.emit(order)
-        return order
+    def order(self, task_id) -> RestOrderBase | None:
+        return self.orders.get(task_id)
+
+    def state(self, task_id):
+        return self.journaled[task_id][0]
+
+    def select(self, exchange=None, symbol=None, side: RestOrderBase.OrderType = None, state=None):
+        """{任务编号: 订单}，条件之间为“且”，从最小的那个索引开始过滤"""
+        indexed = [index.get(key, {}) for key, index in ((exchange, self.by_exchange), (symbol, self.by_symbol),
+                                                         (side, self.by_side), (state, self.by_state))
+                   if key is not None]
+        if not indexed:
+            return dict(self.orders)
+        smallest = min(indexed, key=len)
+        return {task: order for task, order in smallest.items() if all(task in index for index in indexed)}
+
+    def count(self, state):
+        return len(self.by_state.get(state, ()))
+
+    def restore(self):
+        """重新加载上次退出前还在等待触发的任务；已经开始执行的不再重发，以免重复成交"""
+        groups = {}  # group id -> (restored orders, target fills)
+        fill_targets = {}  # group id -> FillTarget, set before placing, a trigger already due fires right away
+        for task, entry in self.journal.replay().items():
+            if entry['state'] != 'pending':
+                continue
+            added = entry['added']
+            trigger = QDateTime.fromMSecsSinceEpoch(added['trigger_timestamp']).toString('yyyy.MM.dd hh:mm:ss')
+            account_name = added.get('account', '')
+            description = f"{added['exchange']} {account_name} {added['symbol']} {trigger}"
+            accounts = [account for account in account_pool(added['exchange']) if account.name == account_name]
+            if account_name and not accounts:
+                self.journal.append(task, 'expired', reason='账户已不存在')
+                qDebug(f'未恢复任务 {description}: 账户已不存在')
+                continue
+            order_type = RestOrderBase.OrderType[added['side']]
+            args = (order_type, added['symbol'], added['price'], added['quantity'], added['interval'],
+                    added['trigger_timestamp'])
+            if account_name:
+                order = make_order(ORDER_CLASSES[added['exchange']], added['exchange'], accounts[0], *args)
+            else:
+                order = ORDER_CLASSES[added['exchange']](*args)
+            order.dispatchers = added['dispatchers']
+            order.race_copies = added['race_copies']
+            order.max_fills = added['max_fills']
+            order.profile_kind = ProfileKind(added['profile'])
+            order.peak_hz = added['peak_hz']
+            if added.get('group') is not None:
+                order.fill_target = fill_targets.setdefault(added['group'], FillTarget(order.max_fills))
+            result = order.place_order()
+            if not result[0]:
+                self.journal.append(task, 'expired', reason=result[1])
+                qDebug(f'未恢复任务 {description}: {result[1]}')
+                order.deleteLater()
+                continue
+            order.task_id = task
+            order.group_id = added.get('group')
+            if order.group_id is not None:
+                groups.setdefault(order.group_id, ([], order.max_fills))[0].append(order)
+            self._insert(order)
+            qDebug(f'已恢复任务 {description}')
+        for group, (orders, target_fills) in groups.items():
+            self.fan_outs[group] = FanOut(orders, target_fills)
+
+    def _insert(self, order: RestOrderBase):
+        task = order.task_id
+        self.orders[task] = order
+        self.by_exchange[order.exchange][task] = order
+        self.by_symbol[order.symbol][task] = order
+        self.by_side[order.order_type][task] = order
+        self.by_state['pending'][task] = order
+        self.journaled[task] = ['pending', 0, (0, 0)]
+        order.succeed.connect(lambda: self._journal_order(order))
+        order.failed.connect(lambda: self._journal_order(order))
+        self.order_added.emit(order)
+
+    def _set_state(self, order: RestOrderBase, entry, state):
+        del self.by_state[entry[0]][order.task_id]
+        self.by_state[state][order.task_id] = order
+        entry[0] = state
+        self.journal.append(order.task_id, state, **({} if state == 'started' else {
+            'succeed': order.succeed_count, 'failed': order.failed_count, 'error_code': order.error_code}))
+        self.order_state_changed.emit(order)
+
+    def _journal_order(self, order: RestOrderBase):
+        task = order.task_id
+        entry = self.journaled.get(task)
+        if entry is None:
+            return
+        state, written, counts = entry
+        if len(order.order_records) > written:  # ids are what a crash must never lose, written without delay
+            self.journal.append(task, 'filled', order_ids=order.order_records[written:])
+            entry[1] = len(order.order_records)
+        if state == 'pending' and order.burst is not None:
+            self._set_state(order, entry, 'started')
+        if entry[0] == 'started' and order.is_finished():
+            entry[2] = (order.succeed_count, order.failed_count)
+            self._set_state(order, entry, 'finished')
+        elif (order.succeed_count, order.failed_count) != counts:
+            entry[2] = (order.succeed_count, order.failed_count)
+            self.journal.append(task, 'progress', succeed=order.succeed_count, failed=order.failed_count)
+
+    def _journal_progress(self):
+        for order in list(self.orders.values()):
+            self._journal_order(order)
 
-    def top_order(self):
-        order = self.sell_orders.pop()
-        self.sell_order_removed.emit(order)
+    def _on_about_to_quit(self):
+        self._journal_progress()
+        self.journal.close()
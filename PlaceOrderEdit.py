@@ -1,14 +1,19 @@
 from PySide6 import QtWidgets
-from PySide6.QtCore import QDateTime, Slot, Qt
+from PySide6.QtCore import QDateTime, Slot, Qt, QStringListModel, qDebug
 from PySide6.QtWidgets import QGridLayout, QLabel, QLineEdit, QRadioButton, QDateTimeEdit, QPushButton, \
-    QSizePolicy, QMessageBox, QComboBox
+    QSizePolicy, QMessageBox, QComboBox, QSpinBox, QCompleter
 
 import Buttons
+from AccountPool import FanOut, account_pool, make_order
 from BitgetAPI.BitgetRest import BitgetOrder, BitgetCommon
+from BurstProfile import ProfileKind, check_rates
+from FiringEngine import MAX_DISPATCHERS
 from GateAPI.GateRest import GateOrder, GateCommon
 from MEXCAPI.MexcRest import MexcCommon, MexcOrder
+from OrderRules import check_order
 from OrdersDB import Database
 from RestClient import RestOrderBase, SymbolInfo
+from SymbolCache import SymbolCache
 
 
 class PlaceOrderWidget(QtWidgets.QWidget):
@@ -33,6 +38,12 @@ class PlaceOrderWidget(QtWidgets.QWidget):
         self.symbol_remark = QLabel()
         layout.addWidget(self.symbol_remark, 2, 2)
         self.symbol.editingFinished.connect(self._on_symbol_edit_finished)
+        # the catalog's names are sorted already, the completer searches them by bisection
+        self.symbol_names = QStringListModel(self)
+        completer = QCompleter(self.symbol_names, self)
+        completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        completer.setModelSorting(QCompleter.ModelSorting.CaseInsensitivelySortedModel)
+        self.symbol.setCompleter(completer)
 
         layout.addWidget(QLabel('价格:'), 3, 0)
         self.price = QLineEdit()
@@ -49,21 +60,57 @@ class PlaceOrderWidget(QtWidgets.QWidget):
         layout.addWidget(QLabel('频率:'), 5, 0)
         self.hz = QLineEdit()
         layout.addWidget(self.hz, 5, 1)
+        self.dispatchers = QSpinBox()
+        self.dispatchers.setRange(1, MAX_DISPATCHERS)
+        self.dispatchers.setPrefix('发送线程: ')
+        layout.addWidget(self.dispatchers, 5, 2)
+
+        layout.addWidget(QLabel('节奏:'), 6, 0)
+        self.profile = QComboBox()
+        for text, kind in (('恒定频率', ProfileKind.Constant), ('脉冲衰减', ProfileKind.PulseDecay),
+                           ('拒单自适应', ProfileKind.RejectRamp), ('自动', ProfileKind.Auto)):
+            self.profile.addItem(text, kind)
+        layout.addWidget(self.profile, 6, 1)
+        self.peak_hz = QLineEdit()
+        self.peak_hz.setPlaceholderText('峰值频率')
+        self.peak_hz.setEnabled(False)
+        layout.addWidget(self.peak_hz, 6, 2)
+        self.profile.currentIndexChanged.connect(self._on_profile_changed)
+
+        layout.addWidget(QLabel('首单竞速:'), 7, 0)
+        self.race_copies = QSpinBox()
+        self.race_copies.setRange(1, MAX_DISPATCHERS)
+        self.race_copies.setSuffix(' 路')
+        layout.addWidget(self.race_copies, 7, 1)
+        layout.addWidget(QLabel('同一首单从多条连接同时发出'), 7, 2)
+
+        layout.addWidget(QLabel('成交笔数:'), 8, 0)
+        self.max_fills = QSpinBox()
+        self.max_fills.setRange(1, 100)
+        layout.addWidget(self.max_fills, 8, 1)
+        layout.addWidget(QLabel('达到后结束任务并中止在途请求'), 8, 2)
+
+        layout.addWidget(QLabel('账户数:'), 9, 0)
+        self.accounts = QSpinBox()
+        self.accounts.setRange(1, 1)
+        layout.addWidget(self.accounts, 9, 1)
+        self.accounts_remark = QLabel('各账户同时下单，合计成交笔数')
+        layout.addWidget(self.accounts_remark, 9, 2)
 
         self.timer_switch = QRadioButton('定时下单')
-        layout.addWidget(self.timer_switch, 6, 0)
+        layout.addWidget(self.timer_switch, 10, 0)
         self.timer_switch.toggled.connect(self._on_timer_switch_toggled)
 
-        layout.addWidget(QLabel('定时时间:'), 7, 0)
+        layout.addWidget(QLabel('定时时间:'), 11, 0)
         self.datetime = QDateTimeEdit()
         self.datetime.setDisplayFormat("yyyy.MM.dd hh:mm:ss")
         cur_time = QDateTime.currentDateTime()
         self.datetime.setDateTime(cur_time.addMSecs(-cur_time.time().msec()))
-        layout.addWidget(self.datetime, 7, 1)
+        layout.addWidget(self.datetime, 11, 1)
 
         self.apply = QPushButton('添加任务')
         self.apply.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Fixed)
-        layout.addWidget(self.apply, 8, 0, 1, 3, Qt.AlignmentFlag.AlignHCenter)
+        layout.addWidget(self.apply, 12, 0, 1, 3, Qt.AlignmentFlag.AlignHCenter)
         self.apply.clicked.connect(self._on_apply_clicked)
 
         self.timer_switch.toggle()
@@ -71,20 +118,35 @@ class PlaceOrderWidget(QtWidgets.QWidget):
         self.database = Database()
 
         self.rest_client = None
+        self.catalog = None
         self._setup_new_client()
 
     def _setup_new_client(self):
+        # clients are process-wide shared, only detach from them
         if self.rest_client:
-            self.rest_client.deleteLater()
+            self.rest_client.symbol_info_updated.disconnect(self._on_symbol_info_updated)
+            self.rest_client.symbol_info_not_existed.disconnect(self._on_symbol_info_not_existed)
+            self.catalog.updated.disconnect(self._on_catalog_updated)
         match self.exchanges.currentIndex():
             case 0:
-                self.rest_client = BitgetCommon()
+                self.rest_client = BitgetCommon.shared()
+                self.catalog = SymbolCache().catalog('Bitget')
             case 1:
-                self.rest_client = GateCommon()
+                self.rest_client = GateCommon.shared()
+                self.catalog = SymbolCache().catalog('Gate.io')
             case 2:
-                self.rest_client = MexcCommon()
+                self.rest_client = MexcCommon.shared()
+                self.catalog = SymbolCache().catalog('Mexc.io')
         self.rest_client.symbol_info_updated.connect(self._on_symbol_info_updated)
         self.rest_client.symbol_info_not_existed.connect(self._on_symbol_info_not_existed)
+        self.catalog.updated.connect(self._on_catalog_updated)
+        self._on_catalog_updated()
+        self.accounts.setRange(1, len(account_pool(self.catalog.exchange)))
+
+    def _on_catalog_updated(self):
+        names = [self.catalog.symbols[name].symbol for name in self.catalog.names]
+        if names != self.symbol_names.stringList():
+            self.symbol_names.setStringList(names)
 
     def _on_exchange_changed(self):
         match self.exchanges.currentIndex():
@@ -98,6 +160,10 @@ class PlaceOrderWidget(QtWidgets.QWidget):
         if self.symbol.text():
             self.symbol.editingFinished.emit()
 
+    def _on_profile_changed(self):
+        # the base rate is the 频率 field, pulse and ramp start from a peak above it, auto works it out
+        self.peak_hz.setEnabled(self.profile.currentData() in (ProfileKind.PulseDecay, ProfileKind.RejectRamp))
+
     def _on_timer_switch_toggled(self):
         if self.timer_switch.isChecked():
             self.datetime.setEnabled(True)
@@ -107,10 +173,15 @@ class PlaceOrderWidget(QtWidgets.QWidget):
             self.apply.setText('立即下单')
 
     def _on_symbol_edit_finished(self):
-        self.rest_client.request_symbol(self.symbol.text())
         self.symbol_remark.setText('')
         self.price_remark.setText('')
         self.quantity_remark.setText('')
+        info = self.catalog.lookup(self.symbol.text())
+        if info is not None:
+            self._on_symbol_info_updated(info)
+        else:
+            # listed after the last full list, or not at all
+            self.rest_client.request_symbol(self.symbol.text())
 
     def _on_symbol_info_not_existed(self):
         self.symbol_remark.setText('该交易对不存在')
@@ -128,34 +199,62 @@ class PlaceOrderWidget(QtWidgets.QWidget):
         # scheduled order
         if self.timer_switch.isChecked():
             self._place_order()
-        else: # immediately order
-            self._place_order(True)
+        elif self._place_order(True):  # immediately order
             QMessageBox.information(self,'立即下单任务', '立即下单任务已添加，请在右侧表格查看')
 
     def _place_order(self, immediately = False):
         symbol = self.symbol.text()
         price = self.price.text()
         quantity = self.quantity.text()
-        hz = int(self.hz.text())
-        interval = 1000 / hz
         is_buy_order = self.order_toggle.button1_isChecked()
         order_type = RestOrderBase.OrderType.Buy if is_buy_order else RestOrderBase.OrderType.Sell
         order_cls = [BitgetOrder, GateOrder, MexcOrder]
         exchange_idx = self.exchanges.currentIndex()
-        if immediately:
-            order = order_cls[exchange_idx](order_type, symbol, price, quantity, interval)
+        # every order of the burst is the same request, anything the exchange would refuse is caught here
+        try:
+            peak_hz = self.peak_hz.text() if self.peak_hz.isEnabled() and self.peak_hz.text() else None
+            hz, peak_hz = check_rates(self.hz.text(), peak_hz)
+            price, quantity, notes = check_order(self.catalog.exchange, order_type, symbol, price, quantity)
+        except ValueError as e:
+            QMessageBox.warning(self, '添加任务失败', f'下单参数有误: {e}',
+                                QMessageBox.StandardButton.Ok, QMessageBox.StandardButton.NoButton)
+            return False
+        if notes:
+            self.price.setText(price)
+            self.quantity.setText(quantity)
+            qDebug(f'{symbol} 下单参数已调整: {"; ".join(notes)}')
+        interval = 1000 / hz  # sub-ms spacing is fine, the firing threads don't use QTimer for it
+        trigger_timestamp = -1 if immediately else self.datetime.dateTime().toMSecsSinceEpoch()
+        args = (order_type, symbol, price, quantity, interval, trigger_timestamp)
+        if self.accounts.value() > 1:
+            exchange = self.catalog.exchange
+            orders = [make_order(order_cls[exchange_idx], exchange, account, *args)
+                      for account in account_pool(exchange)[:self.accounts.value()]]
         else:
-            order = order_cls[exchange_idx](order_type, symbol, price, quantity, interval,self.datetime.dateTime().toMSecsSinceEpoch())
+            orders = [order_cls[exchange_idx](*args)]
 
-        result = order.place_order()
-        if not result[0]:
-            QMessageBox.warning(self, '添加任务失败', f'下单失败, 请检查下单参数: {result[1]}',
-                                QMessageBox.StandardButton.Ok, QMessageBox.StandardButton.NoButton)
-            return
+        for order in orders:
+            order.dispatchers = self.dispatchers.value()
+            order.race_copies = self.race_copies.value()
+            order.max_fills = self.max_fills.value()
+            order.profile_kind = self.profile.currentData()
+            order.peak_hz = peak_hz
+
+        # before placing, an immediate order starts firing inside place_order
+        fan_out = FanOut(orders, self.max_fills.value()) if len(orders) > 1 else None
+        for order in orders:
+            result = order.place_order()  # the accounts share the trigger, only the first can be refused
+            if not result[0]:
+                for refused in orders:
+                    refused.deleteLater()
+                QMessageBox.warning(self, '添加任务失败', f'下单失败, 请检查下单参数: {result[1]}',
+                                    QMessageBox.StandardButton.Ok, QMessageBox.StandardButton.NoButton)
+                return False
 
-        if is_buy_order:
-            self.database.push_buy_order(order)
+        if fan_out is not None:
+            self.database.add_fan_out(fan_out)
         else:
-            self.database.push_sell_order(order)
+            self.database.add_order(orders[0])
 
 
+        return True
@@ -0,0 +1,82 @@
+import threading
+
+from utils import get_monotonic_ms, singleton
+
+
+class TokenBucket:
+    """一个交易所 API key 的下单额度，所有任务共用：刚触发的任务优先取令牌，收到限频回执后降速再逐步恢复"""
+    FRESH_MS = 1000.0  # bursts younger than this may empty the bucket
+    RESERVE = 0.5  # older bursts leave this share of the bucket to the ones that trigger next
+    BACKOFF = 0.5  # rate factor on every rate-limited reply
+    BACKOFF_HOLD_MS = 1000.0  # no recovery this soon after the last one
+    RECOVERY_PER_S = 0.1  # share of the configured rate won back per second after that
+
+    def __init__(self, rate):
+        self.rate = rate  # configured requests per second
+        self.current_rate = rate
+        self.tokens = float(rate)
+        self.throttled_count = 0  # rate-limited replies seen
+        self.denied_count = 0  # sends skipped for lack of tokens
+        self._last_ms = get_monotonic_ms()
+        self._backoff_ms = None
+        self._lock = threading.Lock()
+
+    def configure(self, rate):
+        with self._lock:
+            self.current_rate = min(self.current_rate, rate) if self._backoff_ms is not None else rate
+            self.rate = rate
+
+    def take(self, burst_start_ms, force=False):
+        # force: first orders of a burst, the whole point of the task, they go out and put the bucket in debt
+        with self._lock:
+            now = get_monotonic_ms()
+            self._refill(now)
+            floor = 0.0 if now - burst_start_ms < self.FRESH_MS else self.rate * self.RESERVE
+            if force or self.tokens - 1 >= floor:
+                self.tokens -= 1
+                return True
+            self.denied_count += 1
+            return False
+
+    def throttled(self):
+        with self._lock:
+            now = get_monotonic_ms()
+            self._refill(now)
+            # one slow down per hold period, a reply storm from the same overload shouldn't drive it to the floor
+            if self._backoff_ms is None or now - self._backoff_ms > self.BACKOFF_HOLD_MS:
+                self.current_rate = max(1.0, self.current_rate * self.BACKOFF)
+                self.tokens = min(self.tokens, 0.0)
+            self._backoff_ms = now
+            self.throttled_count += 1
+
+    def _refill(self, now):
+        elapsed_s = (now - self._last_ms) / 1000
+        self._last_ms = now
+        if self._backoff_ms is not None and now - self._backoff_ms > self.BACKOFF_HOLD_MS:
+            self.current_rate += self.rate * self.RECOVERY_PER_S * elapsed_s
+            if self.current_rate >= self.rate:
+                self.current_rate = self.rate
+                self._backoff_ms = None
+        self.tokens = min(float(self.rate), self.tokens + self.current_rate * elapsed_s)
+
+    def describe(self):
+        slowed = f' 降速至 {self.current_rate:.1f}/s' if self.current_rate < self.rate else ''
+        return f'{self.rate:g}/s{slowed}, 限频 {self.throttled_count}, 跳过 {self.denied_count}'
+
+
+@singleton
+class RateBudget:
+    """按 (交易所, API key) 共享的令牌桶，同一个 key 的并发任务合起来不超过交易所的下单频率限制"""
+
+    def __init__(self):
+        self.buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, exchange, api_key, rate) -> TokenBucket:
+        with self._lock:
+            bucket = self.buckets.get((exchange, api_key))
+            if bucket is None:
+                bucket = self.buckets[(exchange, api_key)] = TokenBucket(rate)
+            elif bucket.rate != rate:
+                bucket.configure(rate)
+            return bucket
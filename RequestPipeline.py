@@ -0,0 +1,37 @@
+from collections import deque
+
+from utils import get_monotonic_ms
+
+PRESIGN_WINDOW_MS = 2000.0  # how far ahead of the send position requests are kept ready
+MAX_PRESIGNED = 512
+
+
+class PresignedQueue:
+    """提前按预计发送时刻签好的请求，发送时直接取用，热路径上不再做序列化和签名"""
+
+    def __init__(self):
+        self.queue = deque()  # (slot, request, body, built ms)
+
+    def fill(self, lane, budget_ms):
+        # top up the lane's upcoming slots until the window is covered or the time budget runs out
+        step = lane.stride
+        burst = lane.burst
+        count = 1 if lane.race_copy else MAX_PRESIGNED
+        slot = self.queue[-1][0] + step if self.queue else lane.slot
+        slot = max(slot, lane.slot)
+        now = get_monotonic_ms()
+        # presigning fixes the schedule, adaptive profiles keep that stretch short
+        horizon_ms = max(now, burst.start_ms) + burst.profile.presign_window_ms
+        end_ms = now + budget_ms
+        while len(self.queue) < count and burst.deadline(slot) < horizon_ms and get_monotonic_ms() < end_ms:
+            request, body = lane.build_request(slot)
+            self.queue.append((slot, request, body, get_monotonic_ms()))
+            slot += step
+
+    def take(self, slot):
+        queue = self.queue
+        while queue and queue[0][0] < slot:  # skipped slots
+            queue.popleft()
+        if queue and queue[0][0] == slot:
+            return queue.popleft()[1:]
+        return None
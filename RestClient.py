@@ -3,9 +3,17 @@ from abc import abstractmethod, ABCMeta
 from enum import Enum
 
 from PySide6.QtCore import QObject, Signal, QTimer, QDateTime, qDebug, QTime, Qt
-from PySide6.QtNetwork import QNetworkAccessManager
+from PySide6.QtNetwork import QNetworkAccessManager, QNetworkRequest
 from dataclasses import dataclass
 
+import Scheduler
+from BurstProfile import ProfileKind, make_profile
+from FiringEngine import Burst, FiringEngine
+from LatencyStats import LatencyWindow
+from Tracing import Tracer
+from Configuration import WarmupConfiguration, FiringConfiguration
+from utils import get_monotonic_ms
+
 
 class MetaQObjectABC(type(QObject), ABCMeta):
     pass
@@ -16,17 +24,28 @@ class SymbolInfo:
     status: str
     price_precision: int
     quantity_precision: int
+    min_notional: str = '0'  # least price * quantity in the quote currency, 0: no minimum
 
 
 class RestBase(QObject, metaclass=MetaQObjectABC):
     server_time_updated = Signal()
     symbol_info_updated = Signal(SymbolInfo)
     symbol_info_not_existed = Signal(str)
+    symbols_listed = Signal(list)  # every SymbolInfo of the exchange, see SymbolCache
+    symbols_list_failed = Signal()
     http_manager = QNetworkAccessManager()
+    _shared_instances = {}
 
     def __init__(self):
         super().__init__()
 
+    @classmethod
+    def shared(cls):
+        # one instance per exchange in the whole process, so every consumer sees the same clock
+        if cls not in RestBase._shared_instances:
+            RestBase._shared_instances[cls] = cls()
+        return RestBase._shared_instances[cls]
+
     @property
     @abstractmethod
     def rectified_timestamp(self):
@@ -37,6 +56,22 @@ class RestBase(QObject, metaclass=MetaQObjectABC):
     def delay_ms(self):
         pass
 
+    @property
+    @abstractmethod
+    def latency(self) -> LatencyWindow:
+        # recent round trips of time syncs and order replies, for the tail the smoothed delay_ms hides
+        pass
+
+    @abstractmethod
+    def local_deadline(self, server_timestamp):
+        # monotonic ms at which the server clock reaches `server_timestamp`
+        pass
+
+    @abstractmethod
+    def server_timestamp(self, local_ms):
+        # server time at monotonic `local_ms`
+        pass
+
     @abstractmethod
     def request_utctime(self):
         pass
@@ -44,6 +79,11 @@ class RestBase(QObject, metaclass=MetaQObjectABC):
     @abstractmethod
     def request_symbol(self, symbol):
         pass
+
+    @abstractmethod
+    def request_symbols(self):
+        # the whole symbol list in one request, answered through symbols_listed or symbols_list_failed
+        pass
     
 
 class RestOrderBase(RestBase):
@@ -57,6 +97,9 @@ class RestOrderBase(RestBase):
     def __init__(self, order_type:OrderType, symbol:str, price:str, quantity:str, interval = 1, trigger_timestamp=-1):
         super().__init__()
         self.exchange = ''
+        self.task_id = None  # stable key in OrdersDB.Database, None until added there
+        self.account = ''  # key set the order signs with when a task fans out, see AccountPool
+        self.group_id = None  # id shared by the orders of one fan-out task, None: a single account task
         self.order_type = order_type
         self.symbol = symbol
         self.price = price
@@ -67,12 +110,32 @@ class RestOrderBase(RestBase):
         self.succeed_count = 0
         self.failed_count = 0
         self.error_code = -1 # fatal error, means no need to do more requesting
+        self.first_dispatch_ms = None
+        self.dispatch_error_ms = None  # first request left this late (negative: early) against the aim
+        self._countdown_5s_notified = False
+        self.dispatchers = 1  # firing threads sharing the burst, more of them allow tighter spacing
+        self.race_copies = 1  # >1: the first order leaves over that many independent connections at once
+        self.race_lost_count = 0  # race copies beaten by another copy, neither success nor failure
+        self.max_fills = 1  # successful orders after which the task stops and drops what is still in flight
+        self.fill_target = None  # FiringEngine.FillTarget shared with the other accounts of a fan-out
+        self.profile_kind = ProfileKind.Constant  # shape of the send schedule, see BurstProfile
+        self.peak_hz = None  # pulse and ramp profiles, None: the base rate
+        self.burst = None
+        self.pool = None  # connections kept warm for this task before the trigger
+        self.http2 = False  # per exchange opt-in, set by the subclass from its configuration
+        self.rate_limit = 0  # orders per second shared by all tasks on the same key, 0: unlimited, set by the subclass
+        self.tracer = Tracer()  # lifecycle of every order request, see Tracing.order_timeline
 
-        self.trigger_timer = QTimer(self)
-        self.trigger_timer.setInterval(interval)
-        self.trigger_timer.setTimerType(Qt.TimerType.PreciseTimer)
-        self.trigger_timer.timeout.connect(self.order_trigger_event)
-        self.trigger_check_timer = QTimer(self)  # in case of system time drifting
+        config = WarmupConfiguration()
+        self.warmup_connections = config.connections()
+        self.warmup_lead_ms = config.lead_seconds() * 1000
+        self.warmup_keepalive_ms = config.keepalive_seconds() * 1000
+        config = FiringConfiguration()
+        self.max_in_flight = config.max_in_flight()
+        self.reply_timeout_ms = config.reply_timeout_ms()  # without a byte for this long a request is given up
+        self.transport_error_count = 0  # requests that got no HTTP reply at all, timeouts included
+
+        self.trigger_check_timer = QTimer(self)  # re-checked since the server offset estimate keeps improving
         self.trigger_check_timer.setTimerType(Qt.TimerType.PreciseTimer)
         self.trigger_check_timer.timeout.connect(self._on_check_time)
         self.trigger_check_timer.setSingleShot(True)
@@ -83,11 +146,11 @@ class RestOrderBase(RestBase):
             delta_ms = self.trigger_timestamp - server_time
             if delta_ms < 0:
                 msg = (f'定时时间 {QDateTime.fromMSecsSinceEpoch(self.trigger_timestamp).toString()} '
-                       f'不能晚于当前时间 {QDateTime.fromMSecsSinceEpoch(server_time).toString()}')
+                       f'不能晚于当前时间 {QDateTime.fromMSecsSinceEpoch(int(server_time)).toString()}')
                 return False, msg
             self._on_check_time()
         else:  # start immediately
-            self.trigger_timestamp = server_time
+            self.trigger_timestamp = int(server_time)
             self.order_trigger_start_event()
         return True, 'success'
 
@@ -96,19 +159,114 @@ class RestOrderBase(RestBase):
         pass
 
     def stop_order_trigger(self):
-        self.trigger_timer.stop()
+        if self.burst:
+            self.burst.stop()
+            # whatever is still in flight could only fill again or fail, free the connections and the budget
+            FiringEngine().abort_burst(self.burst)
+        if self.pool:
+            self.pool.close()
+
+    def on_filled(self):
+        # called by the exchange reply handlers after counting a success, True for the fill that ends the task
+        if self.succeed_count >= self.max_fills:
+            self.stop_order_trigger()
+        return self.succeed_count == self.max_fills
 
     def order_trigger_5s_countdown_event(self):
         pass
 
-    def order_trigger_start_event(self):
-        self.order_trigger_event()
-        self.trigger_timer.start()
+    def order_trigger_start_event(self, start_ms=None):
+        if start_ms is None:
+            start_ms = get_monotonic_ms()
+        # made only now, auto tuning wants the freshest latency figures
+        profile = make_profile(self, self.profile_kind, self.peak_hz)
+        self.burst = Burst(self, start_ms, self.interval, self.dispatchers, self.race_copies, profile)
+        qDebug(f'{self.exchange} {self.symbol} 发送节奏: {profile.describe()}')
+        FiringEngine().start_burst(self.burst, self.pool.dispatchers if self.pool else None)
+
+    def start_warm_up(self):
+        self.pool = FiringEngine().warm_up(self.warm_up_request(), max(self.dispatchers, self.race_copies),
+                                           self.warmup_connections, self.warmup_keepalive_ms)
+        self.destroyed.connect(self.pool.close)
+        qDebug(f'{self.exchange} {self.symbol} 开始预热连接: {self.warmup_connections} x {len(self.pool.dispatchers)}')
+
+    def setup_transport(self, request: QNetworkRequest):
+        # HTTP/2 multiplexes the whole burst over one warm connection instead of queueing behind six HTTP/1.1 ones
+        request.setAttribute(QNetworkRequest.Attribute.Http2AllowedAttribute, self.http2)
+        if self.http2 and request.url().scheme() == 'http':
+            request.setAttribute(QNetworkRequest.Attribute.Http2DirectAttribute, True)  # h2c, local test servers
+        request.setTransferTimeout(self.reply_timeout_ms)
+        return request
 
     @abstractmethod
-    def order_trigger_event(self):
+    def warm_up_request(self):
+        # cheap unauthenticated request on the order host, used to open and keep connections
         pass
 
+    def on_first_dispatched(self, deadline_ms, sent_ms):
+        self.first_dispatch_ms = sent_ms
+        self.dispatch_error_ms = sent_ms - deadline_ms
+        qDebug(f'{self.exchange} {self.symbol} 首单发出误差: {self.dispatch_error_ms:+.3f}ms '
+               f'(单程延迟 {self.delay_ms:.1f}ms, 往返 {self.latency.describe()})')
+
+    @abstractmethod
+    def build_order_request(self, dispatch_ms=None, client_id=None):
+        # -> (QNetworkRequest, bytes) to send at monotonic `dispatch_ms` (now if None), called from the firing threads
+        # `client_id` makes the order idempotent on the exchange side, so race copies can't fill twice
+        pass
+
+    def sign_timestamp(self, dispatch_ms=None):
+        # server time the request is stamped with, never before the trigger
+        timestamp = self.rectified_timestamp if dispatch_ms is None else self.server_timestamp(dispatch_ms)
+        return int(max(timestamp, self.trigger_timestamp))  # exchanges take whole ms
+
+    @abstractmethod
+    def handle_reply(self, status_code, data):
+        pass
+
+    @abstractmethod
+    def is_success_reply(self, status_code, data):
+        pass
+
+    def is_rate_limited(self, status_code, data):
+        # the exchange asks to slow down, called from the firing threads
+        return status_code == 429
+
+    def reply_server_ms(self, data):
+        # server timestamp carried by an order reply, if the exchange sends one
+        return None
+
+    def server_time_of_reply(self, trace):
+        # parsed on demand, never on the hot path
+        if trace.server_ms is None and trace.data:
+            try:
+                trace.server_ms = self.reply_server_ms(trace.data)
+            except (ValueError, KeyError, TypeError):
+                pass
+        return trace.server_ms
+
+    def on_replied(self, status_code, data, race=None):
+        if status_code == 0:  # no reply to judge, the exchange may or may not have seen the order
+            self.transport_error_count += 1
+            if race is not None:
+                race.pending -= 1
+                if race.pending == 0 and not race.won and race.last_failure:  # the copies that did answer failed
+                    self.handle_reply(*race.last_failure)
+            return
+        if race is None:
+            self.handle_reply(status_code, data)
+            return
+        race.pending -= 1
+        if self.is_success_reply(status_code, data):
+            race.won = True
+            self.handle_reply(status_code, data)
+        elif race.won or race.pending > 0:
+            # another copy already made it or may still make it, this one is no failure of its own
+            self.race_lost_count += 1
+            race.last_failure = (status_code, data)
+        else:  # every copy failed, count the race once
+            self.handle_reply(status_code, data)
+
     def is_running(self):
         return self.is_trigger_active()
 
@@ -119,21 +277,29 @@ class RestOrderBase(RestBase):
         return self.error_code > 0
 
     def is_trigger_active(self):
-        return self.trigger_timer.isActive()
+        return self.burst is not None and not self.burst.stopped
+
+    def dispatch_deadline(self):
+        # monotonic time to send at, so that the first packet arrives at the trigger
+        return self.local_deadline(self.trigger_timestamp) - self.delay_ms
 
     def countdown_ms(self):
-        ms = self.trigger_timestamp - self.rectified_timestamp - self.delay_ms
+        # both ends on the monotonic clock, so wall clock jumps can't move the trigger
+        ms = self.dispatch_deadline() - get_monotonic_ms()
         return ms
 
     def _on_check_time(self):
         delta_ms = self.countdown_ms()
-        if delta_ms < 1000:    # trigger
-            self.order_trigger_start_event()
-        elif delta_ms < 5000:   # 5s
-            self.trigger_check_timer.setInterval(delta_ms)
-            self.trigger_check_timer.start()
+        if delta_ms < Scheduler.HANDOFF_MS:    # trigger, the firing thread does the precise wait
+            self.order_trigger_start_event(self.dispatch_deadline())
+            return
+        if delta_ms < self.warmup_lead_ms and self.pool is None:
+            self.start_warm_up()
+        if delta_ms < 5000 and not self._countdown_5s_notified:   # 5s
+            self._countdown_5s_notified = True
             self.order_trigger_5s_countdown_event()
-        else:   # > 5s
-            check_time = delta_ms - 5000
-            self.trigger_check_timer.setInterval(check_time)
-            self.trigger_check_timer.start()
+
+        # wake up at the next milestone: warm-up, 5s, handoff; at least hourly, QTimer takes a 32-bit interval
+        milestone = max(m for m in (self.warmup_lead_ms, 5000, Scheduler.HANDOFF_MS) if m < delta_ms)
+        self.trigger_check_timer.setInterval(int(min(delta_ms - milestone, 3600 * 1000)))
+        self.trigger_check_timer.start()
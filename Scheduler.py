@@ -0,0 +1,17 @@
+import time
+
+from utils import get_monotonic_ms
+
+HANDOFF_MS = 1000.0  # below this the order hands its burst over to the firing thread
+SPIN_MS = 2.0  # last stretch is busy-waited, sleep() wakes up too late for it
+
+
+def wait_until(deadline_ms, spin_ms=SPIN_MS):
+    """精确等待到单调时钟的 deadline_ms：先 sleep 到最后 spin_ms，再忙等，返回实际到达时刻"""
+    remaining = deadline_ms - get_monotonic_ms()
+    if remaining > spin_ms:
+        time.sleep((remaining - spin_ms) / 1000)
+    now = get_monotonic_ms()
+    while now < deadline_ms:
+        now = get_monotonic_ms()
+    return now
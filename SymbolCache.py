@@ -0,0 +1,141 @@
+import bisect
+import dataclasses
+import json
+import os
+import time
+
+from PySide6.QtCore import QObject, Signal, QTimer, QStandardPaths, qDebug
+
+from RestClient import RestBase, SymbolInfo
+from utils import singleton
+
+TTL_S = 6 * 3600  # a full list older than this is fetched again in the background
+CHECK_INTERVAL_MS = 10 * 60 * 1000
+REFRESH_TIMEOUT_S = 60  # a list request that never came back doesn't block the next one
+
+
+class SymbolCatalog(QObject):
+    """一个交易所的全部交易对：整批下载后在内存中按名称索引，落盘缓存，过期后在后台刷新，单个查询的结果也随时并入"""
+    updated = Signal()
+
+    def __init__(self, exchange, client: RestBase, path):
+        super().__init__()
+        self.exchange = exchange
+        self.client = client
+        self.path = path
+        self.symbols = {}  # lower case name -> SymbolInfo
+        self.names = []  # lower case names, sorted the way QCompleter sorts case insensitively
+        self.fetched_at = 0  # wall clock seconds of the last full list
+        self._refresh_started = None
+        self._load()
+        client.symbols_listed.connect(self._on_listed)
+        client.symbols_list_failed.connect(self._on_list_failed)
+        client.symbol_info_updated.connect(self._on_symbol_info)
+
+    def is_stale(self):
+        return time.time() - self.fetched_at > TTL_S
+
+    def is_ready(self):
+        # some list is at hand, possibly a stale one from disk
+        return self.fetched_at > 0
+
+    def refresh(self):
+        now = time.time()
+        if self._refresh_started is None or now - self._refresh_started > REFRESH_TIMEOUT_S:
+            self._refresh_started = now
+            self.client.request_symbols()
+
+    def lookup(self, symbol) -> SymbolInfo | None:
+        return self.symbols.get(symbol.lower())
+
+    def complete(self, prefix, limit=50):
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self.names, prefix)
+        matches = []
+        for name in self.names[start:start + limit]:
+            if not name.startswith(prefix):
+                break
+            matches.append(self.symbols[name].symbol)
+        return matches
+
+    def _on_list_failed(self):
+        self._refresh_started = None  # the next check tries again
+
+    def _on_listed(self, infos):
+        self._refresh_started = None
+        fresh = {info.symbol.lower(): info for info in infos}
+        added = fresh.keys() - self.symbols.keys()
+        removed = self.symbols.keys() - fresh.keys()
+        changed = [name for name in fresh.keys() & self.symbols.keys() if fresh[name] != self.symbols[name]]
+        self.fetched_at = time.time()
+        self.symbols = fresh
+        if added or removed:
+            self.names = sorted(fresh)
+        self._save()
+        if added or removed or changed:
+            qDebug(f'{self.exchange} 交易对列表: {len(fresh)} 个, 新增 {len(added)}, 移除 {len(removed)}, 变更 {len(changed)}')
+            self.updated.emit()
+
+    def _on_symbol_info(self, info: SymbolInfo):
+        # a single lookup, e.g. a pair listed after the last full list
+        name = info.symbol.lower()
+        if self.symbols.get(name) == info:
+            return
+        if name not in self.symbols:
+            bisect.insort(self.names, name)
+        self.symbols[name] = info
+        self._save()
+        self.updated.emit()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                cached = json.load(f)
+            self.symbols = {entry['symbol'].lower(): SymbolInfo(**entry) for entry in cached['symbols']}
+            self.fetched_at = cached['fetched_at']
+        except (OSError, ValueError, KeyError, TypeError):
+            self.symbols, self.fetched_at = {}, 0
+        self.names = sorted(self.symbols)
+
+    def _save(self):
+        tmp = self.path + '.tmp'
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'fetched_at': self.fetched_at,
+                           'symbols': [dataclasses.asdict(info) for info in self.symbols.values()]}, f, ensure_ascii=False)
+            os.replace(tmp, self.path)  # a crash mid write keeps the old file
+        except OSError as e:
+            qDebug(f'{self.exchange} 交易对缓存写入失败: {e}')
+
+
+@singleton
+class SymbolCache(QObject):
+    """各交易所的交易对目录，启动时从磁盘读入，过期的在后台重新下载"""
+
+    def __init__(self):
+        super().__init__()
+        from BitgetAPI.BitgetRest import BitgetCommon
+        from GateAPI.GateRest import GateCommon
+        from MEXCAPI.MexcRest import MexcCommon
+
+        directory = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.AppDataLocation)
+        os.makedirs(directory, exist_ok=True)
+        self.catalogs = {
+            exchange: SymbolCatalog(exchange, client, os.path.join(directory, f'symbols_{name}.json'))
+            for exchange, client, name in (('Bitget', BitgetCommon.shared(), 'bitget'),
+                                           ('Gate.io', GateCommon.shared(), 'gate'),
+                                           ('Mexc.io', MexcCommon.shared(), 'mexc'))
+        }
+        self.check_timer = QTimer(self)
+        self.check_timer.setInterval(CHECK_INTERVAL_MS)
+        self.check_timer.timeout.connect(self.refresh_stale)
+        self.check_timer.start()
+        self.refresh_stale()
+
+    def catalog(self, exchange) -> SymbolCatalog:
+        return self.catalogs[exchange]
+
+    def refresh_stale(self):
+        for catalog in self.catalogs.values():
+            if catalog.is_stale():
+                catalog.refresh()
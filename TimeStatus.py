@@ -1,23 +1,65 @@
 from PySide6 import QtWidgets
-from PySide6.QtCore import QTimer, QDateTime, Qt
+from PySide6.QtCore import QDateTime, QTimer, QPointF, Qt
+from PySide6.QtGui import QPainter, QPen, QColor
 from PySide6.QtWidgets import QHBoxLayout, QLabel, QSpacerItem, QSizePolicy
 
-from BitgetAPI.BitgetRest import BitgetCommon
-from GateAPI.GateRest import GateCommon
-from MEXCAPI.MexcRest import MexcCommon
+from ClockService import ClockService
+from LatencyStats import LatencyWindow
+
+
+class LatencySparkline(QtWidgets.QWidget):
+    """最近往返延迟的折线，纵轴按窗口的 max 缩放，虚线是 p99"""
+    SAMPLES = 120
+
+    def __init__(self, latency: LatencyWindow):
+        super().__init__()
+        self.latency = latency
+        self.values = []
+        self.p99 = None
+        self.setFixedSize(self.SAMPLES, 18)
+
+    def refresh(self):
+        self.values = self.latency.recent(self.SAMPLES)
+        stats = self.latency.stats()
+        self.p99 = stats['p99'] if stats else None
+        if stats:
+            self.setToolTip(f"往返延迟 {stats['count']} 个样本: p50 {stats['p50']:.1f}ms, p90 {stats['p90']:.1f}ms, "
+                            f"p99 {stats['p99']:.1f}ms, max {stats['max']:.1f}ms")
+        self.update()
+
+    def paintEvent(self, event):
+        if len(self.values) < 2:
+            return
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        h = self.height() - 1
+        top = max(self.values) or 1.0
+        step = self.width() / (self.SAMPLES - 1)
+        points = [QPointF(i * step, h - v / top * h) for i, v in enumerate(self.values)]
+        painter.setPen(QPen(QColor(40, 120, 200), 1))
+        painter.drawPolyline(points)
+        if self.p99 is not None:
+            painter.setPen(QPen(QColor(200, 80, 40), 1, Qt.PenStyle.DotLine))
+            y = h - self.p99 / top * h
+            painter.drawLine(QPointF(0, y), QPointF(self.width(), y))
 
 
 class UTCTimeWidget(QtWidgets.QWidget):
+    REFRESH_MS = 250  # latency views redraw at most this often, however many replies come in
+
     def __init__(self):
         super().__init__()
         layout = QHBoxLayout(self)
+        self.clock_service = ClockService()
         # Bitget
         layout.addWidget(QLabel("Bitget:"))
         self.bitget_time = QLabel("hh-mm-ss")
         layout.addWidget(self.bitget_time)
-        self.bitget_delay = QLabel("0ms")
+        self.bitget_client = self.clock_service.clock('Bitget')
+        self.bitget_delay = QLabel("-")
         layout.addWidget(self.bitget_delay)
-        self.bitget_client = BitgetCommon()
+        self.bitget_spark = LatencySparkline(self.bitget_client.latency)
+        layout.addWidget(self.bitget_spark)
         self.bitget_client.server_time_updated.connect(self._on_bitget_time_updated)
 
         layout.addItem(QSpacerItem(20, 20))
@@ -26,9 +68,11 @@ class UTCTimeWidget(QtWidgets.QWidget):
         layout.addWidget(QLabel("Gate:"))
         self.gate_time = QLabel("hh-mm-ss")
         layout.addWidget(self.gate_time)
-        self.gate_delay = QLabel("0ms")
+        self.gate_client = self.clock_service.clock('Gate.io')
+        self.gate_delay = QLabel("-")
         layout.addWidget(self.gate_delay)
-        self.gate_client = GateCommon()
+        self.gate_spark = LatencySparkline(self.gate_client.latency)
+        layout.addWidget(self.gate_spark)
         self.gate_client.server_time_updated.connect(self._on_gate_time_updated)
 
         layout.addItem(QSpacerItem(20, 20))
@@ -37,30 +81,38 @@ class UTCTimeWidget(QtWidgets.QWidget):
         layout.addWidget(QLabel("Mexc:"))
         self.mexc_time = QLabel("hh-mm-ss")
         layout.addWidget(self.mexc_time)
-        self.mexc_delay = QLabel("0ms")
+        self.mexc_client = self.clock_service.clock('Mexc.io')
+        self.mexc_delay = QLabel("-")
         layout.addWidget(self.mexc_delay)
-        self.mexc_client = MexcCommon()
+        self.mexc_spark = LatencySparkline(self.mexc_client.latency)
+        layout.addWidget(self.mexc_spark)
         self.mexc_client.server_time_updated.connect(self._on_mexc_time_updated)
 
         layout.addItem(QSpacerItem(20, 20, hData=QSizePolicy.Policy.Expanding))
-        
-        timer = QTimer(self)
-        timer.setTimerType(Qt.TimerType.PreciseTimer)
-        timer.timeout.connect(lambda : [self.bitget_client.request_utctime(),
-                                        self.gate_client.request_utctime(),
-                                        self.mexc_client.request_utctime()])
-        timer.setInterval(1000)
-        timer.start()
 
-    def _on_bitget_time_updated(self):
-        self.bitget_time.setText(QDateTime.fromMSecsSinceEpoch(self.bitget_client.rectified_timestamp).toString("yyyy.MM.dd hh:mm:ss"))
-        self.bitget_delay.setText(str(self.bitget_client.delay_ms) + 'ms')
+        # order replies can arrive by the thousand per second, so latency is polled instead of pushed
+        self.latency_views = [(self.bitget_client.latency, self.bitget_delay, self.bitget_spark),
+                              (self.gate_client.latency, self.gate_delay, self.gate_spark),
+                              (self.mexc_client.latency, self.mexc_delay, self.mexc_spark)]
+        self.drawn_versions = [-1] * len(self.latency_views)
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(self.REFRESH_MS)
+        self.refresh_timer.timeout.connect(self._refresh_latency)
+        self.refresh_timer.start()
 
+    def _on_bitget_time_updated(self):
+        self.bitget_time.setText(QDateTime.fromMSecsSinceEpoch(int(self.bitget_client.rectified_timestamp)).toString("yyyy.MM.dd hh:mm:ss"))
 
     def _on_gate_time_updated(self):
-        self.gate_time.setText(QDateTime.fromMSecsSinceEpoch(self.gate_client.rectified_timestamp).toString("yyyy.MM.dd hh:mm:ss"))
-        self.gate_delay.setText(str(self.gate_client.delay_ms) + 'ms')
+        self.gate_time.setText(QDateTime.fromMSecsSinceEpoch(int(self.gate_client.rectified_timestamp)).toString("yyyy.MM.dd hh:mm:ss"))
 
     def _on_mexc_time_updated(self):
-        self.mexc_time.setText(QDateTime.fromMSecsSinceEpoch(self.mexc_client.rectified_timestamp).toString("yyyy.MM.dd hh:mm:ss"))
-        self.mexc_delay.setText(str(self.mexc_client.delay_ms) + 'ms')
+        self.mexc_time.setText(QDateTime.fromMSecsSinceEpoch(int(self.mexc_client.rectified_timestamp)).toString("yyyy.MM.dd hh:mm:ss"))
+
+    def _refresh_latency(self):
+        for i, (latency, label, spark) in enumerate(self.latency_views):
+            if latency.version == self.drawn_versions[i]:
+                continue
+            self.drawn_versions[i] = latency.version
+            label.setText(latency.describe())
+            spark.refresh()
@@ -0,0 +1,127 @@
+import time
+from collections import deque
+
+from PySide6.QtNetwork import QNetworkReply
+
+
+def _now_ms():
+    return time.perf_counter_ns() / 1e6  # same clock as utils.get_monotonic_ms, inlined for the hot path
+
+
+class RequestTrace:
+    """一个请求的生命周期：构造、交给 QNetworkAccessManager、写入 socket、收到首字节、完成（单调时钟 ms）"""
+    __slots__ = ('kind', 'attempt', 'race_copy', 'deadline_ms', 'built_ms', 'handed_ms', 'sent_ms',
+                 'first_byte_ms', 'finished_ms', 'status_code', 'accepted', 'data', 'server_ms', '__weakref__')
+
+    def __init__(self, kind, attempt, deadline_ms=None, built_ms=None, race_copy=False):
+        self.kind = kind  # 'order' or 'time'
+        self.attempt = attempt  # burst slot for orders, sync counter for time requests
+        self.race_copy = race_copy
+        self.deadline_ms = deadline_ms
+        self.built_ms = built_ms
+        self.handed_ms = None
+        self.sent_ms = None
+        self.first_byte_ms = None
+        self.finished_ms = None
+        self.status_code = None
+        self.accepted = False
+        self.data = None  # body of an accepted reply, its server timestamp is parsed only when a timeline is made
+        self.server_ms = None
+
+    def on_sent(self):
+        self.sent_ms = _now_ms()
+
+    def on_first_byte(self):
+        if self.first_byte_ms is None:
+            self.first_byte_ms = _now_ms()
+
+    def finish(self, status_code, accepted=False, data=None):
+        # rejected bodies are dropped, a long burst would otherwise keep every one of them
+        self.finished_ms = _now_ms()
+        self.status_code = status_code
+        self.accepted = accepted
+        self.data = data if accepted else None
+
+
+class Tracer:
+    """一个订单或一个交易所对时请求的追踪记录，开销只是几次时间戳和信号回调，实盘可以常开"""
+    MAX_TRACES = 5000  # the first 15s of a 300hz burst, later attempts only count as dropped
+
+    enabled = True
+
+    def __init__(self, max_traces=MAX_TRACES, ring=False):
+        # orders keep their first attempts, those decide the outcome; clocks keep the latest ones
+        self.traces = deque(maxlen=max_traces) if ring else []
+        self.max_traces = max_traces
+        self.ring = ring
+        self.dropped = 0
+
+    def begin(self, kind, attempt, deadline_ms=None, built_ms=None, race_copy=False):
+        if not Tracer.enabled:
+            return None
+        if not self.ring and len(self.traces) >= self.max_traces:
+            self.dropped += 1
+            return None
+        trace = RequestTrace(kind, attempt, deadline_ms, built_ms, race_copy)
+        trace.handed_ms = _now_ms()
+        self.traces.append(trace)
+        return trace
+
+    @staticmethod
+    def attach(trace: RequestTrace, reply: QNetworkReply):
+        reply.requestSent.connect(trace.on_sent)
+        reply.metaDataChanged.connect(trace.on_first_byte)
+
+
+def order_timeline(order, limit=200):
+    """订单的事后时间线：每次尝试各阶段相对计划发送时刻的 ms，以及首个成功请求落在触发时间之后多少"""
+    tracer = order.tracer
+    traces = list(tracer.traces)
+    if not traces:
+        return [f'{order.exchange} {order.symbol}: 没有请求记录']
+    limit = limit or len(traces)
+    accepted = {id(t) for t in traces if t.accepted}
+
+    dispatch_ms = order.dispatch_deadline()
+    lines = [f'{order.exchange} {order.symbol} 触发 {order.trigger_timestamp}, '
+             f'请求 {len(traces)}{f" (+{tracer.dropped} 未记录)" if tracer.dropped else ""}, '
+             f'时间相对计划发送时刻 (ms)',
+             f'{"#":>6} {"构造":>9} {"交出":>9} {"写出":>9} {"首字节":>9} {"完成":>9} {"状态":>5} {"服务器":>9}  结果']
+
+    def rel(ms):
+        return f'{ms - dispatch_ms:9.3f}' if ms is not None else f'{"-":>9}'
+
+    for trace in traces[:limit]:
+        server_ms = order.server_time_of_reply(trace)
+        server = f'{server_ms - order.trigger_timestamp:+9.1f}' if server_ms is not None else f'{"-":>9}'
+        result = '-' if trace.finished_ms is None else '成功' if id(trace) in accepted else '失败'
+        lines.append(f'{trace.attempt:>5}{"*" if trace.race_copy else " "} {rel(trace.built_ms)} {rel(trace.handed_ms)} '
+                     f'{rel(trace.sent_ms)} {rel(trace.first_byte_ms)} {rel(trace.finished_ms)} '
+                     f'{trace.status_code if trace.status_code is not None else "-":>5} {server}  {result}')
+    if len(traces) > limit:
+        lines.append(f'... 省略 {len(traces) - limit} 条')
+
+    first = min((t for t in traces if id(t) in accepted), key=lambda t: t.finished_ms, default=None)
+    if first is None:
+        lines.append('没有成功的请求')
+        return lines
+    # landing estimate: written out on the local clock, plus the one way delay, mapped to server time
+    sent_ms = first.sent_ms if first.sent_ms is not None else first.handed_ms
+    landed = order.server_timestamp(sent_ms) + order.delay_ms - order.trigger_timestamp
+    server_ms = order.server_time_of_reply(first)
+    lines.append(f'首个成功请求 #{first.attempt}: 估计到达触发时间后 {landed:+.1f}ms' +
+                 (f', 服务器记录 {server_ms - order.trigger_timestamp:+.1f}ms' if server_ms is not None else ''))
+    return lines
+
+
+def clock_timeline(clock, limit=20):
+    """最近几次对时请求：往返时间以及写出、首字节相对交出的 ms"""
+    lines = [f'{"#":>6} {"写出":>9} {"首字节":>9} {"往返":>9} {"服务器时间":>15}']
+
+    def rel(trace, ms):
+        return f'{ms - trace.handed_ms:9.3f}' if ms is not None else f'{"-":>9}'
+
+    for trace in list(clock.tracer.traces)[-limit:]:
+        lines.append(f'{trace.attempt:>6} {rel(trace, trace.sent_ms)} {rel(trace, trace.first_byte_ms)} '
+                     f'{rel(trace, trace.finished_ms)} {trace.server_ms if trace.server_ms is not None else "-":>15}')
+    return lines
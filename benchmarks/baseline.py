@@ -0,0 +1,65 @@
+"""基准结果的保存与对比：结果写成 JSON，和上一版本保存的基线比较，超出容差即视为退化"""
+import json
+import platform
+import sys
+from datetime import datetime
+
+import PySide6
+
+
+def metric(value, unit, better='lower', noise=0.0):
+    # noise: absolute change below which a worse ratio still counts as run to run jitter
+    return {'value': value, 'unit': unit, 'better': better, 'noise': noise}
+
+
+def environment():
+    return {'date': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+            'pyside': PySide6.__version__, 'platform': platform.platform(), 'machine': platform.machine(),
+            'processor': platform.processor()}
+
+
+def save(path, results):
+    with open(path, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+
+
+def compare(results, path, tolerance=0.25):
+    """打印与基线的比值，返回退化的指标名"""
+    with open(path) as f:
+        baseline = json.load(f)['results']
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None or not base['value']:
+            print(f'{name:<40} {current["value"]:>12.3f} {current["unit"]:<6} (new)')
+            continue
+        ratio = current['value'] / base['value']
+        worse = ratio > 1 + tolerance if current['better'] == 'lower' else ratio < 1 - tolerance
+        worse = worse and abs(current['value'] - base['value']) > current.get('noise', 0.0)
+        if worse:
+            regressions.append(name)
+        print(f'{name:<40} {current["value"]:>12.3f} {current["unit"]:<6} x{ratio:5.2f}{"  <- regression" if worse else ""}')
+    return regressions
+
+
+def report(results, args):
+    # the common tail of every benchmark: print, optionally compare and save, exit 1 on regression
+    regressions = []
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+    else:
+        for name, r in results.items():
+            print(f'{name:<40} {r["value"]:>12.3f} {r["unit"]}')
+    if args.save:
+        save(args.save, results)
+    if regressions:
+        print(f'{len(regressions)} regression(s): {", ".join(regressions)}')
+        sys.exit(1)
+
+
+def add_arguments(parser, default_baseline):
+    parser.add_argument('--save', metavar='PATH', help='保存结果为新的基线')
+    parser.add_argument('--baseline', metavar='PATH', nargs='?', const=default_baseline,
+                        help=f'与基线对比（默认 {default_baseline}）')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='允许的相对退化')
@@ -0,0 +1,134 @@
+"""端到端突发下单：对本地模拟交易所（子进程）逐级提高频率，找出发送节奏或事件循环跟不上的位置
+
+    python benchmarks/bench_burst.py [--hz 10 50 100 200 500 1000 2000] [--dispatchers 1] [--duration 2]
+                                     [--baseline [PATH]] [--save PATH]
+
+模拟交易所的开盘时间设在一小时后，所有订单都被拒绝但不是致命错误，突发会一直持续到设定时长。
+每一级记录：实际发送频率、发送时刻相对计划的延迟、时长内收到的回执比例，以及主线程事件循环的最大卡顿。
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+from PySide6.QtCore import QCoreApplication, QEventLoop, QTimer, Qt
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import baseline
+from utils import get_monotonic_ms, get_timestamp
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'burst.json')
+LAG_TICK_MS = 5
+
+
+def wait(ms):
+    loop = QEventLoop()
+    QTimer.singleShot(int(ms), loop.quit)
+    loop.exec()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run_level(hz, dispatchers, duration_s):
+    from BitgetAPI.BitgetRest import BitgetOrder
+    from FiringEngine import Burst, FiringEngine
+    from RestClient import RestOrderBase
+
+    interval = 1000 / hz
+    order = BitgetOrder(RestOrderBase.OrderType.Buy, 'BTCUSDT', '60000', '0.001', interval, get_timestamp(),
+                        'mock-key', 'mock-secret', 'mock-passphrase')
+    order.rate_limit = 0  # the send path itself is measured, not the exchange budget
+    replies = []
+    order.on_replied = lambda status_code, data, race=None: replies.append(get_monotonic_ms())
+
+    # the GUI thread handles every reply, how late its own timer fires is its load
+    lag = {'last': None, 'max': 0.0}
+
+    def tick():
+        now = get_monotonic_ms()
+        if lag['last'] is not None:
+            lag['max'] = max(lag['max'], now - lag['last'] - LAG_TICK_MS)
+        lag['last'] = now
+
+    ticker = QTimer()
+    ticker.setTimerType(Qt.TimerType.PreciseTimer)
+    ticker.timeout.connect(tick)
+    ticker.start(LAG_TICK_MS)
+
+    burst = Burst(order, get_monotonic_ms() + 200, interval, dispatchers)
+    burst.sends = []
+    order.burst = burst
+    FiringEngine().start_burst(burst)
+    wait(200 + duration_s * 1000)
+    burst.stop()
+    end_ms = get_monotonic_ms()
+    wait(500)  # whatever is still in flight
+    ticker.stop()
+
+    sends = list(burst.sends)
+    late = [sent - deadline for deadline, sent in sends]
+    span_s = (sends[-1][1] - sends[0][1]) / 1000 if len(sends) > 1 else 0
+    in_time = sum(1 for t in replies if t <= end_ms)
+    order.deleteLater()
+    return {
+        'sent': len(sends),
+        'achieved_hz': (len(sends) - 1) / span_s if span_s else 0.0,
+        'late_p50_ms': percentile(late, 50) if late else 0.0,
+        'late_p99_ms': percentile(late, 99) if late else 0.0,
+        'late_max_ms': max(late) if late else 0.0,
+        'reply_ratio': in_time / len(sends) if sends else 0.0,
+        'loop_lag_max_ms': lag['max'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hz', type=float, nargs='+', default=[10, 50, 100, 200, 500, 1000, 2000])
+    parser.add_argument('--dispatchers', type=int, default=1)
+    parser.add_argument('--duration', type=float, default=2.0, help='每一级持续秒数')
+    baseline.add_arguments(parser, DEFAULT_BASELINE)
+    args = parser.parse_args()
+
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, 'MockExchange.py'), '--port', '0',
+                               '--open-in', '3600'], stdout=subprocess.PIPE, text=True)
+    try:
+        url = server.stdout.readline().split()[3].rstrip(',')  # "mock exchange on <url>, open at ..."
+        os.environ['BITGET_API_URL'] = url
+        app = QCoreApplication([])
+
+        levels = {}
+        saturation = None
+        for hz in args.hz:
+            r = run_level(hz, args.dispatchers, args.duration)
+            levels[hz] = r
+            print(f"{hz:>7.0f}hz: sent {r['sent']:>5}  achieved {r['achieved_hz']:8.1f}hz  "
+                  f"late p50 {r['late_p50_ms']:6.3f}ms p99 {r['late_p99_ms']:7.3f}ms max {r['late_max_ms']:7.3f}ms  "
+                  f"replies {r['reply_ratio']:6.1%}  loop lag {r['loop_lag_max_ms']:6.2f}ms")
+            # sustained, not a single stall: the rate can't be held, the median send is a slot late, replies lag
+            saturated = (r['achieved_hz'] < 0.95 * hz or r['late_p50_ms'] > 1000 / hz
+                         or r['reply_ratio'] < 0.95)
+            if saturated and saturation is None:
+                saturation = hz
+    finally:
+        from FiringEngine import FiringEngine
+        FiringEngine().shutdown()  # no app.exec(), aboutToQuit never comes
+        server.terminate()
+        server.wait()
+
+    print(f'saturates at {saturation:.0f}hz' if saturation else 'no saturation within the tested range')
+    results = {'saturation_hz': baseline.metric(saturation or max(args.hz) * 2, 'hz', 'higher')}
+    for hz, r in levels.items():
+        results[f'{hz:.0f}hz.achieved'] = baseline.metric(r['achieved_hz'], 'hz', 'higher')
+        # single stalls of a few ms come and go between runs, only a change against the slot spacing matters
+        results[f'{hz:.0f}hz.late_p99'] = baseline.metric(r['late_p99_ms'], 'ms', noise=max(2.0, 500 / hz))
+        results[f'{hz:.0f}hz.reply_ratio'] = baseline.metric(r['reply_ratio'], '', 'higher', noise=0.02)
+        results[f'{hz:.0f}hz.loop_lag_max'] = baseline.metric(r['loop_lag_max_ms'], 'ms', noise=20.0)
+    baseline.report(results, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""下单热路径的 CPU 开销：签名、序列化、请求头和 QNetworkRequest 构造，以及各交易所完整的 build_order_request
+
+    python benchmarks/bench_hot_path.py [--baseline [PATH]] [--save PATH] [--number 2000]
+"""
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+import timeit
+
+from PySide6.QtCore import QCoreApplication
+from PySide6.QtNetwork import QNetworkRequest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import baseline
+import BitgetAPI.consts_bitget as bitget_const
+import BitgetAPI.utils_bitget as bitget_utils
+from GateAPI.utils_gate import gen_signed_header
+from MEXCAPI.utils_mexc import gen_signed_body
+from utils import setup_header, get_timestamp
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'hot_path.json')
+
+KEY, SECRET, PASSPHRASE = 'bench-key', 'bench-secret', 'bench-passphrase'
+BITGET_PARAMS = {'symbol': 'BTCUSDT', 'side': 'buy', 'orderType': 'limit', 'force': 'gtc',
+                 'price': '60000', 'size': '0.001'}
+GATE_PARAMS = {'currency_pair': 'BTC_USDT', 'side': 'buy', 'orderType': 'limit', 'force': 'gtc',
+               'price': '60000', 'amount': '0.001'}
+MEXC_PARAMS = {'symbol': 'BTCUSDT', 'side': 'BUY', 'type': 'LIMIT', 'price': '60000', 'quantity': '0.001'}
+
+
+def cases():
+    from BitgetAPI.BitgetRest import BitgetOrder
+    from GateAPI.GateRest import GateOrder
+    from MEXCAPI.MexcRest import MexcOrder
+    from RestClient import RestOrderBase
+    from Tracing import Tracer
+
+    buy = RestOrderBase.OrderType.Buy
+    trigger = get_timestamp() + 3600 * 1000
+    bitget = BitgetOrder(buy, 'BTCUSDT', '60000', '0.001', 10, trigger, KEY, SECRET, PASSPHRASE)
+    gate = GateOrder(buy, 'BTC_USDT', '60000', '0.001', 10, trigger, KEY, SECRET)
+    mexc = MexcOrder(buy, 'BTCUSDT', '60000', '0.001', 10, trigger, KEY, SECRET)
+
+    timestamp = get_timestamp()
+    body = json.dumps(BITGET_PARAMS)
+    message = bitget_utils.pre_hash(timestamp, 'POST', '/api/v2/spot/trade/place-order', body)
+    signature = bitget_utils.sign(message, SECRET)
+    headers = bitget_utils.get_header(KEY, signature, timestamp, PASSPHRASE)
+    url = bitget_const.API_URL + '/api/v2/spot/trade/place-order'
+    gate_body = json.dumps(GATE_PARAMS)
+    seconds = itertools.count(timestamp // 1000)
+    tracer = Tracer(1000, ring=True)
+
+    def with_headers():
+        setup_header(headers, QNetworkRequest(url))
+
+    def gate_uncached():
+        # a new second every call, the signature cache can't help
+        gate._build_request('/api/v4/spot/orders', GATE_PARAMS, next(seconds) * 1000)
+
+    return {
+        'json.dumps': lambda: json.dumps(BITGET_PARAMS),
+        'bitget.pre_hash': lambda: bitget_utils.pre_hash(timestamp, 'POST', '/api/v2/spot/trade/place-order', body),
+        'bitget.sign': lambda: bitget_utils.sign(message, SECRET),
+        'bitget.get_header': lambda: bitget_utils.get_header(KEY, signature, timestamp, PASSPHRASE),
+        'QNetworkRequest()': lambda: QNetworkRequest(url),
+        'setup_header+QNetworkRequest': with_headers,
+        'gate.gen_signed_header': lambda: gen_signed_header(KEY, SECRET, timestamp // 1000, 'POST',
+                                                            '/api/v4/spot/orders', None, gate_body),
+        'mexc.gen_signed_body': lambda: gen_signed_body(SECRET, timestamp, MEXC_PARAMS),
+        'bitget.build_order_request': lambda: bitget.build_order_request(),
+        'gate.build_order_request': lambda: gate.build_order_request(),
+        'gate.build_order_request(uncached)': gate_uncached,
+        'mexc.build_order_request': lambda: mexc.build_order_request(),
+        'Tracer.begin': lambda: tracer.begin('order', 0, 0.0, 0.0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=2000, help='每轮调用次数')
+    parser.add_argument('--repeat', type=int, default=7)
+    baseline.add_arguments(parser, DEFAULT_BASELINE)
+    args = parser.parse_args()
+
+    app = QCoreApplication([])
+    results = {}
+    for name, func in cases().items():
+        runs = timeit.repeat(func, number=args.number, repeat=args.repeat)
+        # the median round, per call
+        results[name] = baseline.metric(statistics.median(runs) / args.number * 1e6, 'us')
+    baseline.report(results, args)
+
+
+if __name__ == '__main__':
+    main()
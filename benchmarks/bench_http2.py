@@ -0,0 +1,161 @@
+"""HTTP/1.1 与 HTTP/2 下单突发对比：在本地 TLS 测试服务器上比较在途并发数和首个回执时间
+
+    python benchmarks/bench_http2.py [--requests 50] [--rounds 5] [--json result.json]
+
+服务器在子进程中运行（QHttpServer + ALPN），证书用 --cert/--key 指定，否则调用 openssl 生成自签名证书。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from PySide6.QtCore import QCoreApplication, QByteArray, QEventLoop, QTimer
+from PySide6.QtNetwork import QNetworkAccessManager, QNetworkRequest, QSslConfiguration, QSslSocket
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import get_monotonic_ms
+
+ORDER_PATH = '/api/v2/spot/trade/place-order'
+
+
+def serve(cert, key):
+    from PySide6.QtHttpServer import QHttpServer, QHttpServerResponse, QHttpServerResponder
+    from PySide6.QtNetwork import QHostAddress, QSsl, QSslCertificate, QSslKey, QSslServer
+
+    app = QCoreApplication([])
+    server = QHttpServer()
+
+    def ok(request):
+        return QHttpServerResponse(QHttpServerResponder.StatusCode.Ok)
+
+    server.route(ORDER_PATH, ok)
+    config = QSslConfiguration.defaultConfiguration()
+    with open(cert, 'rb') as f:
+        config.setLocalCertificate(QSslCertificate(f.read()))
+    with open(key, 'rb') as f:
+        config.setPrivateKey(QSslKey(f.read(), QSsl.KeyAlgorithm.Rsa))
+    config.setAllowedNextProtocols([QByteArray(b'h2'), QByteArray(b'http/1.1')])
+    tcp = QSslServer()
+    tcp.setSslConfiguration(config)
+    tcp.listen(QHostAddress.SpecialAddress.LocalHost, 0)
+    server.bind(tcp)
+    print(tcp.serverPort(), flush=True)
+    app.exec()
+
+
+def make_certificate(directory):
+    cert, key = os.path.join(directory, 'cert.pem'), os.path.join(directory, 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                    '-subj', '/CN=127.0.0.1', '-keyout', key, '-out', cert],
+                   check=True, capture_output=True)
+    return cert, key
+
+
+def wait(replies, timeout_ms=10000):
+    loop = QEventLoop()
+    pending = [len(replies)]
+
+    def done():
+        pending[0] -= 1
+        if pending[0] == 0:
+            loop.quit()
+
+    for reply in replies:
+        reply.finished.connect(done)
+    QTimer.singleShot(timeout_ms, loop.quit)
+    loop.exec()
+
+
+def run_round(manager, url, http2, count):
+    ssl = QSslConfiguration.defaultConfiguration()
+    ssl.setPeerVerifyMode(QSslSocket.PeerVerifyMode.VerifyNone)
+
+    def request():
+        req = QNetworkRequest(url)
+        req.setSslConfiguration(ssl)
+        req.setAttribute(QNetworkRequest.Attribute.Http2AllowedAttribute, http2)
+        req.setHeader(QNetworkRequest.KnownHeaders.ContentTypeHeader, 'application/json')
+        return req
+
+    # warm: as many connections as the protocol will use during the burst
+    wait([manager.post(request(), b'{}') for _ in range(1 if http2 else 6)])
+
+    state = {'in_flight': 0, 'peak': 0, 'first_ack': None, 'last_ack': None, 'http2': 0}
+
+    def on_sent():
+        state['in_flight'] += 1
+        state['peak'] = max(state['peak'], state['in_flight'])
+
+    def on_finished(reply):
+        now = get_monotonic_ms()
+        state['in_flight'] -= 1
+        if state['first_ack'] is None:
+            state['first_ack'] = now
+        state['last_ack'] = now
+        if reply.attribute(QNetworkRequest.Attribute.Http2WasUsedAttribute):
+            state['http2'] += 1
+
+    begin = get_monotonic_ms()
+    replies = []
+    for _ in range(count):
+        reply = manager.post(request(), b'{"symbol":"BTCUSDT","side":"buy"}')
+        reply.requestSent.connect(on_sent)
+        reply.finished.connect(lambda reply=reply: on_finished(reply))
+        replies.append(reply)
+    wait(replies)
+    for reply in replies:
+        reply.deleteLater()
+    return {'peak_in_flight': state['peak'],
+            'first_ack_ms': state['first_ack'] - begin,
+            'all_acks_ms': state['last_ack'] - begin,
+            'http2_replies': state['http2']}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--cert')
+    parser.add_argument('--key')
+    parser.add_argument('--json')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.cert, args.key)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = (args.cert, args.key) if args.cert else make_certificate(directory)
+        server = subprocess.Popen([sys.executable, __file__, '--serve', '--cert', cert, '--key', key],
+                                  stdout=subprocess.PIPE, text=True)
+        try:
+            port = int(server.stdout.readline())
+            app = QCoreApplication([])
+            url = f'https://127.0.0.1:{port}{ORDER_PATH}'
+            results = {}
+            for name, http2 in (('http/1.1', False), ('http/2', True)):
+                rounds = []
+                for _ in range(args.rounds):
+                    manager = QNetworkAccessManager()  # fresh connection pool every round
+                    rounds.append(run_round(manager, url, http2, args.requests))
+                    manager.deleteLater()
+                results[name] = {key: statistics.median(r[key] for r in rounds) for key in rounds[0]}
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f'{args.requests} requests x {args.rounds} rounds, medians')
+    for name, r in results.items():
+        print(f"{name:>9}: peak in flight {r['peak_in_flight']:>4.0f}  first ack {r['first_ack_ms']:7.2f}ms  "
+              f"all acks {r['all_acks_ms']:7.2f}ms  (h2 replies {r['http2_replies']:.0f})")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+"""无界面运行：从配置文件加载下单任务，在 QCoreApplication 上运行，进度以 JSON 行写入日志
+
+    python daemon.py tasks.json [--log daemon.log] [--status-interval 10]
+
+tasks.json:
+    {
+      "tasks": [
+        {"id": "btc-open", "exchange": "Bitget", "side": "buy", "symbol": "BTCUSDT",
+         "price": "60000", "quantity": "0.001", "hz": 10, "at": "2026-10-18 12:00:00",
+         "dispatchers": 2, "race_copies": 2, "duration": 30}
+      ]
+    }
+
+exchange 取 Bitget / Gate.io / Mexc.io；at 为本地时间字符串或毫秒时间戳，省略则立即下单；
+duration（秒）为开始下单后的最长持续时间，省略则直到成功或出现致命错误。
+api_key / secret_key / passphrase 可写在任务里，否则使用界面设置中保存的密钥。
+profile 为发送节奏 constant / pulse / ramp / auto，pulse 和 ramp 从 peak_hz 开始，hz 为基础频率。
+max_fills 为成交笔数，达到后结束任务并中止其余在途请求，默认 1。
+rate_limit（次/秒）覆盖设置中该交易所的限频，同一个 key 的所有任务共用这一额度，0 为不限。
+accounts 把任务分散到多个账户同时下单：数字取设置中账户池的前几个（主账户在前），或给出
+[{"name": ..., "api_key": ..., "secret_key": ..., "passphrase": ...}] 列表；各账户的日志以 id@账户名 区分，
+max_fills 为各账户合计的成交笔数。
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+from datetime import datetime
+
+from PySide6.QtCore import QCoreApplication, QObject, QTimer, QDateTime, QtMsgType, qInstallMessageHandler
+
+SYNC_TIMEOUT_MS = 10000
+LOG_LEVELS = {
+    QtMsgType.QtDebugMsg: 'debug',
+    QtMsgType.QtInfoMsg: 'info',
+    QtMsgType.QtWarningMsg: 'warning',
+    QtMsgType.QtCriticalMsg: 'critical',
+    QtMsgType.QtFatalMsg: 'fatal',
+}
+
+
+class JsonLog:
+    """每行一个 JSON 事件，便于 grep / jq 和日志采集"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def __call__(self, event, **fields):
+        record = {'ts': datetime.now().isoformat(timespec='milliseconds'), 'event': event} | fields
+        self.stream.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+        self.stream.flush()
+
+    def qt_message(self, msg_type, context, message):
+        # the orders report through qDebug, keep those lines in the same stream
+        self('log', level=LOG_LEVELS.get(msg_type, 'debug'), message=message)
+
+
+def parse_trigger(value):
+    if value is None:
+        return -1
+    if isinstance(value, (int, float)):
+        return int(value)
+    for fmt in ('yyyy-MM-dd hh:mm:ss.zzz', 'yyyy-MM-dd hh:mm:ss'):
+        dt = QDateTime.fromString(value, fmt)
+        if dt.isValid():
+            return dt.toMSecsSinceEpoch()
+    raise ValueError(f'无法解析的时间: {value}')
+
+
+class Daemon(QObject):
+    """加载任务、等待对时完成后下单，所有任务结束时退出"""
+
+    def __init__(self, tasks, log: JsonLog, status_interval_s=10, trace_dir=None):
+        super().__init__()
+        from BitgetAPI.BitgetRest import BitgetOrder
+        from GateAPI.GateRest import GateOrder
+        from MEXCAPI.MexcRest import MexcOrder
+        self.order_classes = {'Bitget': BitgetOrder, 'Gate.io': GateOrder, 'Mexc.io': MexcOrder}
+
+        self.tasks = tasks
+        self.log = log
+        self.trace_dir = trace_dir
+        self.orders = {}  # task id -> order, task id@account for the orders of a fan-out task
+        self.fan_outs = {}  # task id -> FanOut
+        self.exit_code = 0
+
+        for i, task in enumerate(tasks):
+            task.setdefault('id', str(i))
+            if task.get('exchange') not in self.order_classes:
+                raise ValueError(f"任务 {task['id']}: 不支持的交易所 {task.get('exchange')}")
+
+        from SymbolCache import SymbolCache
+        # the task checks need the symbol rules, missing lists download while the clocks sync
+        self.catalogs = [SymbolCache().catalog(exchange) for exchange in sorted({task['exchange'] for task in tasks})]
+        for catalog in self.catalogs:
+            catalog.updated.connect(self._check_ready)
+
+        from ClockService import ClockService
+        self.clock_service = ClockService(exchanges=sorted({task['exchange'] for task in tasks}))
+        self.clock_service.server_time_updated.connect(self._check_ready)
+        self.started = False
+        self.done = False  # replies still queued after exit() must not report again
+        QTimer.singleShot(SYNC_TIMEOUT_MS, self, self._on_sync_timeout)
+
+        self.status_timer = QTimer(self)
+        self.status_timer.setInterval(int(status_interval_s * 1000))
+        self.status_timer.timeout.connect(self._report_status)
+
+    def _check_ready(self, exchange=None):
+        if self.started:
+            return
+        if (all(clock.estimator.is_synced() for clock in self.clock_service.clocks.values())
+                and all(catalog.is_ready() for catalog in self.catalogs)):
+            self.start()
+
+    def _on_sync_timeout(self):
+        if self.started:
+            return
+        # go on with the wall clock seed, the trigger check keeps correcting once samples arrive
+        self.log('sync_timeout', exchanges=[exchange for exchange, clock in self.clock_service.clocks.items()
+                                            if not clock.estimator.is_synced()],
+                 symbols=[catalog.exchange for catalog in self.catalogs if not catalog.is_ready()])
+        self.start()
+
+    def start(self):
+        self.started = True
+        for exchange, clock in self.clock_service.clocks.items():
+            self.log('clock', exchange=exchange, offset_ms=round(clock.estimator.offset_ms, 3),
+                     latency_ms=round(clock.delay_ms, 3), confidence_ms=round(clock.estimator.confidence_ms, 3))
+        for task in self.tasks:
+            self._add_task(task)
+        self.status_timer.start()
+        self._check_done()
+
+    def stop(self):
+        for order in self.orders.values():
+            order.stop_order_trigger()
+        self.log('stopped')
+        self._write_timelines()
+        QCoreApplication.exit(self.exit_code)
+
+    def _add_task(self, task):
+        from AccountPool import Account, FanOut, account_pool, make_order
+        from BurstProfile import ProfileKind, check_rates
+        from OrderRules import check_order
+        from RestClient import RestOrderBase
+        task_id = task['id']
+        try:
+            order_type = RestOrderBase.OrderType.Buy if task['side'] == 'buy' else RestOrderBase.OrderType.Sell
+            profile_kind = ProfileKind(task.get('profile', 'constant'))
+            hz, peak_hz = check_rates(task['hz'], task.get('peak_hz'))
+            dispatchers = int(task.get('dispatchers', 1))
+            race_copies = int(task.get('race_copies', 1))
+            max_fills = int(task.get('max_fills', 1))
+            rate_limit = int(task['rate_limit']) if 'rate_limit' in task else None
+            price, quantity, notes = check_order(task['exchange'], order_type, task['symbol'],
+                                                 task['price'], task['quantity'])
+            order_cls = self.order_classes[task['exchange']]
+            args = (order_type, task['symbol'], price, quantity, 1000 / hz, parse_trigger(task.get('at')))
+            accounts = task.get('accounts')
+            if accounts is None:
+                credentials = {key: task[key] for key in ('api_key', 'secret_key', 'passphrase') if key in task}
+                orders = {task_id: order_cls(*args, **credentials)}
+            else:
+                # a count takes the first accounts of the configured pool, a list brings its own key sets
+                if isinstance(accounts, int):
+                    pool = account_pool(task['exchange'])
+                    if not 1 <= accounts <= len(pool):
+                        raise ValueError(f'账户数 {accounts} 超出范围 1~{len(pool)}')
+                    accounts = pool[:accounts]
+                else:
+                    accounts = [Account(**account) for account in accounts]
+                    names = [account.name for account in accounts]
+                    if not names:
+                        raise ValueError('账户列表为空')
+                    if len(set(names)) < len(names):
+                        raise ValueError(f'账户名重复: {names}')
+                orders = {f'{task_id}@{account.name}': make_order(order_cls, task['exchange'], account, *args)
+                          for account in accounts}
+        except (KeyError, ValueError, TypeError) as e:
+            self._reject(task_id, repr(e))
+            return
+        if notes:
+            self.log('task_normalized', task=task_id, price=price, quantity=quantity, notes=notes)
+        # connected first, the group reports filled before the last order's success can end the run
+        if len(orders) > 1:
+            fan_out = FanOut(list(orders.values()), max_fills)
+            fan_out.filled.connect(lambda: self._on_task_filled(task_id))
+            self.fan_outs[task_id] = fan_out
+
+        for order_id, order in orders.items():
+            order.dispatchers = dispatchers
+            order.race_copies = race_copies
+            order.max_fills = max_fills
+            order.profile_kind = profile_kind
+            order.peak_hz = peak_hz
+            if rate_limit is not None:
+                order.rate_limit = rate_limit
+            order.succeed.connect(lambda order_id=order_id: self._on_order_succeed(order_id))
+            order.failed.connect(lambda order_id=order_id: self._on_order_failed(order_id))
+
+        for order_id, order in orders.items():
+            result = order.place_order()
+            if not result[0]:
+                self._reject(order_id, result[1])
+                continue
+            self.orders[order_id] = order
+            self.log('task_added', task=order_id, exchange=task['exchange'], symbol=order.symbol, side=task['side'],
+                     trigger=order.trigger_timestamp, countdown_ms=round(order.countdown_ms(), 3))
+            if 'duration' in task:
+                # the burst starts at the trigger, the duration counts from there
+                timeout_ms = max(0, order.countdown_ms()) + float(task['duration']) * 1000
+                QTimer.singleShot(int(timeout_ms), self, lambda order_id=order_id: self._on_task_timeout(order_id))
+
+    def _reject(self, task_id, reason):
+        self.exit_code = 1
+        self.log('task_rejected', task=task_id, reason=reason)
+
+    def _on_order_succeed(self, task_id):
+        order = self.orders[task_id]
+        self.log('task_succeeded', task=task_id, fills=order.succeed_count, order_ids=order.order_records,
+                 sent=order.burst.sent_count, failed=order.failed_count, race_lost=order.race_lost_count,
+                 dispatch_error_ms=order.dispatch_error_ms)
+        self._check_done()
+
+    def _on_order_failed(self, task_id):
+        order = self.orders[task_id]
+        self.exit_code = 1
+        self.log('task_failed', task=task_id, error_code=order.error_code, sent=order.burst.sent_count,
+                 failed=order.failed_count, race_lost=order.race_lost_count)
+        self._check_done()
+
+    def _on_task_filled(self, task_id):
+        fan_out = self.fan_outs[task_id]
+        self.log('task_filled', task=task_id, fills=fan_out.fill_count, accounts=len(fan_out.orders))
+        self._check_done()
+
+    def _on_task_timeout(self, task_id):
+        order = self.orders[task_id]
+        if order.is_trigger_active():
+            order.stop_order_trigger()
+            if order.succeed_count == 0:
+                self.exit_code = 1
+            self.log('task_timeout', task=task_id, sent=order.burst.sent_count,
+                     succeeded=order.succeed_count, failed=order.failed_count)
+        self._check_done()
+
+    def _report_status(self):
+        for task_id, order in self.orders.items():
+            if order.is_finished():
+                continue
+            fields = {'countdown_ms': round(order.countdown_ms(), 1)} if order.burst is None else {
+                'sent': order.burst.sent_count, 'succeeded': order.succeed_count, 'failed': order.failed_count}
+            if order.pool is not None:
+                fields['pool'] = order.pool.describe()
+            if order.burst is not None:
+                in_flight = order.burst.in_flight
+                fields.update(in_flight=in_flight.count, in_flight_peak=in_flight.peak, timed_out=in_flight.timed_out,
+                              aborted=in_flight.aborted, capped=in_flight.capped,
+                              transport_errors=order.transport_error_count)
+            if order.burst is not None and order.burst.budget is not None:
+                fields['rate_limit'] = order.burst.budget.describe()
+            stats = order.latency.stats()
+            if stats is not None:
+                fields['latency'] = {k: round(v, 2) if isinstance(v, float) else v for k, v in stats.items()}
+            self.log('status', task=task_id, **fields)
+
+    def _check_done(self):
+        pending = [task_id for task_id, order in self.orders.items()
+                   if order.burst is None or order.is_trigger_active()]
+        if not pending and not self.done:
+            self.done = True
+            self._write_timelines()
+            self.log('done', exit_code=self.exit_code)
+            QCoreApplication.exit(self.exit_code)
+
+    def _write_timelines(self):
+        from Tracing import order_timeline, clock_timeline
+        for task_id, order in self.orders.items():
+            lines = order_timeline(order, limit=None)
+            self.log('timeline', task=task_id, requests=len(order.tracer.traces), summary=lines[-1])
+            if self.trace_dir:
+                with open(os.path.join(self.trace_dir, f'{task_id}.txt'), 'w', encoding='utf-8') as f:
+                    f.write('\n'.join(lines + ['', '最近对时请求:'] + clock_timeline(order.common)) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('config')
+    parser.add_argument('--log', help='日志文件，默认输出到 stdout')
+    parser.add_argument('--status-interval', type=float, default=10, help='状态汇报间隔（秒）')
+    parser.add_argument('--trace-dir', help='结束时把每个任务的完整请求时间线写到这个目录')
+    args = parser.parse_args()
+
+    app = QCoreApplication([])
+    app.setApplicationName("Coin Robot")
+    log = JsonLog(open(args.log, 'a', encoding='utf-8') if args.log else sys.stdout)
+    qInstallMessageHandler(log.qt_message)
+
+    from Configuration import apply_proxy
+    apply_proxy()
+
+    with open(args.config, encoding='utf-8') as f:
+        tasks = json.load(f)['tasks']
+    if args.trace_dir:
+        os.makedirs(args.trace_dir, exist_ok=True)
+    daemon = Daemon(tasks, log, args.status_interval, args.trace_dir)
+    log('started', tasks=len(tasks))
+
+    # Python only sees signals between bytecodes, a timer keeps the interpreter ticking inside exec()
+    signal.signal(signal.SIGINT, lambda *_: daemon.stop())
+    signal.signal(signal.SIGTERM, lambda *_: daemon.stop())
+    tick = QTimer()
+    tick.start(200)
+    tick.timeout.connect(lambda: None)
+
+    sys.exit(app.exec())
+
+
+if __name__ == '__main__':
+    main()
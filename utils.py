@@ -3,9 +3,24 @@ import time
 from PySide6.QtNetwork import QNetworkRequest
 
 
+def singleton(cls):
+    instances = {}
+
+    def get_instance(*args, **kwargs):
+        if cls not in instances:
+            instances[cls] = cls(*args, **kwargs)
+        return instances[cls]
+
+    return get_instance
+
 def get_timestamp():
+    # wall clock, for display only; timing goes through get_monotonic_ms()
     return int(time.time() * 1000)
 
+def get_monotonic_ms():
+    # never jumps with NTP slew or manual clock changes, sub-ms resolution
+    return time.perf_counter_ns() / 1e6
+
 def setup_header(headers, request: QNetworkRequest):
     for key, value in headers.items():
         request.setRawHeader(key.encode(), value.encode())  # `encode()` 将字符串转换为字节
\ No newline at end of file